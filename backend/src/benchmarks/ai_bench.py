@@ -0,0 +1,120 @@
+import os
+import time
+import random
+import asyncio
+import logging
+
+from packages.managers import room_manager
+from packages.managers.ai_opponents import ai_opponents, FACE_X
+from packages.ecs_systems.physics_system import PhysicSystem, physics_system
+from packages.event_handlers.end_round import score_round
+from packages.event_handlers.start_round import COUNTDOWN_TIME
+
+
+ROOMS = int(os.getenv("BENCH_ROOMS", 1_000))
+DURATION = float(os.getenv("BENCH_DURATION", 10))
+PHYSICS_TICK_RATE = float(os.getenv("BENCH_PHYSICS_TICK_RATE", 60))
+AI_TICK_RATE = float(os.getenv("BENCH_AI_TICK_RATE", 30))
+PREDICTIONS = 10_000
+
+
+def stepped_intercept(system, b_pos, b_vel, x, dt=1 / 60):
+    # The same height found by stepping the ball frame by frame like a client
+    b_pos, b_vel = list(b_pos), list(b_vel)
+    while (x - b_pos[0]) * b_vel[0] > 0:
+        remaining = min(dt, (x - b_pos[0]) / b_vel[0])
+        while remaining > 0:
+            t_hit, contact = system.sweep_ball(b_pos, b_vel, (), remaining)
+            b_pos[0] += b_vel[0] * t_hit
+            b_pos[1] += b_vel[1] * t_hit
+            remaining -= t_hit
+            if contact is None:
+                break
+            b_vel[1] = -b_vel[1]
+
+    return b_pos[1]
+
+
+def predictions():
+    # Random balls heading for player 2's paddle
+    rng = random.Random(0)
+    x = PhysicSystem.WORLD_WIDTH - FACE_X
+    states = [
+        ((rng.uniform(FACE_X, x), rng.uniform(25, 695)), (375, rng.choice((-375, 375))))
+        for _ in range(PREDICTIONS)
+    ]
+
+    start = time.perf_counter()
+    analytic = [PhysicSystem.intercept_y(b_pos, b_vel, x) for b_pos, b_vel in states]
+    analytic_time = time.perf_counter() - start
+
+    system = PhysicSystem()
+    start = time.perf_counter()
+    stepped = [stepped_intercept(system, b_pos, b_vel, x) for b_pos, b_vel in states]
+    stepped_time = time.perf_counter() - start
+
+    error = max(abs(a - b) for a, b in zip(analytic, stepped))
+    return analytic_time / PREDICTIONS, stepped_time / PREDICTIONS, error
+
+
+async def load():
+    # Rooms of two AI players, the ball simulated by the server. Nothing
+    # goes through a socket
+    physics_system.configure(PHYSICS_TICK_RATE, on_goal=score_round)
+    ai_opponents.tick_rate = AI_TICK_RATE
+
+    update = ai_opponents.update
+    spent = [0.0]
+
+    async def timed(elapsed):
+        start = time.process_time()
+        await update(elapsed)
+        spent[0] += time.process_time() - start
+
+    ai_opponents.update = timed
+
+    for _ in range(2 * ROOMS):
+        await ai_opponents.spawn()
+
+    # Measured once every round is under way
+    await asyncio.sleep(COUNTDOWN_TIME + 0.5)
+    frames = ai_opponents.frames_sent
+    spent[0] = 0
+    cpu = time.process_time()
+    began = time.perf_counter()
+
+    await asyncio.sleep(DURATION)
+
+    elapsed = time.perf_counter() - began
+    cpu = time.process_time() - cpu
+    goals = sum(room.p1.score + room.p2.score for room in room_manager.rooms.values())
+
+    for paddle in list(ai_opponents.paddles.values()):
+        ai_opponents.leave(paddle)
+    await asyncio.sleep(2 / AI_TICK_RATE)
+
+    return {
+        "cpu": cpu / elapsed,
+        "ai": spent[0] / elapsed,
+        "frames/s": (ai_opponents.frames_sent - frames) / elapsed,
+        "goals": goals,
+        "rooms left": len(room_manager.rooms),
+    }
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+
+    analytic, stepped, error = predictions()
+    print(f"intercept of {PREDICTIONS:,} balls: analytic {analytic * 1e6:.2f} us, "
+          f"stepped at 60 Hz {stepped * 1e6:.2f} us ({stepped / analytic:.0f}x), largest difference {error:.2g} px")
+
+    result = asyncio.run(load())
+    print(f"rooms={ROOMS} physics={PHYSICS_TICK_RATE:g} Hz AI={AI_TICK_RATE:g} Hz duration={DURATION:g} s")
+    print(f"process CPU {result['cpu'] * 100:.0f}% ({result['cpu'] / ROOMS * 1e6:.0f} us per room-second), "
+          f"AI updates {result['ai'] * 100:.1f}% ({result['ai'] / (2 * ROOMS) * 1e6:.1f} us per paddle-second)")
+    print(f"{result['frames/s']:,.0f} MOTION frames/s, {result['goals']} goals, {result['rooms left']} rooms left after leaving")
+
+
+if __name__ == "__main__":
+    main()
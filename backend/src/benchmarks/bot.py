@@ -0,0 +1,194 @@
+import time
+import socket
+import asyncio
+from struct import Struct
+
+import websockets
+
+from packages.types import codec
+from packages.types.payloads import IncomingPayload
+
+
+# Client frames, the server's layouts are in codec
+MOTION_STRUCT = Struct("<Bhh")
+COLLISION_STRUCT = Struct("<B8hB")
+CONNECT_FRAME = bytes((codec.CONNECT,))
+
+# MOTION frames carry the sender's bot id as pos_x and its send time as pos_y,
+# in ticks of 0.1 ms wrapped to an int16, so any receiver can time the relay
+TIME_TICKS = 10_000
+
+
+def time_ticks(now):
+    return ((int(now * TIME_TICKS) + 0x8000) & 0xFFFF) - 0x8000
+
+
+def elapsed_ticks(sent, now):
+    return ((time_ticks(now) - sent) & 0xFFFF) / TIME_TICKS
+
+
+class BotStats:
+    # Shared by every bot of a load run
+    def __init__(self):
+        self.recording = False
+        self.sent = 0
+        self.received = 0
+        self.motion_latency: list[float] = []
+        self.collision_latency: list[float] = []
+        self.goals = 0
+
+
+class Bot:
+    # A headless client speaking the game's binary protocol. Player 1 bots drive
+    # the COLLISION handshake of their room for both sides
+    registry: dict[int, "Bot"] = {}
+
+    # Receive buffers of a stalling bot, kept small so the server sees backpressure early
+    STALLED_BUFFER = 4096
+
+    def __init__(self, bot_id: int, url: str, stats: BotStats,
+                 motion_rate=60.0, collision_interval=0.5, goal_every=10, stalls=False):
+        self.bot_id = bot_id
+        self.url = url
+        self.stats = stats
+
+        # A stalling bot stops reading once its round started, like a client on a congested link
+        self.stalls = stalls
+
+        self.motion_rate = motion_rate
+        self.collision_interval = collision_interval
+        self.goal_every = goal_every
+
+        self.ws = None
+        self.is_player1 = False
+        self.opponent: Bot | None = None
+        self.in_round = asyncio.Event()
+
+        self.collisions = 0
+        self.collision_sent_at = None
+
+        Bot.registry[bot_id] = self
+
+    @staticmethod
+    def collision_frame(tag=None):
+        # A ball moving into player 1's paddle, valid for both sides of the handshake
+        values = (codec.COLLISION, 100, 360, -375, 200, 75, 360, 25, 150)
+        if tag is None:
+            return COLLISION_STRUCT.pack(*values, 0)[:-1]
+        return COLLISION_STRUCT.pack(*values, tag)
+
+    async def send(self, message):
+        await self.ws.send(message)
+        if self.stats.recording:
+            self.stats.sent += 1
+
+    async def send_motion(self):
+        interval = 1 / self.motion_rate
+        deadline = time.monotonic()
+
+        while True:
+            await self.in_round.wait()
+            await self.send(MOTION_STRUCT.pack(codec.MOTION, self.bot_id, time_ticks(time.monotonic())))
+
+            deadline = max(deadline + interval, time.monotonic())
+            await asyncio.sleep(deadline - time.monotonic())
+
+    async def send_collisions(self):
+        while True:
+            await asyncio.sleep(self.collision_interval)
+            await self.in_round.wait()
+
+            opponent = self.opponent
+            if opponent is None or not opponent.in_round.is_set() or self.collision_sent_at is not None:
+                continue
+
+            # Every goal_every-th pair is a goal on player 1's side
+            self.collisions += 1
+            if self.goal_every and self.collisions % self.goal_every == 0:
+                self.in_round.clear()
+                opponent.in_round.clear()
+                await self.send(self.collision_frame(IncomingPayload.LEFT_WALL))
+                await opponent.send(self.collision_frame(IncomingPayload.RIGHT_WALL))
+                if self.stats.recording:
+                    self.stats.goals += 1
+                continue
+
+            self.collision_sent_at = time.monotonic()
+            await self.send(self.collision_frame())
+            await opponent.send(self.collision_frame())
+
+    def on_message(self, message):
+        now = time.monotonic()
+        code = message[0]
+
+        if self.stats.recording:
+            self.stats.received += 1
+
+        if code == codec.OP_MOTION:
+            sender, sent = codec.OP_MOTION_STRUCT.unpack(message)[1:]
+            if self.opponent is None:
+                self.opponent = Bot.registry.get(sender)
+            if self.stats.recording:
+                self.stats.motion_latency.append(elapsed_ticks(sent, now))
+
+        elif code == codec.COLLISION_MOTION:
+            if self.collision_sent_at is not None:
+                if self.stats.recording:
+                    self.stats.collision_latency.append(now - self.collision_sent_at)
+                self.collision_sent_at = None
+
+        elif code == codec.CONNECTED:
+            self.is_player1 = message[1] == 0
+
+        elif code == codec.ROUND_START:
+            self.collision_sent_at = None
+            self.in_round.set()
+
+        elif code in (codec.ROUND_END, codec.RESULT, codec.OP_DISCONNECT):
+            self.in_round.clear()
+
+    async def connect(self):
+        if not self.stalls:
+            return await websockets.connect(self.url, compression=None, max_queue=None)
+
+        host, port = self.url.split("//")[1].split(":")
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.STALLED_BUFFER)
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, (host, int(port)))
+
+        return await websockets.connect(
+            self.url, sock=sock, compression=None, max_queue=1, read_limit=self.STALLED_BUFFER)
+
+    def drives_collisions(self):
+        if self.stalls or self.opponent is None:
+            return False
+
+        return self.is_player1 or self.opponent.stalls
+
+    async def run(self, connected: asyncio.Semaphore | None = None):
+        if connected is not None:
+            async with connected:
+                self.ws = await self.connect()
+        else:
+            self.ws = await self.connect()
+
+        tasks = [asyncio.create_task(self.send_motion())]
+        try:
+            await self.send(CONNECT_FRAME)
+
+            async for message in self.ws:
+                self.on_message(message)
+
+                # Start driving the handshake once the opponent is known
+                if len(tasks) == 1 and self.drives_collisions():
+                    tasks.append(asyncio.create_task(self.send_collisions()))
+
+                if self.stalls and self.in_round.is_set():
+                    await asyncio.Future()
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self.ws.close()
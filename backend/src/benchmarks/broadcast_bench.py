@@ -0,0 +1,100 @@
+import time
+import asyncio
+
+import websockets
+
+from packages.objects.room import Room
+from packages.types import codec
+
+
+PORT = 8104
+RECEIVER_COUNTS = [2, 10, 100, 1000]  # Two per room
+MESSAGE_BUDGET = 4000  # Messages times receivers of one measurement
+BATCH = 20  # Messages between two pauses, lets the receivers drain their sockets
+
+
+async def legacy_broadcast(room, message):
+    # Room.broadcast before this change: one task per member and an asyncio.wait set
+    targets = []
+    for player in (room.p1, room.p2):
+        if player is not None:
+            targets.append(asyncio.create_task(player.ws_connection.send(message)))
+
+    if targets:
+        await asyncio.wait(targets)
+
+
+async def drain(ws):
+    async for _ in ws:
+        pass
+
+
+async def measure(broadcast, rooms, message):
+    # One message is broadcast in every room. Only the broadcasts are timed,
+    # not the receivers draining their sockets
+    messages = max(5 * BATCH, MESSAGE_BUDGET // (2 * len(rooms)))
+    elapsed = 0
+    for _ in range(messages // BATCH):
+        start = time.perf_counter()
+        for _ in range(BATCH):
+            for room in rooms:
+                await broadcast(room, message)
+        elapsed += time.perf_counter() - start
+
+        await asyncio.sleep(0.0002 * len(rooms))
+
+    return elapsed / messages
+
+
+async def run(count):
+    accepted = []
+    ready = asyncio.Event()
+
+    async def handler(ws):
+        accepted.append(ws)
+        if len(accepted) == count:
+            ready.set()
+        await ws.wait_closed()
+
+    async with websockets.serve(handler, "127.0.0.1", PORT, compression=None, logger=None):
+        clients = [
+            await websockets.connect(f"ws://127.0.0.1:{PORT}", compression=None, max_queue=None)
+            for _ in range(count)
+        ]
+        readers = [asyncio.create_task(drain(client)) for client in clients]
+        await ready.wait()
+
+        rooms = []
+        for i in range(0, count, 2):
+            room = Room()
+            room.add_player(accepted[i])
+            room.add_player(accepted[i + 1])
+            rooms.append(room)
+
+        message = codec.encode_collision_motion(640, 360, 375, -375)
+
+        results = {}
+        for name, broadcast in (("tasks", legacy_broadcast), ("broadcast", Room.broadcast)):
+            results[name] = await measure(broadcast, rooms, message)
+
+        for client in clients:
+            await client.close()
+        await asyncio.gather(*readers, return_exceptions=True)
+
+    return results
+
+
+def main():
+    for count in RECEIVER_COUNTS:
+        results = asyncio.run(run(count))
+        tasks_time, broadcast_time = results["tasks"], results["broadcast"]
+        print(
+            f"receivers={count:>5}  "
+            f"tasks {tasks_time * 1e6:8.1f} us/msg ({count} tasks)  "
+            f"Room.broadcast {broadcast_time * 1e6:8.1f} us/msg (no tasks)  "
+            f"{tasks_time / broadcast_time:4.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import os
+import sys
+import time
+import json
+import runpy
+import signal
+import socket
+import asyncio
+import tempfile
+import subprocess
+
+import websockets
+
+from packages.types import codec
+from .cluster_bench import HOST, wait_for_server
+from .load_bench import server_usage
+
+
+PORT = int(os.getenv("BENCH_PORT", 8107))
+PAIRS = int(os.getenv("BENCH_PAIRS", 20))
+DURATION = float(os.getenv("BENCH_DURATION", 5))
+TICK_RATE = float(os.getenv("BENCH_TICK_RATE", 60))
+EVENTS = int(os.getenv("BENCH_EVENTS", 4))  # MOTION events a client sends per tick
+
+MOTION_FRAME = bytes((codec.MOTION,)) + codec.MOTION_STRUCT.pack(75, 360)[1:]
+
+# (name, client bundles its own events, server bundles the events it sends)
+MODES = (
+    ("single events", False, False),
+    ("bundled replies", False, True),
+    ("bundled both ways", True, True),
+)
+
+
+def serve(path):
+    # main.py with the socket calls of its event loop counted, the counts are
+    # written to the path on SIGUSR1
+    counts = {"reads": 0, "writes": 0}
+
+    def counted(method, key):
+        def wrapped(self, *args):
+            counts[key] += 1
+            return method(self, *args)
+        return wrapped
+
+    for name in ("recv", "recv_into"):
+        setattr(socket.socket, name, counted(getattr(socket.socket, name), "reads"))
+    for name in ("send", "sendmsg"):
+        setattr(socket.socket, name, counted(getattr(socket.socket, name), "writes"))
+
+    def dump(*_):
+        with open(path, "w") as file:
+            json.dump(counts, file)
+
+    signal.signal(signal.SIGUSR1, dump)
+    sys.argv = ["main.py"]
+    runpy.run_path("main.py", run_name="__main__")
+
+
+async def syscalls(server, path):
+    # (read, write) socket calls of the server so far
+    os.remove(path) if os.path.exists(path) else None
+    server.send_signal(signal.SIGUSR1)
+    while not os.path.exists(path):
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.01)
+    with open(path) as file:
+        counts = json.load(file)
+    return counts["reads"], counts["writes"]
+
+
+def count_events(message):
+    if message[0] == codec.SERVER_BUNDLE:
+        return sum(1 for event in codec.split_bundle(message) if event[0] == codec.OP_MOTION)
+    return 1 if message[0] == codec.OP_MOTION else 0
+
+
+async def play(send_bundles, receive_bundles, ready, start, received, frames):
+    flags = codec.BUNDLE_FLAG if receive_bundles else 0
+    async with websockets.connect(f"ws://{HOST}:{PORT}", compression=None) as ws:
+        await ws.send(bytes((codec.CONNECT, 0, 1, flags)))
+        await ws.recv()
+        ready.release()
+
+        async def receive():
+            async for message in ws:
+                received[0] += count_events(message)
+                frames[0] += 1
+
+        reader = asyncio.create_task(receive())
+        await start.wait()
+
+        # The events of a tick in one message, or one message each
+        bundle = bytes((codec.BUNDLE,)) + (bytes((len(MOTION_FRAME),)) + MOTION_FRAME) * EVENTS
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + DURATION
+        tick = loop.time()
+        while tick < deadline:
+            if send_bundles:
+                await ws.send(bundle)
+            else:
+                for _ in range(EVENTS):
+                    await ws.send(MOTION_FRAME)
+
+            tick += 1 / TICK_RATE
+            await asyncio.sleep(max(0, tick - loop.time()))
+
+        reader.cancel()
+
+
+async def run(server, path, send_bundles, receive_bundles):
+    await wait_for_server(PORT)
+
+    clients = 2 * PAIRS
+    ready = asyncio.Semaphore(0)
+    start = asyncio.Event()
+    received = [0]
+    frames = [0]
+
+    tasks = [
+        asyncio.create_task(play(send_bundles, receive_bundles, ready, start, received, frames))
+        for _ in range(clients)
+    ]
+    for _ in range(clients):
+        await ready.acquire()
+
+    reads, writes = await syscalls(server, path)
+    cpu, _ = server_usage(server.pid)
+    received[0] = frames[0] = 0
+    began = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - began
+
+    end_cpu, _ = server_usage(server.pid)
+    end_reads, end_writes = await syscalls(server, path)
+    return {
+        "events/s": received[0] / elapsed,
+        "messages/s": frames[0] / elapsed,
+        "reads/s": (end_reads - reads) / elapsed,
+        "writes/s": (end_writes - writes) / elapsed,
+        "server CPU": (end_cpu - cpu) / elapsed,
+    }
+
+
+def main():
+    offered = 2 * PAIRS * EVENTS * TICK_RATE
+    print(f"pairs={PAIRS} events per tick={EVENTS} tick rate={TICK_RATE:g} Hz offered={offered:,.0f} events/s")
+
+    env = dict(os.environ, SERVER_HOST=HOST, SERVER_PORT=str(PORT))
+    path = os.path.join(tempfile.mkdtemp(), "counts.json")
+    code = f"from benchmarks.bundle_bench import serve; serve({path!r})"
+    for name, send_bundles, receive_bundles in MODES:
+        server = subprocess.Popen(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env, stderr=subprocess.DEVNULL
+        )
+        try:
+            result = asyncio.run(run(server, path, send_bundles, receive_bundles))
+        finally:
+            server.terminate()
+            server.wait()
+
+        print(f"{name:18}  {result['events/s']:9,.0f} events/s  {result['messages/s']:9,.0f} messages/s  "
+              f"{result['reads/s']:8,.0f} reads/s  {result['writes/s']:8,.0f} writes/s  "
+              f"server CPU {result['server CPU'] * 100:3.0f}% "
+              f"({result['server CPU'] / result['events/s'] * 1e6:4.1f} us/event)")
+
+
+if __name__ == "__main__":
+    main()
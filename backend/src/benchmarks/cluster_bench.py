@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import asyncio
+import subprocess
+
+import websockets
+
+
+HOST = "127.0.0.1"
+PORT = int(os.getenv("BENCH_PORT", 8101))
+WORKERS = int(os.getenv("BENCH_WORKERS", 4))
+PAIRS = int(os.getenv("BENCH_PAIRS", 200))
+BUCKETS = int(os.getenv("BENCH_BUCKETS", 1))  # Matchmaking buckets the pairs are spread over
+
+CONNECT = 0
+COUNTDOWN_START = 2
+
+
+async def play(results, bucket):
+    # Connect, then wait to be paired with an opponent. The bucket is named
+    # in the request for the dispatcher and in CONNECT for the worker
+    async with websockets.connect(f"ws://{HOST}:{PORT}/?bucket={bucket}") as ws:
+        start = time.perf_counter()
+        await ws.send(bytes((CONNECT, bucket)))
+
+        try:
+            while True:
+                message = await asyncio.wait_for(ws.recv(), 10)
+                if message[0] == COUNTDOWN_START:
+                    results.append(time.perf_counter() - start)
+                    break
+        except asyncio.TimeoutError:
+            pass
+
+        # Hold the room until every client had the chance to be paired
+        await asyncio.sleep(1)
+
+
+async def wait_for_server(port=PORT):
+    for _ in range(100):
+        try:
+            async with websockets.connect(f"ws://{HOST}:{port}"):
+                return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start.")
+
+
+async def run():
+    await wait_for_server()
+
+    results = []
+    await asyncio.gather(*(play(results, i % BUCKETS) for i in range(2 * PAIRS)))
+
+    results.sort()
+    paired = len(results)
+    print(f"workers={WORKERS} buckets={BUCKETS} clients={2 * PAIRS} paired={paired}")
+    if paired:
+        print(f"time to COUNTDOWN_START p50={results[paired // 2] * 1000:.1f}ms "
+              f"p99={results[min(paired - 1, int(paired * 0.99))] * 1000:.1f}ms")
+
+    return paired == 2 * PAIRS
+
+
+def main():
+    env = dict(os.environ, SERVER_HOST=HOST, SERVER_PORT=str(PORT), SERVER_WORKERS=str(WORKERS))
+    server = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env
+    )
+
+    try:
+        ok = asyncio.run(run())
+    finally:
+        server.terminate()
+        server.wait()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
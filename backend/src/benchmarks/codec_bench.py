@@ -0,0 +1,103 @@
+import timeit
+
+from packages.types import codec
+from packages.types.payloads import \
+    CollisionPayload, MotionPayload, OpponentMotionPayload, RoundStartPayload, \
+    CollisionMotionPayload, RoundEndPayload, ResultPayload
+
+
+ITERATIONS = 200_000
+
+MOTION_FRAME = bytes((codec.MOTION,)) + (75).to_bytes(2, "little", signed=True) + (360).to_bytes(2, "little", signed=True)
+COLLISION_FRAME = bytes((codec.COLLISION,)) + b"".join(
+    v.to_bytes(2, "little", signed=True) for v in (640, 360, -375, 375, 75, 360, 25, 150)
+)
+GOAL_FRAME = COLLISION_FRAME + (1).to_bytes()
+
+RELAY_FRAME = bytearray(codec.MOTION_SIZE)
+
+
+def relay_motion(message):
+    # Mirrors the player_motion fast path
+    frame = RELAY_FRAME
+    frame[:] = message
+    frame[0] = codec.OP_MOTION
+    return frame
+
+
+CASES = [
+    (
+        "decode MOTION",
+        lambda: MotionPayload.from_bytes(MOTION_FRAME),
+        lambda: codec.decode_motion(MOTION_FRAME),
+    ),
+    (
+        "decode COLLISION",
+        lambda: CollisionPayload.from_bytes(COLLISION_FRAME),
+        lambda: codec.decode_collision(COLLISION_FRAME),
+    ),
+    (
+        "decode COLLISION (tagged)",
+        lambda: CollisionPayload.from_bytes(GOAL_FRAME),
+        lambda: codec.decode_collision(GOAL_FRAME),
+    ),
+    (
+        "encode OP_MOTION",
+        lambda: OpponentMotionPayload([75, 360]).to_bytes(),
+        lambda: codec.encode_op_motion(75, 360),
+    ),
+    (
+        "relay MOTION -> OP_MOTION",
+        lambda: OpponentMotionPayload(MotionPayload.from_bytes(MOTION_FRAME).position).to_bytes(),
+        lambda: relay_motion(MOTION_FRAME),
+    ),
+    (
+        "encode ROUND_START",
+        lambda: RoundStartPayload([640, 360], [375, -375]).to_bytes(),
+        lambda: codec.encode_round_start(640, 360, 375, -375),
+    ),
+    (
+        "encode COLLISION_MOTION",
+        lambda: CollisionMotionPayload([375, -375], [640, 360]).to_bytes(),
+        lambda: codec.encode_collision_motion(640, 360, 375, -375),
+    ),
+    (
+        "encode ROUND_END",
+        lambda: RoundEndPayload(3, 2).to_bytes(),
+        lambda: codec.encode_round_end(3, 2),
+    ),
+    (
+        "encode RESULT",
+        lambda: ResultPayload(5, 2).to_bytes(),
+        lambda: codec.encode_result(5, 2),
+    ),
+]
+
+
+def check_equivalence():
+    # Both implementations must produce identical frames
+    assert codec.encode_op_motion(75, 360) == OpponentMotionPayload([75, 360]).to_bytes()
+    assert relay_motion(MOTION_FRAME) == OpponentMotionPayload(MotionPayload.from_bytes(MOTION_FRAME).position).to_bytes()
+    assert codec.encode_round_start(640, 360, 375, -375) == RoundStartPayload([640, 360], [375, -375]).to_bytes()
+    assert codec.encode_collision_motion(640, 360, 375, -375) == \
+        CollisionMotionPayload([375, -375], [640, 360]).to_bytes()
+    assert codec.encode_round_end(3, 2) == RoundEndPayload(3, 2).to_bytes()
+    assert codec.encode_result(5, 2) == ResultPayload(5, 2).to_bytes()
+
+    payload = CollisionPayload.from_bytes(GOAL_FRAME)
+    assert codec.decode_collision(GOAL_FRAME) == \
+        (*payload.ball_pos, *payload.ball_vel, *payload.wall_pos, *payload.wall_scale, payload.tag)
+
+
+def main():
+    check_equivalence()
+
+    print(f"{'case':<28}{'classes (ns)':>14}{'codec (ns)':>14}{'speedup':>10}")
+    for name, legacy, fast in CASES:
+        legacy_ns = min(timeit.repeat(legacy, number=ITERATIONS, repeat=5)) / ITERATIONS * 1e9
+        fast_ns = min(timeit.repeat(fast, number=ITERATIONS, repeat=5)) / ITERATIONS * 1e9
+        print(f"{name:<28}{legacy_ns:>14.1f}{fast_ns:>14.1f}{legacy_ns / fast_ns:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
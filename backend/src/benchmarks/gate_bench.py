@@ -0,0 +1,97 @@
+import time
+import asyncio
+
+from packages.event_handlers import handlers
+from packages.managers import room_manager
+from packages.managers.event_gate import EventGate
+from packages.objects.room import Room
+from packages.objects.connection import VirtualConnection
+from packages.types import codec
+
+
+MESSAGES = 200_000
+ROUNDS = 5
+
+MOTION_FRAME = bytes((codec.MOTION,)) + codec.MOTION_STRUCT.pack(75, 360)[1:]
+COLLISION_FRAME = bytes((codec.COLLISION,)) + b"".join(
+    v.to_bytes(2, "little", signed=True) for v in (640, 360, -375, 375, 75, 360, 25, 150)
+)
+
+
+class Connection(VirtualConnection):
+    # Accepts frames without a network, so only the server's own work is timed
+    __slots__ = ()
+
+    def deliver(self, frame: bytes):
+        pass
+
+
+def admit(gate, ws, message, room, count):
+    # What handle_connection checks before a frame reaches its handler
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        gate.admit(ws, message, room)
+    return (time.perf_counter_ns() - start) / count
+
+
+async def handle(players, message, count):
+    # The players take turns, a COLLISION pair is resolved on every second frame
+    handler = handlers[message[0]]
+    start = time.perf_counter_ns()
+    for _ in range(count // len(players)):
+        for ws in players:
+            await handler(ws, message)
+    return (time.perf_counter_ns() - start) / count
+
+
+async def run():
+    p1, p2 = Connection("p1"), Connection("p2")
+    await room_manager.add_player(p1)
+    room = await room_manager.add_player(p2)
+    room.phase = Room.COUNTDOWN
+
+    # Every check passes
+    open_gate = EventGate()
+    limited = EventGate(rate_limit=True, window=1e9)
+    limited.limits[codec.MOTION] = 1 << 62
+
+    # Every MOTION is over budget, the window never ends during the run
+    exhausted = EventGate(rate_limit=True, window=1e9)
+    exhausted.limits[codec.MOTION] = 0
+    exhausted.FLOOD_FACTOR = 1 << 62
+
+    results = {}
+    for _ in range(ROUNDS):
+        room.phase = Room.COUNTDOWN
+        rows = [
+            ("reject COLLISION out of phase", admit(open_gate, p1, COLLISION_FRAME, room, MESSAGES)),
+        ]
+
+        room.phase = Room.PLAYING
+        rows += [
+            ("reject truncated COLLISION", admit(open_gate, p1, COLLISION_FRAME[:-1], room, MESSAGES)),
+        ]
+
+        room.phase = Room.PLAYING
+        rows += [
+            ("reject MOTION over budget", admit(exhausted, p1, MOTION_FRAME, room, MESSAGES)),
+            ("admit MOTION", admit(open_gate, p1, MOTION_FRAME, room, MESSAGES)),
+            ("admit MOTION, rate limited", admit(limited, p1, MOTION_FRAME, room, MESSAGES)),
+            ("MOTION handler", await handle((p1,), MOTION_FRAME, MESSAGES)),
+            # What an out-of-phase COLLISION could set off before
+            ("COLLISION handler", await handle((p1, p2), COLLISION_FRAME, MESSAGES)),
+        ]
+
+        for name, value in rows:
+            results[name] = min(results.get(name, value), value)
+
+    return results
+
+
+def main():
+    for name, value in asyncio.run(run()).items():
+        print(f"{name:30}  {value:6.0f} ns/frame")
+
+
+if __name__ == "__main__":
+    main()
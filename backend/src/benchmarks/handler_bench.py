@@ -0,0 +1,229 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import importlib
+import statistics
+from struct import Struct
+
+from packages.managers import room_manager
+from packages.managers.phase_timer import phase_timer
+from packages.managers.clock_sync import clock_sync
+from packages.managers.spectator_stream import spectator_stream
+from packages.objects.room import Room
+from packages.types import codec
+
+# The in-memory clients of the tests
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "tests"))
+from loopback import connect
+
+
+FRAMES = int(os.getenv("BENCH_FRAMES", 200_000))  # Frames per round of the per-opcode cases
+ROUNDS = int(os.getenv("BENCH_ROUNDS", 5))
+MATCHES = int(os.getenv("BENCH_MATCHES", 1_000))  # Matches played at once in the lifecycle case
+CHUNK = 1_000  # Frames pushed before the server is let to catch up
+
+COLLISION_STRUCT = Struct("<B8hB")
+PONG_STRUCT = Struct("<BII")
+
+MOTION_FRAME = bytes((codec.MOTION,)) + codec.MOTION_STRUCT.pack(75, 360)[1:]
+MOTION_V2_FRAME = bytes((codec.MOTION,)) + codec.MOTION_V2_STRUCT.pack(75, 360, 1)[1:]
+PONG_FRAME = PONG_STRUCT.pack(codec.PONG, 0, 0)
+BUNDLE_FRAME = bytes((codec.BUNDLE,)) + (bytes((len(MOTION_FRAME),)) + MOTION_FRAME) * 4
+
+# A ball moving into player 1's paddle, and into the wall behind it
+PADDLE_REPORT = COLLISION_STRUCT.pack(codec.COLLISION, 100, 360, -375, 200, 75, 360, 25, 150, 0)[:-1]
+GOAL_REPORTS = (
+    COLLISION_STRUCT.pack(codec.COLLISION, 25, 360, -375, 200, 0, 360, 10, 720, 0),
+    COLLISION_STRUCT.pack(codec.COLLISION, 25, 360, -375, 200, 0, 360, 10, 720, 1),
+)
+
+
+async def settle(*connections):
+    for connection in connections:
+        await connection.settle()
+
+
+async def pair(version=1, flags=0):
+    # Two players in a room whose round is under way
+    a, b = connect(), connect()
+    for connection in (a, b):
+        connection.push(bytes((codec.CONNECT, 0, version, flags)))
+        await connection.settle()
+
+    room = room_manager.client_room_map[a.id]
+    phase_timer.cancel(room)
+    room.phase = Room.PLAYING
+    a.drain()
+    b.drain()
+    return a, b
+
+
+async def unpair(*connections):
+    for connection in connections:
+        await connection.close()
+
+
+async def stream(frames_of, count):
+    # Pushes count frames in chunks, frames_of(i) gives the connection and frame
+    for start in range(0, count, CHUNK):
+        touched = set()
+        for i in range(start, min(start + CHUNK, count)):
+            connection, frame = frames_of(i)
+            connection.push(frame)
+            touched.add(connection)
+
+        await settle(*touched)
+        for connection in touched:
+            connection.drain()
+
+
+async def motion(version):
+    a, b = await pair(version)
+    frame = MOTION_FRAME if version == 1 else MOTION_V2_FRAME
+    yield lambda: stream(lambda i: (a if i & 1 else b, frame), FRAMES)
+    await unpair(a, b)
+
+
+async def collision():
+    # Both players report each hit once, the second report is answered
+    # with COLLISION_MOTION. A player's next report waits for the answer
+    a, b = await pair()
+
+    async def run():
+        for _ in range(FRAMES // 20):
+            a.push(PADDLE_REPORT)
+            b.push(PADDLE_REPORT)
+            await settle(a, b)
+            a.drain()
+            b.drain()
+
+    yield run
+    await unpair(a, b)
+
+
+async def pong():
+    a, b = await pair(version=2)
+    clock_sync.configure(0, False)
+    yield lambda: stream(lambda i: (a, PONG_FRAME), FRAMES)
+    await unpair(a, b)
+
+
+async def bundle():
+    a, b = await pair(flags=codec.BUNDLE_FLAG)
+    yield lambda: stream(lambda i: (a if i & 1 else b, BUNDLE_FRAME), FRAMES // 4)
+    await unpair(a, b)
+
+
+async def connect_cycle(opcode, count):
+    # Connections open, send their frame and close, CHUNK at a time
+    async def run():
+        for start in range(0, count, CHUNK):
+            connections = [connect() for _ in range(min(CHUNK, count - start))]
+            for connection in connections:
+                connection.push(bytes((opcode,)))
+            await settle(*connections)
+            await unpair(*connections)
+
+    yield run
+
+
+async def spectate():
+    a, b = await pair()
+    spectator_stream.configure(1)
+    async for run in connect_cycle(codec.SPECTATE, FRAMES // 10):
+        yield run
+    spectator_stream.configure(0)
+    await unpair(a, b)
+
+
+async def play_match():
+    # Five rounds of a few hits, every goal scored by player 2
+    a, b = connect(), connect()
+    a.push(bytes((codec.CONNECT,)))
+    b.push(bytes((codec.CONNECT,)))
+
+    async def until(connection, opcode):
+        while (await connection.receive())[0] != opcode:
+            pass
+
+    for _ in range(Room.win_threshold):
+        await until(a, codec.ROUND_START)
+        for _ in range(4):
+            a.push(PADDLE_REPORT)
+            b.push(PADDLE_REPORT)
+            await until(a, codec.COLLISION_MOTION)
+
+        a.push(GOAL_REPORTS[0])
+        b.push(GOAL_REPORTS[1])
+        await until(a, codec.ROUND_END)
+        b.drain()
+
+    await until(a, codec.RESULT)
+    await unpair(a, b)
+
+
+async def lifecycle():
+    # Matches from CONNECT to RESULT with the countdown and round end waits cut to a timer tick
+    start_round = importlib.import_module("packages.event_handlers.start_round")
+    end_round = importlib.import_module("packages.event_handlers.end_round")
+    delays = start_round.COUNTDOWN_TIME, end_round.ROUND_END_TIME
+    start_round.COUNTDOWN_TIME = end_round.ROUND_END_TIME = 0
+
+    async def run():
+        await asyncio.gather(*(play_match() for _ in range(MATCHES)))
+
+    yield run
+    start_round.COUNTDOWN_TIME, end_round.ROUND_END_TIME = delays
+
+
+# (name, case, operations per round, what an operation is)
+CASES = (
+    ("CONNECT + close", lambda: connect_cycle(codec.CONNECT, FRAMES // 10), FRAMES // 10, "client"),
+    ("MOTION v1", lambda: motion(1), FRAMES, "frame"),
+    ("MOTION v2", lambda: motion(2), FRAMES, "frame"),
+    ("COLLISION", collision, FRAMES // 10, "frame"),
+    ("PONG", pong, FRAMES, "frame"),
+    ("BUNDLE of 4 MOTION", bundle, FRAMES // 4, "frame"),
+    ("SPECTATE + close", spectate, FRAMES // 10, "client"),
+    ("match lifecycle", lifecycle, MATCHES, "match"),
+)
+
+
+async def measure(case, operations):
+    # Timings of every round after a warm-up round, in seconds per operation
+    timings = []
+    cpu = 0
+    async for run in case():
+        for round in range(ROUNDS + 1):
+            start_cpu = time.process_time()
+            start = time.perf_counter()
+            await run()
+            elapsed = time.perf_counter() - start
+            if round:
+                timings.append(elapsed / operations)
+                cpu += time.process_time() - start_cpu
+
+    return timings, cpu / (ROUNDS * operations)
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"rounds={ROUNDS} frames per round={FRAMES:,} matches at once={MATCHES:,}, "
+          f"times per operation in us")
+    print(f"{'name':22} {'min':>8} {'max':>8} {'mean':>8} {'stddev':>8} {'cpu':>8} {'ops/s':>11}")
+
+    async def run():
+        for name, case, operations, unit in CASES:
+            timings, cpu = await measure(case, operations)
+            mean = statistics.mean(timings)
+            print(f"{name:22} {min(timings) * 1e6:8.2f} {max(timings) * 1e6:8.2f} {mean * 1e6:8.2f} "
+                  f"{statistics.pstdev(timings) * 1e6:8.2f} {cpu * 1e6:8.2f} {1 / mean:11,.0f}  per {unit}")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import subprocess
+
+from .bot import Bot, BotStats
+from .cluster_bench import HOST, wait_for_server
+
+
+PORT = int(os.getenv("BENCH_PORT", 8102))
+BOTS = int(os.getenv("BENCH_BOTS", 1000))
+DURATION = float(os.getenv("BENCH_DURATION", 10))
+MOTION_RATE = float(os.getenv("BENCH_MOTION_RATE", 60))
+COLLISION_INTERVAL = float(os.getenv("BENCH_COLLISION_INTERVAL", 0.5))
+GOAL_EVERY = int(os.getenv("BENCH_GOAL_EVERY", 10))
+OUTPUT = os.getenv("BENCH_OUTPUT", "load_bench.json")
+
+# Connections opened at the same time, keeps the listen backlog from overflowing
+CONNECT_CONCURRENCY = 100
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def process_tree(pid):
+    # The server and its worker processes
+    pids = [pid]
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                if int(stat.read().rsplit(")", 1)[1].split()[1]) == pid:
+                    pids.append(int(entry))
+        except OSError:
+            pass
+    return pids
+
+
+def server_usage(pid):
+    # (cpu seconds, rss bytes) summed over the server's processes
+    cpu = 0
+    rss = 0
+    for child in process_tree(pid):
+        try:
+            with open(f"/proc/{child}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{child}/statm") as statm:
+                rss += int(statm.read().split()[1]) * PAGE_SIZE
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+    return cpu, rss
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return None
+
+    def at(p):
+        return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 3)
+
+    return {"p50_ms": at(0.5), "p99_ms": at(0.99), "max_ms": at(1), "samples": len(values)}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(server_pid):
+    await wait_for_server(PORT)
+
+    stats = BotStats()
+    connected = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    bots = [
+        Bot(index, f"ws://{HOST}:{PORT}", stats, MOTION_RATE, COLLISION_INTERVAL, GOAL_EVERY)
+        for index in range(BOTS)
+    ]
+    tasks = [asyncio.create_task(bot.run(connected)) for bot in bots]
+
+    # Wait for the first round of every room
+    try:
+        await asyncio.wait_for(asyncio.gather(*(bot.in_round.wait() for bot in bots)), 30 + BOTS / 100)
+    except asyncio.TimeoutError:
+        pass
+    playing = sum(bot.in_round.is_set() for bot in bots)
+
+    stats.recording = True
+    cpu_start, _ = server_usage(server_pid)
+    start = time.monotonic()
+
+    await asyncio.sleep(DURATION)
+
+    elapsed = time.monotonic() - start
+    cpu_end, rss = server_usage(server_pid)
+    stats.recording = False
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    return {
+        "revision": git_revision(),
+        "config": {
+            "bots": BOTS,
+            "duration_s": DURATION,
+            "motion_rate_hz": MOTION_RATE,
+            "collision_interval_s": COLLISION_INTERVAL,
+            "goal_every": GOAL_EVERY,
+            "server_env": {
+                name: os.environ[name] for name in sorted(os.environ)
+                if name in (
+                    "SERVER_WORKERS", "MOTION_TICK_RATE", "PHYSICS_TICK_RATE", "PHYSICS_BACKEND",
+                    "EVENT_LOOP", "WS_COMPRESSION",
+                )
+            },
+        },
+        "playing_bots": playing,
+        "messages_sent_per_s": round(stats.sent / elapsed),
+        "messages_received_per_s": round(stats.received / elapsed),
+        "op_motion_relay": percentiles(stats.motion_latency),
+        "collision_to_collision_motion": percentiles(stats.collision_latency),
+        "goals": stats.goals,
+        "server_cpu_percent": round(100 * (cpu_end - cpu_start) / elapsed, 1),
+        "server_rss_mib": round(rss / 2**20, 1),
+    }
+
+
+def main():
+    env = dict(os.environ, SERVER_HOST=HOST, SERVER_PORT=str(PORT))
+    server = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env
+    )
+
+    try:
+        results = asyncio.run(run(server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+    with open(OUTPUT, "w") as output:
+        json.dump(results, output, indent=2)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
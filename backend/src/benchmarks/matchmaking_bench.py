@@ -0,0 +1,136 @@
+import asyncio
+import os
+import random
+import resource
+import time
+
+from packages.managers.room_manager import RoomManager
+
+
+CLIENTS = int(os.getenv("BENCH_CLIENTS", 100_000))
+ARRIVAL_RATE = 100        # Simulated connections per second
+LEAVE_PROBABILITY = 0.9   # Chance that a connection is followed by a random disconnect
+BUCKET_WEIGHTS = [40, 25, 15, 10, 5, 3, 1, 1]
+MAX_WAIT = 2.0            # Simulated seconds before a player can be matched from any bucket
+
+
+class Connection:
+    # Only the id of a connection is used by the room manager
+    __slots__ = ("id", "bucket", "joined_at")
+
+    def __init__(self, id, bucket, joined_at):
+        self.id = id
+        self.bucket = bucket
+        self.joined_at = joined_at
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def rss_kib():
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+
+
+async def churn(manager: RoomManager, clock: Clock, seed=0):
+    rng = random.Random(seed)
+    buckets = rng.choices(range(len(BUCKET_WEIGHTS)), BUCKET_WEIGHTS, k=CLIENTS)
+
+    live: list[Connection] = []
+    add_times = []
+    remove_times = []
+    pairing_waits = []
+    cross_bucket = 0
+
+    def paired(ws, opponent):
+        nonlocal cross_bucket
+        pairing_waits.append(clock.now - opponent.joined_at)
+        pairing_waits.append(0.0)
+        cross_bucket += ws.bucket != opponent.bucket
+
+    for index in range(CLIENTS):
+        clock.now = index / ARRIVAL_RATE
+        ws = Connection(index, buckets[index], clock.now)
+
+        start = time.perf_counter()
+        room = await manager.add_player(ws, ws.bucket)
+        add_times.append(time.perf_counter() - start)
+        live.append(ws)
+
+        if room.has_two_players():
+            paired(ws, room.p1.ws_connection)
+
+        if rng.random() < LEAVE_PROBABILITY:
+            # Swap-remove a random live connection
+            slot = rng.randrange(len(live))
+            live[slot], live[-1] = live[-1], live[slot]
+            gone = live.pop()
+            room = manager.client_room_map[gone.id]
+            was_full = room.has_two_players()
+
+            start = time.perf_counter()
+            await manager.remove_player(gone.id)
+            remove_times.append(time.perf_counter() - start)
+
+            # The opponent left behind waits for a new one from now on
+            if was_full:
+                room.p1.ws_connection.joined_at = clock.now
+
+    peak_rss = rss_kib()
+
+    # Every room must be cleaned up once all players have left
+    for ws in live:
+        await manager.remove_player(ws.id)
+    assert not manager.client_room_map
+    assert manager.waiting_players == 0
+
+    return add_times, remove_times, pairing_waits, cross_bucket, peak_rss
+
+
+def report(label, times):
+    times.sort()
+    print(
+        f"{label:<16}"
+        f"p50 {percentile(times, 0.5) * 1e6:6.2f} us  "
+        f"p99 {percentile(times, 0.99) * 1e6:6.2f} us  "
+        f"p99.9 {percentile(times, 0.999) * 1e6:6.2f} us  "
+        f"({len(times) / sum(times):,.0f} ops/s)"
+    )
+
+
+def main():
+    clock = Clock()
+    manager = RoomManager(MAX_WAIT, clock)
+
+    start_rss = rss_kib()
+    add_times, remove_times, waits, cross_bucket, peak_rss = asyncio.run(churn(manager, clock))
+
+    print(f"{CLIENTS:,} clients, {len(BUCKET_WEIGHTS)} buckets, max wait {MAX_WAIT} s, "
+          f"{ARRIVAL_RATE:,} connections/s simulated")
+    report("add_player", add_times)
+    report("remove_player", remove_times)
+
+    waits.sort()
+    print(
+        f"{'pairing wait':<16}"
+        f"p50 {percentile(waits, 0.5) * 1e3:6.1f} ms  "
+        f"p99 {percentile(waits, 0.99) * 1e3:6.1f} ms  "
+        f"max {waits[-1] * 1e3:6.1f} ms  (simulated, {cross_bucket:,} cross-bucket matches)"
+    )
+    print(
+        f"{'rss':<16}{start_rss / 1024:.1f} MiB before, {peak_rss / 1024:.1f} MiB at the end of the churn, "
+        f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB peak"
+    )
+
+
+if __name__ == "__main__":
+    main()
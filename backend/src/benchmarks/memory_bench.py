@@ -0,0 +1,61 @@
+import asyncio
+import gc
+import tracemalloc
+
+from packages.managers.room_manager import RoomManager
+from packages.objects.player import Player
+from packages.objects.room import Room
+
+
+ROOM_COUNTS = [10_000, 100_000]
+
+
+class Connection:
+    # Only the id of a connection is kept by the server objects
+    __slots__ = ("id",)
+
+    def __init__(self, id):
+        self.id = id
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+
+    kept = build(count)
+
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+
+    del kept
+    return used / count
+
+
+def build_rooms(count):
+    return [Room(Player(), Player()) for _ in range(count)]
+
+
+def build_managed_rooms(count):
+    # Rooms filled through the room manager, including its client map
+    async def fill():
+        manager = RoomManager()
+        for index in range(2 * count):
+            await manager.add_player(Connection(index))
+        return manager
+
+    return asyncio.run(fill())
+
+
+def main():
+    for count in ROOM_COUNTS:
+        print(
+            f"rooms={count:>7,}  "
+            f"room+players {measure(build_rooms, count):6.0f} B/room  "
+            f"via RoomManager {measure(build_managed_rooms, count):6.0f} B/room"
+        )
+
+
+if __name__ == "__main__":
+    main()
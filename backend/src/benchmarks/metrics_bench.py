@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+from websockets.frames import Opcode
+
+from packages.event_handlers import handlers
+from packages.managers import room_manager
+from packages.managers.metrics import metrics
+from packages.objects.room import Room
+from packages.objects.connection import VirtualConnection
+from packages.types import codec
+
+
+MESSAGES = 200_000
+ROUNDS = 5
+
+# Added cost per handled MOTION message with metrics enabled, counting the
+# OP_MOTION frame it relays included
+BUDGET_NS = 2_500
+
+
+class Connection(VirtualConnection):
+    # Accepts frames without a network, so only the server's own work is timed.
+    # send() writes through write_frame_sync as a websocket does
+    __slots__ = ()
+
+    async def send(self, message):
+        self.write_frame_sync(True, Opcode.BINARY, message)
+
+    def deliver(self, frame: bytes):
+        pass
+
+
+async def broadcast(room, count):
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        await room.broadcast(codec.COUNTDOWN_START_FRAME)
+    return (time.perf_counter_ns() - start) / count
+
+
+async def dispatch(ws, message, count):
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        await handlers[message[0]](ws, message)
+    return (time.perf_counter_ns() - start) / count
+
+
+async def measure(rounds):
+    p1, p2 = Connection(1), Connection(2)
+    await room_manager.add_player(p1)
+    room = await room_manager.add_player(p2)
+    message = bytes((codec.MOTION,)) + codec.MOTION_STRUCT.pack(360, 200)[1:]
+
+    results = {"disabled": ([], []), "enabled": ([], [])}
+
+    # The functions configure() installs when metrics are enabled
+    plain = (handlers[codec.MOTION], Room.broadcast, Connection.write_frame_sync)
+    functions = {
+        "disabled": plain,
+        "enabled": (
+            metrics.instrument_handler(codec.MOTION, plain[0]),
+            metrics.instrument_broadcast(plain[1]),
+            metrics.instrument_write(plain[2]),
+        ),
+    }
+
+    def use(state):
+        handlers[codec.MOTION], Room.broadcast, Connection.write_frame_sync = functions[state]
+
+    for _ in range(rounds):
+        # Alternate between the plain and the instrumented functions
+        # so both see the same interpreter state
+        for state, (handled, broadcasted) in results.items():
+            use(state)
+            handled.append(await dispatch(p1, message, MESSAGES))
+            broadcasted.append(await broadcast(room, MESSAGES // 10))
+
+    use("disabled")
+    await room_manager.remove_player(p1.id)
+    await room_manager.remove_player(p2.id)
+    return {state: (min(handled), min(broadcasted)) for state, (handled, broadcasted) in results.items()}
+
+
+def main():
+    results = asyncio.run(measure(ROUNDS))
+    disabled, disabled_broadcast = results["disabled"]
+    enabled, enabled_broadcast = results["enabled"]
+
+    overhead = enabled - disabled
+    print(f"MOTION handler    disabled {disabled:7.0f} ns  enabled {enabled:7.0f} ns  overhead {overhead:5.0f} ns")
+    print(f"Room.broadcast    disabled {disabled_broadcast:7.0f} ns  enabled {enabled_broadcast:7.0f} ns  "
+          f"overhead {enabled_broadcast - disabled_broadcast:5.0f} ns")
+    print(f"budget {BUDGET_NS} ns per message: {'ok' if overhead <= BUDGET_NS else 'EXCEEDED'}")
+
+    if overhead > BUDGET_NS:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
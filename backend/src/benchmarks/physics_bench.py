@@ -0,0 +1,83 @@
+import random
+import time
+
+from packages.ecs_systems.physics_system import PhysicSystem
+from packages.ecs_systems.batch_physics_system import BatchPhysicSystem
+from packages.objects.player import Player
+from packages.objects.room import Room
+
+
+ROOM_COUNTS = [100, 1_000, 10_000]
+STEPS = 60
+DT = 1 / 60
+
+
+def create_rooms(count, seed=0):
+    rng = random.Random(seed)
+    rooms = []
+    for _ in range(count):
+        room = Room(
+            Player([PhysicSystem.PADDLE_OFFSET, rng.randrange(75, 645)]),
+            Player([PhysicSystem.WORLD_WIDTH - PhysicSystem.PADDLE_OFFSET, rng.randrange(75, 645)]),
+            (rng.randrange(320, 960), rng.randrange(25, 695)),
+            (rng.choice((-1, 1)) * 375, rng.choice((-1, 1)) * 375),
+        )
+        rooms.append(room)
+    return rooms
+
+
+def run(system, rooms):
+    for room in rooms:
+        system.add_room(room)
+
+    start = time.perf_counter()
+    for _ in range(STEPS):
+        _, goals = system.step(DT)
+
+        # Keep the number of simulated rooms steady
+        for room, _ in goals:
+            room.ball_pos = [640, 360]
+            system.add_room(room)
+    elapsed = time.perf_counter() - start
+
+    return len(rooms) * STEPS / elapsed
+
+
+def check_equivalence(count=500, steps=120):
+    scalar = PhysicSystem()
+    batch = PhysicSystem(batch=BatchPhysicSystem())
+    scalar_rooms = create_rooms(count, seed=1)
+    batch_rooms = create_rooms(count, seed=1)
+
+    for room in scalar_rooms:
+        scalar.add_room(room)
+    for room in batch_rooms:
+        batch.add_room(room)
+
+    for _ in range(steps):
+        scalar_bounced, scalar_goals = scalar.step(DT)
+        batch_bounced, batch_goals = batch.step(DT)
+
+        assert sorted(scalar_rooms.index(r) for r in scalar_bounced) == \
+            sorted(batch_rooms.index(r) for r in batch_bounced)
+        assert sorted((scalar_rooms.index(r), t) for r, t in scalar_goals) == \
+            sorted((batch_rooms.index(r), t) for r, t in batch_goals)
+
+    for room in batch_rooms:
+        batch.remove_room(room)
+    for a, b in zip(scalar_rooms, batch_rooms):
+        assert abs(a.ball_pos[0] - b.ball_pos[0]) < 1e-6 and abs(a.ball_pos[1] - b.ball_pos[1]) < 1e-6
+
+
+def main():
+    check_equivalence()
+
+    print(f"{'rooms':>8}{'scalar (rooms/s)':>20}{'numpy (rooms/s)':>20}{'speedup':>10}")
+    for count in ROOM_COUNTS:
+        scalar = run(PhysicSystem(), create_rooms(count))
+        batch = run(PhysicSystem(batch=BatchPhysicSystem()), create_rooms(count))
+        print(f"{count:>8}{scalar:>20,.0f}{batch:>20,.0f}{batch / scalar:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
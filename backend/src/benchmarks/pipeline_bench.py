@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import socket
+import asyncio
+import subprocess
+
+import websockets
+
+from .bot import Bot, BotStats
+from .cluster_bench import HOST, wait_for_server
+from .load_bench import percentiles, server_usage
+
+
+PORT = int(os.getenv("BENCH_PORT", 8103))
+PAIRS = int(os.getenv("BENCH_PAIRS", 8))
+SLOW_EVERY = int(os.getenv("BENCH_SLOW_EVERY", 2))  # One stalling bot in every n-th room
+DURATION = float(os.getenv("BENCH_DURATION", 20))
+MOTION_RATE = float(os.getenv("BENCH_MOTION_RATE", 20000))
+QUEUE_SIZES = [0, 64]
+
+# Kernel send buffer of the server's sockets. Loopback buffers grow to megabytes,
+# a small fixed one lets a stalled client push back within seconds
+SEND_BUFFER = 16384
+
+
+async def serve():
+    # The server of main.py, listening on a socket with a fixed send buffer
+    # that accepted connections inherit
+    import main
+    from packages.api.server import handle_connection
+
+    main.configure()
+
+    listener = socket.create_server((HOST, PORT))
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+
+    async with websockets.serve(handle_connection, sock=listener, logger=None):
+        await asyncio.Future()
+
+
+async def run(server_pid):
+    await wait_for_server(PORT)
+
+    warmup = BotStats()
+    bots = []
+    tasks = []
+
+    # Connect the rooms one at a time so the stalling bots are spread as planned
+    for pair in range(PAIRS):
+        stalls = SLOW_EVERY > 0 and pair % SLOW_EVERY == 0
+        for index in (2 * pair, 2 * pair + 1):
+            bot = Bot(
+                index, f"ws://{HOST}:{PORT}", warmup,
+                motion_rate=60 if stalls and index % 2 else MOTION_RATE,
+                collision_interval=0.1, goal_every=0,
+                stalls=stalls and index % 2 == 1
+            )
+            bots.append(bot)
+            tasks.append(asyncio.create_task(bot.run()))
+            await asyncio.sleep(0.002)
+
+    await asyncio.wait_for(asyncio.gather(*(bot.in_round.wait() for bot in bots)), 30)
+    while any(bot.opponent is None for bot in bots if not bot.stalls):
+        await asyncio.sleep(0.1)
+
+    # Fast bots are reported by the kind of opponent they have
+    groups = {"fast_vs_fast": BotStats(), "fast_vs_stalled": BotStats()}
+    counts = {"fast_vs_fast": 0, "fast_vs_stalled": 0}
+    for bot in bots:
+        if bot.stalls:
+            continue
+
+        name = "fast_vs_stalled" if bot.opponent.stalls else "fast_vs_fast"
+        bot.stats = groups[name]
+        counts[name] += 1
+
+    cpu_start, _ = server_usage(server_pid)
+    for stats in groups.values():
+        stats.recording = True
+
+    await asyncio.sleep(DURATION)
+
+    for stats in groups.values():
+        stats.recording = False
+    cpu_end, rss = server_usage(server_pid)
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    Bot.registry.clear()
+
+    results = {}
+    for name, stats in groups.items():
+        results[name] = {
+            "bots": counts[name],
+            "motion_sent_per_bot_per_s": round(stats.sent / DURATION / max(1, counts[name]), 1),
+            "received_per_bot_per_s": round(stats.received / DURATION / max(1, counts[name]), 1),
+            "op_motion_relay": percentiles(stats.motion_latency),
+            "collision_to_collision_motion": percentiles(stats.collision_latency),
+        }
+    results["server_cpu_percent"] = round(100 * (cpu_end - cpu_start) / DURATION, 1)
+    results["server_rss_mib"] = round(rss / 2**20, 1)
+    return results
+
+
+def main():
+    results = {}
+    for queue_size in QUEUE_SIZES:
+        env = dict(os.environ, SERVER_HOST=HOST, SERVER_PORT=str(PORT), SEND_QUEUE_SIZE=str(queue_size))
+        server = subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.pipeline_bench", "serve"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            env=env
+        )
+
+        try:
+            results[f"SEND_QUEUE_SIZE={queue_size}"] = asyncio.run(run(server.pid))
+        finally:
+            server.terminate()
+            server.wait()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["serve"]:
+        asyncio.run(serve())
+    else:
+        main()
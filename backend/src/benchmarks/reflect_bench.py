@@ -0,0 +1,26 @@
+import timeit
+
+from packages.ecs_systems.physics_system import PhysicSystem
+
+
+ITERATIONS = 200_000
+
+CASES = [
+    ("side hit", (40, 360), (-375, 375), (75, 360), (25, 150)),
+    ("top hit", (75, 270), (-375, 375), (75, 360), (25, 150)),
+    ("corner hit", (50, 274), (-375, 375), (75, 360), (25, 150)),
+    ("screen border", (600, 20), (375, -375), (640, -1), (1280, 2)),
+]
+
+
+def main():
+    print(f"{'case':<16}{'atan2 (ns)':>14}{'integer (ns)':>14}{'speedup':>10}")
+    for name, *args in CASES:
+        legacy_ns = min(timeit.repeat(lambda: PhysicSystem.reflect_object(*args), number=ITERATIONS, repeat=5))
+        fast_ns = min(timeit.repeat(lambda: PhysicSystem.reflect(*args), number=ITERATIONS, repeat=5))
+        legacy_ns, fast_ns = legacy_ns / ITERATIONS * 1e9, fast_ns / ITERATIONS * 1e9
+        print(f"{name:<16}{legacy_ns:>14.1f}{fast_ns:>14.1f}{legacy_ns / fast_ns:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
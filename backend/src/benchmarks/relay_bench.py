@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import asyncio
+import subprocess
+import urllib.request
+
+import websockets
+
+from packages.types import codec
+from .cluster_bench import HOST, wait_for_server
+
+
+BROKER_PORT = int(os.getenv("BENCH_BROKER_PORT", 8210))
+NODE_PORTS = (int(os.getenv("BENCH_PORT", 8211)), int(os.getenv("BENCH_PORT", 8211)) + 1)
+METRICS_PORTS = (NODE_PORTS[0] + 10, NODE_PORTS[1] + 10)
+PAIRS = int(os.getenv("BENCH_PAIRS", 20))
+DURATION = float(os.getenv("BENCH_DURATION", 5))
+MOTION_RATE = float(os.getenv("BENCH_MOTION_RATE", 30))
+
+
+class Client:
+    # MOTION frames carry the client's index as pos_x and a sequence number as
+    # pos_y, the opponent's OP_MOTION is timed against the send time
+    def __init__(self, index, sent, latencies):
+        self.index = index
+        self.sent = sent
+        self.latencies = latencies
+        self.ws = None
+
+    async def connect(self, port):
+        self.ws = await websockets.connect(f"ws://{HOST}:{port}", compression=None)
+        await self.ws.send(bytes((codec.CONNECT,)))
+        await self.ws.recv()
+
+    async def receive(self):
+        async for message in self.ws:
+            if message[0] != codec.OP_MOTION:
+                continue
+
+            sender, seq = codec.MOTION_STRUCT.unpack_from(message)
+            sent = self.sent.pop((sender, seq), None)
+            if sent is not None:
+                self.latencies.append(time.perf_counter() - sent)
+
+    async def play(self, deadline, offset):
+        # Clients are spread over the tick so they do not send all at once
+        loop = asyncio.get_running_loop()
+        tick = loop.time() + offset / MOTION_RATE
+        await asyncio.sleep(offset / MOTION_RATE)
+        seq = 0
+        while tick < deadline:
+            seq = (seq + 1) & 0x7FFF
+            self.sent[(self.index, seq)] = time.perf_counter()
+            await self.ws.send(bytes((codec.MOTION,)) + codec.MOTION_STRUCT.pack(self.index, seq)[1:])
+
+            tick += 1 / MOTION_RATE
+            await asyncio.sleep(max(0, tick - loop.time()))
+
+
+def relay_counters(port):
+    with urllib.request.urlopen(f"http://{HOST}:{port}/metrics") as response:
+        lines = response.read().decode().splitlines()
+
+    values = {}
+    for line in lines:
+        if line.startswith(("pong_relay_batches_total", "pong_relay_entries_total")):
+            name, value = line.split()
+            values[name] = float(value)
+    return values
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return "no samples"
+
+    def at(p):
+        return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+    return f"p50 {at(0.5):6.2f} ms  p99 {at(0.99):6.2f} ms  max {at(1):6.2f} ms  ({len(values)} frames)"
+
+
+async def run():
+    for port in NODE_PORTS:
+        await wait_for_server(port)
+
+    sent = {}
+    local, remote = [], []
+    before = after = None
+
+    # Both players on node 1, then one waiting on node 1 and its opponent
+    # claiming the room from node 2. Pairs are made one at a time
+    for latencies, second_port in ((local, NODE_PORTS[0]), (remote, NODE_PORTS[1])):
+        clients = []
+        for pair in range(PAIRS):
+            first = Client(2 * pair, sent, latencies)
+            second = Client(2 * pair + 1, sent, latencies)
+            await first.connect(NODE_PORTS[0])
+            await second.connect(second_port)
+            clients += [first, second]
+
+        before = [relay_counters(port) for port in METRICS_PORTS]
+        readers = [asyncio.create_task(client.receive()) for client in clients]
+        deadline = asyncio.get_running_loop().time() + DURATION
+        await asyncio.gather(*(client.play(deadline, i / len(clients)) for i, client in enumerate(clients)))
+        await asyncio.sleep(0.5)
+        after = [relay_counters(port) for port in METRICS_PORTS]
+
+        for reader in readers:
+            reader.cancel()
+        for client in clients:
+            await client.ws.close()
+        sent.clear()
+
+    # Relay counters of the second run
+    return local, remote, before, after
+
+
+def main():
+    src = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    broker = subprocess.Popen(
+        [sys.executable, "-m", "packages.api.broker"], cwd=src,
+        env=dict(os.environ, BROKER_HOST=HOST, BROKER_PORT=str(BROKER_PORT)), stderr=subprocess.DEVNULL
+    )
+    time.sleep(0.5)
+
+    nodes = [
+        subprocess.Popen(
+            [sys.executable, "main.py"], cwd=src, stderr=subprocess.DEVNULL,
+            env=dict(os.environ, SERVER_HOST=HOST, SERVER_PORT=str(port), METRICS_PORT=str(metrics_port),
+                     BACKPLANE=f"{HOST}:{BROKER_PORT}")
+        )
+        for port, metrics_port in zip(NODE_PORTS, METRICS_PORTS)
+    ]
+
+    try:
+        local, remote, before, after = asyncio.run(run())
+    finally:
+        for process in nodes + [broker]:
+            process.terminate()
+            process.wait()
+
+    print(f"pairs={PAIRS} per path, MOTION at {MOTION_RATE:g} Hz for {DURATION:g} s")
+    print(f"same node    {percentiles(local)}")
+    print(f"across nodes {percentiles(remote)}")
+    if local and remote:
+        added = sorted(remote)[len(remote) // 2] - sorted(local)[len(local) // 2]
+        print(f"added by the relay at p50: {added * 1000:.2f} ms")
+
+    for node, (start, end) in enumerate(zip(before, after), 1):
+        batches = end["pong_relay_batches_total"] - start["pong_relay_batches_total"]
+        entries = end["pong_relay_entries_total"] - start["pong_relay_entries_total"]
+        if batches:
+            print(f"node {node}: {batches / DURATION:,.0f} batches/s, {entries / batches:.1f} frames per batch")
+
+
+if __name__ == "__main__":
+    main()
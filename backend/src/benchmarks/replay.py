@@ -0,0 +1,273 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import selectors
+import tempfile
+from collections import Counter, defaultdict
+
+from packages.api.server import accepts_bundles
+from packages.event_handlers import handlers
+from packages.event_handlers.lost_connection import lost_connection
+from packages.event_handlers.end_round import score_round
+from packages.managers import room_manager
+from packages.managers.motion_scheduler import motion_scheduler
+from packages.managers.clock_sync import clock_sync
+from packages.managers.phase_timer import phase_timer
+from packages.managers.event_gate import event_gate
+from packages.objects.server_clock import server_clock
+from packages.managers.recorder import recorder, RecordLog, OUTBOUND, CLOSED
+from packages.objects.connection import VirtualConnection
+from packages.ecs_systems.physics_system import physics_system
+from packages.types import codec
+
+
+# Virtual time the replay keeps running after the last record, so the
+# timers that fired before the recording stopped fire here as well
+SETTLE_TIME = 0.001
+
+
+class VirtualSelector(selectors.DefaultSelector):
+    # Never blocks, the time the loop would have waited is skipped instead
+    def __init__(self):
+        super().__init__()
+        self.now = 0.0
+
+    def select(self, timeout=None):
+        if timeout is not None and timeout > 0:
+            self.now += timeout
+        return super().select(0)
+
+
+class VirtualClockLoop(asyncio.SelectorEventLoop):
+    # Timers fire in the recorded order without waiting, so handlers, the
+    # round timers and the physics loop see the recorded timing at full speed
+    def __init__(self):
+        self.clock = VirtualSelector()
+        super().__init__(self.clock)
+
+    def time(self):
+        return self.clock.now
+
+
+class ReplayConnection(VirtualConnection):
+    # A recorded client, the frames the server writes are counted
+    def __init__(self, number, sent):
+        super().__init__(number)
+        self.sent = sent
+        self.dead = False
+
+    def deliver(self, frame):
+        self.sent[frame[0]] += 1
+
+
+class DesyncLog(logging.Handler):
+    # Collects the collision desyncs logged by collision.py
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.hits = 0
+
+    def emit(self, record):
+        if record.getMessage().startswith("[UNHANDLED CASE]"):
+            self.hits += 1
+
+
+def configure(config, clock):
+    # The server configuration the log was recorded with
+    room_manager.configure(config.get("matchmaking_max_wait"))
+    room_manager.clock = clock
+    motion_scheduler.configure(config.get("motion_tick_rate", 0))
+
+    batch = None
+    if config.get("physics_backend") == "numpy":
+        from packages.ecs_systems.batch_physics_system import BatchPhysicSystem
+        batch = BatchPhysicSystem()
+
+    physics_system.configure(config.get("physics_tick_rate", 0), on_goal=score_round, batch=batch)
+
+    # Ticks follow the virtual clock, PONG answers are replayed without sending PINGs
+    server_clock.clock = clock
+    server_clock.configure(config.get("server_tick_rate", 60))
+    clock_sync.configure(0, config.get("lag_compensation", False))
+
+    event_gate.clock = clock
+    event_gate.configure(config.get("rate_limit", False))
+
+
+async def replay(log, desyncs, verify_path):
+    loop = asyncio.get_running_loop()
+    configure(log.config, loop.time)
+
+    # Records the replay the same way the server did, for the comparison
+    if verify_path is not None:
+        recorder.path = verify_path
+        recorder.start(log.config, seed=log.seed)
+
+    sent = Counter()
+    connections = {}
+    errors = Counter()
+    reports = []
+    tasks = []
+
+    def task_done(task):
+        if not task.cancelled() and task.exception() is not None:
+            errors[type(task.exception()).__name__] += 1
+
+    inbound = 0
+    end = 0
+    for time_ns, number, room_id, kind, frame in log:
+        end = time_ns / 1e9
+        if kind == OUTBOUND:
+            continue
+
+        delay = end - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        ws = connections.get(number)
+        if ws is None:
+            ws = connections[number] = ReplayConnection(number, sent)
+
+        if kind == CLOSED:
+            ws.dead = True
+            if recorder.enabled:
+                room = room_manager.client_room_map.get(ws.id)
+                recorder.closed(ws.id, room and room.room_id)
+            await lost_connection(ws)
+            event_gate.forget(ws)
+            continue
+
+        # The server closed the client, only its CLOSED record is left
+        if ws.dead:
+            continue
+
+        inbound += 1
+        room = room_manager.client_room_map.get(ws.id)
+        if recorder.enabled:
+            recorder.inbound(ws.id, room and room.room_id, frame)
+
+        events = (frame,)
+        if frame[0] == codec.BUNDLE:
+            if not accepts_bundles(ws):
+                continue
+
+            try:
+                events = codec.split_bundle(frame)
+            except ValueError:
+                errors["MalformedBundle"] += 1
+                ws.dead = True
+                continue
+
+        for event in events:
+            room = room_manager.client_room_map.get(ws.id)
+
+            # A flooding client was closed by the server, its CLOSED record follows
+            if not event_gate.admit(ws, event, room):
+                if ws.id in event_gate.flooding:
+                    break
+                continue
+
+            handle_func = handlers.get(event[0])
+            if handle_func is None:
+                continue
+
+            # The pair of reports a desync is decided on
+            if event[0] == codec.COLLISION and room is not None:
+                pending = [payload for payload in room.collision_payloads if payload is not None]
+
+            hits = desyncs.hits
+            try:
+                result = await handle_func(ws, event)
+            except Exception as e:
+                # The server closes a client whose handler raised
+                errors[type(e).__name__] += 1
+                ws.dead = True
+                break
+
+            if isinstance(result, asyncio.Task):
+                result.add_done_callback(task_done)
+                tasks.append(result)
+
+            if desyncs.hits != hits:
+                reports.append((time_ns / 1e9, room.room_id, [codec.decode_collision(payload) for payload in pending + [event]]))
+
+    # Run up to the last record, the rounds still in flight then stop as the server did
+    await asyncio.sleep(max(0, end - loop.time()) + SETTLE_TIME)
+    for task in tasks:
+        task.cancel()
+    for task in (physics_system.task, motion_scheduler.task, phase_timer.task):
+        if task is not None:
+            task.cancel()
+
+    recorder.close()
+    return inbound, sent, errors, reports
+
+
+def room_frames(log):
+    # Outbound frames of every room in order, per connection and for the whole
+    # room. Sub-millisecond jitter may interleave the streams differently
+    frames = defaultdict(list)
+    for _, number, room_id, kind, frame in log:
+        if kind == OUTBOUND:
+            frames[room_id, number].append(frame)
+    return frames
+
+
+def compare(original, replayed):
+    expected, actual = room_frames(original), room_frames(replayed)
+    keys = expected.keys() | actual.keys()
+    mismatched = {key[0] for key in keys if expected.get(key) != actual.get(key)}
+    return len({key[0] for key in keys}), sorted(mismatched)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a match recording against the event handlers.")
+    parser.add_argument("log", help="file written by the server with RECORD_DIR set")
+    parser.add_argument("--no-verify", action="store_true", help="only time the replay")
+    args = parser.parse_args()
+
+    desyncs = DesyncLog()
+    logging.getLogger().addHandler(desyncs)
+
+    log = RecordLog(args.log)
+    records = sum(1 for _ in log)
+    duration = max((record[0] for record in log), default=0) / 1e9
+
+    verify_path = None
+    if not args.no_verify:
+        verify_path = os.path.join(tempfile.mkdtemp(), "replay.rec")
+
+    loop = VirtualClockLoop()
+    start = time.perf_counter()
+    try:
+        inbound, sent, errors, reports = loop.run_until_complete(replay(log, desyncs, verify_path))
+    finally:
+        loop.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"records {records}  inbound replayed {inbound}  recorded span {duration:.1f} s")
+    print(f"replayed in {elapsed:.2f} s ({inbound / elapsed:,.0f} frames/s, {duration / elapsed:,.0f}x real time)")
+    print(f"frames sent by opcode {dict(sorted(sent.items()))}")
+    if errors:
+        print(f"handler errors {dict(errors)}")
+
+    print(f"collision desyncs {len(reports)}")
+    for at, room_id, payloads in reports:
+        print(f"  t={at:.3f}s room {room_id}")
+        for payload in payloads:
+            print(f"    {payload}")
+
+    if verify_path is not None:
+        replayed = RecordLog(verify_path)
+        rooms, mismatched = compare(log, replayed)
+        replayed.close()
+        os.remove(verify_path)
+        print(f"rooms {rooms}  matching the recording {rooms - len(mismatched)}  differing {mismatched[:20]}")
+
+    log.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import json
+import random
+import socket
+import asyncio
+import logging
+import subprocess
+from struct import Struct
+
+from packages.managers import room_manager
+from packages.managers.handoff import handoff, SIZE_STRUCT, READY, SNAPSHOT_HEADER_STRUCT
+from packages.managers.phase_timer import phase_timer
+from packages.managers.sessions import sessions
+from packages.objects.room import Room
+from packages.types import codec
+
+# The in-memory clients of the tests
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, "tests"))
+from loopback import connect
+
+
+ROOMS = int(os.getenv("BENCH_ROOMS", 10_000))
+CHUNK = 1_000  # Clients connected before the server is let to catch up
+
+# Parent -> successor: every seat's token and the score its client expects
+SEAT_STRUCT = Struct("<QBB")
+
+
+def connect_frame(token=0):
+    frame = bytes((codec.CONNECT, 0, 1, codec.RESUME_FLAG))
+    return frame + codec.CONNECT_TOKEN_STRUCT.pack(token)[4:] if token else frame
+
+
+async def settle(connections):
+    for connection in connections:
+        await connection.settle()
+
+
+async def build():
+    # ROOMS matches under way with random scores, as the previous server
+    rng = random.Random(0)
+    clients = []
+    for start in range(0, 2 * ROOMS, CHUNK):
+        chunk = [connect() for _ in range(min(CHUNK, 2 * ROOMS - start))]
+        for client in chunk:
+            client.push(connect_frame())
+        await settle(chunk)
+        clients += chunk
+
+    seats = bytearray()
+    for room in room_manager.rooms.values():
+        phase_timer.cancel(room)
+        room.phase = Room.PLAYING
+        room.p1.score = rng.randrange(Room.win_threshold)
+        room.p2.score = rng.randrange(Room.win_threshold)
+        for player in (room.p1, room.p2):
+            seats += SEAT_STRUCT.pack(player.token, room.p1.score, room.p2.score)
+
+    for client in clients:
+        client.drain()
+
+    return clients, seats
+
+
+async def predecessor():
+    clients, seats = await build()
+    loop = asyncio.get_running_loop()
+
+    # The successor gets the channel like a hot restart's, the seats of its clients on stdin
+    channel, theirs = socket.socketpair()
+    spawned = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.restart_bench", "successor"],
+        env=dict(os.environ, HANDOFF_FD=str(theirs.fileno())),
+        pass_fds=(theirs.fileno(),), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+    )
+    theirs.close()
+    process.stdin.write(seats)
+    process.stdin.close()
+
+    channel.setblocking(False)
+    with channel:
+        if await loop.sock_recv(channel, 1) != READY:
+            raise RuntimeError("The successor did not start.")
+        booted = time.perf_counter()
+
+        # As handoff.run_restart(): the snapshot is sent before any client is let go
+        start = time.perf_counter()
+        snapshot = handoff.snapshot()
+        snapshot_time = time.perf_counter() - start
+
+        channel.settimeout(None)
+        channel.sendall(SIZE_STRUCT.pack(len(snapshot)) + snapshot)
+        sent = time.perf_counter()
+
+        for client in clients:
+            client.fail_connection()
+        let_go = time.perf_counter()
+
+    result = json.loads(process.stdout.read())
+    process.wait()
+
+    return {
+        "boot": booted - spawned,
+        "snapshot": snapshot_time,
+        "size": len(snapshot),
+        "send": sent - start - snapshot_time,
+        "let go": let_go - sent,
+        "transfer": result["received"] - start - snapshot_time,
+        **result,
+        "gap": result["back"] - start,
+    }
+
+
+async def successor():
+    seats = sys.stdin.buffer.read()
+    loop = asyncio.get_running_loop()
+
+    # handoff.take_over() with the time the snapshot came and the restore took
+    channel = socket.socket(fileno=int(os.environ["HANDOFF_FD"]))
+    channel.setblocking(False)
+    with channel:
+        await loop.sock_sendall(channel, READY)
+        size = SIZE_STRUCT.unpack(await handoff.receive(channel, SIZE_STRUCT.size))[0]
+        snapshot = await handoff.receive(channel, size)
+
+    received = time.perf_counter()
+    handoff.restore(snapshot)
+    restored = time.perf_counter()
+
+    # Every client reconnects at once with its token
+    clients = []
+    expected = []
+    for token, p1_score, p2_score in SEAT_STRUCT.iter_unpack(seats):
+        client = connect()
+        client.push(connect_frame(token))
+        clients.append(client)
+        expected.append((p1_score, p2_score))
+
+    await settle(clients)
+    back = time.perf_counter()
+
+    # Every client has its seat and score back, every match counts down again
+    wrong = 0
+    for client, scores in zip(clients, expected):
+        frames = client.drain()
+        connected = codec.CONNECTED_RESUME_STRUCT.unpack(frames[0])
+        if connected[4:] != scores or frames[-1] != codec.COUNTDOWN_START_FRAME:
+            wrong += 1
+
+    counting_down = sum(room.phase == Room.COUNTDOWN for room in room_manager.rooms.values())
+    json.dump({
+        "received": received,
+        "restore": restored - received,
+        "back": back,
+        "reconnect": back - restored,
+        "rooms": handoff.rooms_restored,
+        "resumed": sessions.resumed,
+        "counting down": counting_down,
+        "wrong": wrong,
+    }, sys.stdout)
+
+
+def main():
+    logging.basicConfig(level=logging.WARNING)
+
+    if sys.argv[1:] == ["successor"]:
+        asyncio.run(successor())
+        return
+
+    result = asyncio.run(predecessor())
+    print(f"rooms={ROOMS:,} players={2 * ROOMS:,}")
+    print(f"successor boot      {result['boot'] * 1000:8.1f} ms  (while the matches go on)")
+    print(f"snapshot            {result['snapshot'] * 1000:8.1f} ms  {result['size']:,} bytes "
+          f"({(result['size'] - SNAPSHOT_HEADER_STRUCT.size) / ROOMS:.0f} per room)")
+    print(f"send                {result['send'] * 1000:8.1f} ms")
+    print(f"let clients go      {result['let go'] * 1000:8.1f} ms")
+    print(f"snapshot received   {result['transfer'] * 1000:8.1f} ms  after the send started")
+    print(f"restore             {result['restore'] * 1000:8.1f} ms  ({result['restore'] / ROOMS * 1e6:.2f} us per room)")
+    print(f"reconnect           {result['reconnect'] * 1000:8.1f} ms  "
+          f"({result['reconnect'] / (2 * ROOMS) * 1e6:.1f} us per player)")
+    print(f"gap                 {result['gap'] * 1000:8.1f} ms  from the snapshot to every match counting down")
+    print(f"{result['rooms']:,} rooms restored, {result['resumed']:,} players resumed, "
+          f"{result['counting down']:,} matches counting down, {result['wrong']} wrong seats")
+
+
+if __name__ == "__main__":
+    main()
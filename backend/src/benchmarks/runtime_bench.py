@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import statistics
+import subprocess
+
+import websockets
+
+from packages.api.runtime import Runtime
+
+
+HOST = "127.0.0.1"
+PORT = int(os.getenv("BENCH_PORT", 8106))
+STARTS = int(os.getenv("BENCH_STARTS", 5))
+FRAMES = int(os.getenv("BENCH_FRAMES", 20_000))
+
+MOTION_FRAME = bytes((2, 75, 0, 104, 1))
+
+
+def start_server(env):
+    # Wall time from spawning main.py until its port accepts a connection,
+    # and the time the server itself reports
+    env = dict(os.environ, SERVER_HOST=HOST, SERVER_PORT=str(PORT), **env)
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env, stderr=subprocess.PIPE, text=True
+    )
+
+    try:
+        while True:
+            try:
+                socket.create_connection((HOST, PORT), timeout=1).close()
+                break
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("Server did not start.")
+                time.sleep(0.002)
+
+        wall = time.perf_counter() - start
+    finally:
+        server.terminate()
+        _, log = server.communicate()
+
+    reported = None
+    for line in log.splitlines():
+        if "Ready after" in line:
+            reported = float(line.split("Ready after ")[1].split(" ms")[0]) / 1000
+
+    return wall, reported
+
+
+def import_time(module):
+    # Import of a module in a fresh interpreter
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    return float(subprocess.check_output([sys.executable, "-c", code]))
+
+
+async def relay(runtime: Runtime, count):
+    # Frames a client sends and gets echoed back, through the server options of the runtime
+    async def echo(ws):
+        async for message in ws:
+            await ws.send(message)
+
+    async with websockets.serve(echo, HOST, PORT, logger=None, **runtime.serve_options()):
+        compression = "deflate" if runtime.compression else None
+        async with websockets.connect(f"ws://{HOST}:{PORT}", compression=compression) as client:
+            cpu = time.process_time()
+            start = time.perf_counter()
+            for _ in range(count):
+                await client.send(MOTION_FRAME)
+                await client.recv()
+            elapsed = time.perf_counter() - start
+            cpu = time.process_time() - cpu
+
+    return elapsed / count, cpu / count
+
+
+def main():
+    print(f"import dotenv    {import_time('dotenv') * 1000:6.1f} ms, skipped without a .env file")
+
+    for name, env in (("asyncio loop", {}), ("uvloop", {"EVENT_LOOP": "uvloop"})):
+        results = [start_server(env) for _ in range(STARTS)]
+        wall = statistics.median(result[0] for result in results)
+        reported = [result[1] for result in results if result[1] is not None]
+        reported = f"{statistics.median(reported) * 1000:6.1f} ms" if reported else "     -"
+        print(f"start {name:10} {wall * 1000:6.1f} ms to accept, {reported} reported by main.py")
+
+    for compression in (False, True):
+        runtime = Runtime()
+        runtime.compression = compression
+        latency, cpu = asyncio.run(relay(runtime, FRAMES))
+        name = "deflate" if compression else "no compression"
+        print(f"echo {name:15} {latency * 1e6:6.1f} us per frame  {cpu * 1e6:6.1f} us CPU per frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import os
+import math
+import time
+import asyncio
+
+import websockets
+
+from packages.event_handlers import handlers
+from packages.managers import room_manager
+from packages.managers.spectator_stream import spectator_stream
+from packages.types import codec
+
+
+PORT = 8105
+SPECTATORS = int(os.getenv("BENCH_SPECTATORS", 2000))
+DURATION = float(os.getenv("BENCH_DURATION", 5))
+TICK_RATE = 30
+KEYFRAME_INTERVAL = 30
+MOTION_RATE = 60  # Per player
+COLLISION_INTERVAL = 0.5
+MESSAGES = 100_000
+ROUNDS = 5
+
+MOTION_PREFIX = bytes((codec.MOTION,))
+
+
+class Connection:
+    # A player that accepts frames without a network, so only the handler is timed
+    def __init__(self, id):
+        self.id = id
+        self.transport = None
+
+    async def send(self, message):
+        pass
+
+
+async def dispatch(ws, message, count):
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        await handlers[codec.MOTION](ws, message)
+    return (time.perf_counter_ns() - start) / count
+
+
+async def drain(ws, received):
+    async for message in ws:
+        received[0] += len(message)
+        received[1] += 1
+
+
+async def play(room, p1, p2, duration):
+    # Paddles follow a sine wave at MOTION_RATE and the ball turns every COLLISION_INTERVAL
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    next_collision = start
+    direction = 1
+
+    while (now := loop.time()) - start < duration:
+        y = round(360 + 250 * math.sin(now - start))
+        message = MOTION_PREFIX + codec.MOTION_STRUCT.pack(640, y)[1:]
+        await handlers[codec.MOTION](p1, message)
+        await handlers[codec.MOTION](p2, message)
+
+        if now >= next_collision:
+            direction = -direction
+            room.spectators.forward(codec.encode_collision_motion(640, y, 375 * direction, 375))
+            next_collision += COLLISION_INTERVAL
+
+        await asyncio.sleep(1 / MOTION_RATE)
+
+
+async def measure_hot_path(p1, room, message):
+    # player_motion with and without a crowd watching, alternated
+    results = {"without": [], "with": []}
+    spectators = room.spectators
+    for _ in range(ROUNDS):
+        room.spectators = None
+        results["without"].append(await dispatch(p1, message, MESSAGES))
+        room.spectators = spectators
+        results["with"].append(await dispatch(p1, message, MESSAGES))
+
+    return {name: min(values) for name, values in results.items()}
+
+
+async def run():
+    spectator_stream.configure(TICK_RATE, KEYFRAME_INTERVAL)
+
+    p1, p2 = Connection("p1"), Connection("p2")
+    await room_manager.add_player(p1)
+    room = await room_manager.add_player(p2)
+
+    accepted = []
+    ready = asyncio.Event()
+
+    async def handler(ws):
+        accepted.append(ws)
+        if len(accepted) == SPECTATORS:
+            ready.set()
+        await ws.wait_closed()
+
+    async with websockets.serve(handler, "127.0.0.1", PORT, compression=None, logger=None):
+        clients = []
+        for _ in range(SPECTATORS):
+            clients.append(await websockets.connect(f"ws://127.0.0.1:{PORT}", compression=None, max_queue=None))
+
+        received = [0, 0]
+        readers = [asyncio.create_task(drain(client, received)) for client in clients]
+        await ready.wait()
+
+        for ws in accepted:
+            spectator_stream.join(ws, room)
+
+        message = MOTION_PREFIX + codec.MOTION_STRUCT.pack(640, 360)[1:]
+        hot_path = await measure_hot_path(p1, room, message)
+
+        # Time only the stream's ticks while the match goes on
+        tick = spectator_stream.tick
+        tick_times = []
+
+        def timed_tick(now):
+            start = time.perf_counter_ns()
+            tick(now)
+            tick_times.append(time.perf_counter_ns() - start)
+
+        spectator_stream.tick = timed_tick
+        received[:] = [0, 0]
+        await play(room, p1, p2, DURATION)
+        await asyncio.sleep(0.2)
+        spectator_stream.tick = tick
+
+        frames_sent = room.spectators.frames_sent
+        for ws in accepted:
+            spectator_stream.leave(ws)
+        for client in clients:
+            await client.close()
+        await asyncio.gather(*readers, return_exceptions=True)
+
+    await room_manager.remove_player(p1.id)
+    await room_manager.remove_player(p2.id)
+
+    tick_times.sort()
+    return hot_path, tick_times, received, frames_sent
+
+
+def main():
+    hot_path, tick_times, (received_bytes, received_frames), frames_sent = asyncio.run(run())
+
+    without, with_spectators = hot_path["without"], hot_path["with"]
+    print(f"MOTION handler    0 spectators {without:6.0f} ns  {SPECTATORS} spectators {with_spectators:6.0f} ns")
+
+    p50 = tick_times[len(tick_times) // 2]
+    p99 = tick_times[int(len(tick_times) * 0.99)]
+    print(f"stream tick       p50 {p50 / 1e3:8.1f} us  p99 {p99 / 1e3:8.1f} us  "
+          f"{p50 / SPECTATORS:6.0f} ns per spectator")
+
+    # Relaying what the players get would cost an OP_MOTION per paddle update
+    # and a COLLISION_MOTION per turn of the ball
+    relayed = 2 * MOTION_RATE * codec.OP_MOTION_STRUCT.size + codec.BALL_STATE_STRUCT.size / COLLISION_INTERVAL
+    per_spectator = received_bytes / SPECTATORS / DURATION
+    print(f"stream            {per_spectator:6.0f} B/s per spectator  "
+          f"({received_frames / SPECTATORS / DURATION:4.1f} frames/s, {frames_sent} frames sent)  "
+          f"relaying player frames {relayed:6.0f} B/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import os
+import gc
+import time
+import asyncio
+import tracemalloc
+
+from packages.managers.phase_timer import PhaseTimer
+from packages.objects.room import Room
+
+
+ROOMS = int(os.getenv("BENCH_ROOMS", 20_000))
+DELAY = 1.0  # Seconds every room waits, spread over SPREAD
+SPREAD = 0.5
+CANCELLED = 0.25  # Share of the rooms a player leaves during the countdown
+
+
+async def with_tasks(rooms, fired):
+    # What initialize_game did: a task per room that sleeps, then checks the room
+    async def countdown(room, delay):
+        await asyncio.sleep(delay)
+        if room.timer is None:
+            fired[0] += 1
+
+    tasks = {}
+    for index, room in enumerate(rooms):
+        tasks[room] = asyncio.create_task(countdown(room, DELAY + SPREAD * index / len(rooms)))
+
+    # A task has to run once to notice that its player left
+    def cancel(room):
+        room.timer = True
+
+    return tasks, cancel, lambda: asyncio.gather(*tasks.values())
+
+
+async def with_wheel(rooms, fired):
+    timer = PhaseTimer()
+
+    async def start_round(room):
+        fired[0] += 1
+
+    for index, room in enumerate(rooms):
+        timer.schedule(room, DELAY + SPREAD * index / len(rooms), start_round)
+
+    async def done():
+        while timer.task is not None:
+            await asyncio.sleep(0.05)
+
+    return timer, timer.cancel, done
+
+
+async def measure_memory(setup):
+    rooms = [Room() for _ in range(ROOMS)]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept, _, done = await setup(rooms, [0])
+    memory = (tracemalloc.get_traced_memory()[0] - before) / ROOMS
+    tracemalloc.stop()
+
+    await done()
+    del kept
+    return memory
+
+
+async def measure(setup):
+    rooms = [Room() for _ in range(ROOMS)]
+    fired = [0]
+
+    gc.collect()
+    start = time.perf_counter_ns()
+    kept, cancel, done = await setup(rooms, fired)
+    schedule_ns = (time.perf_counter_ns() - start) / ROOMS
+
+    left = rooms[::round(1 / CANCELLED)]
+    start = time.perf_counter_ns()
+    for room in left:
+        cancel(room)
+    cancel_ns = (time.perf_counter_ns() - start) / len(left)
+
+    # CPU the event loop spends until every countdown ran out
+    cpu = time.process_time()
+    await done()
+    cpu = time.process_time() - cpu
+
+    del kept
+    return schedule_ns, cancel_ns, cpu, fired[0]
+
+
+def main():
+    print(f"{ROOMS:,} rooms counting down, {CANCELLED:.0%} cancelled")
+    for name, setup in (("task per room", with_tasks), ("timer wheel", with_wheel)):
+        memory = asyncio.run(measure_memory(setup))
+        schedule_ns, cancel_ns, cpu, fired = asyncio.run(measure(setup))
+        print(
+            f"{name:14}  schedule {schedule_ns:6.0f} ns/room  cancel {cancel_ns:5.0f} ns/room  "
+            f"{memory:6.0f} B/room  loop CPU {cpu * 1e3:7.1f} ms  fired {fired:,}"
+        )
+
+
+if __name__ == "__main__":
+    main()
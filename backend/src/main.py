@@ -1,36 +1,168 @@
+import time
+started = time.perf_counter()
+
 import os
-import asyncio
 import logging
 
 import websockets
-from dotenv import load_dotenv
 
 from packages.api.server import handle_connection
+from packages.api.runtime import runtime
+from packages.api.cluster import run_cluster
+from packages.api.metrics_server import serve_metrics
+from packages.managers import room_manager
+from packages.managers.metrics import metrics
+from packages.managers.connection_manager import connection_manager
+from packages.objects.player import Player
+from packages.managers.motion_scheduler import motion_scheduler
+from packages.managers.spectator_stream import spectator_stream
+from packages.managers.recorder import recorder
+from packages.managers.clock_sync import clock_sync
+from packages.managers.event_gate import event_gate
+from packages.managers.relay import relay
+from packages.managers.ai_opponents import ai_opponents
+from packages.managers.handoff import handoff
+from packages.managers.sessions import sessions
+from packages.managers.backplane import LocalBackplane, NetworkBackplane
+from packages.objects.server_clock import server_clock
+from packages.ecs_systems.physics_system import physics_system
+from packages.event_handlers.end_round import score_round
+
+
+def configure():
+    max_wait = os.getenv("MATCHMAKING_MAX_WAIT")
+    room_manager.configure(float(max_wait) if max_wait else None)
+
+    metrics_port = os.getenv("METRICS_PORT")
+    metrics.configure(int(metrics_port) if metrics_port else None, os.getenv("SERVER_HOST", "10.0.0.180"))
+
+    connection_manager.configure(int(os.getenv("SEND_QUEUE_SIZE", 0)))
+    Player.slow_consumer_limit = int(os.getenv("SLOW_CONSUMER_LIMIT", Player.slow_consumer_limit))
+    motion_scheduler.configure(float(os.getenv("MOTION_TICK_RATE", 0)))
+    event_gate.configure(os.getenv("RATE_LIMIT", "0") == "1")
+
+    # Rooms shared with the other nodes of a deployment through a broker
+    backplane = os.getenv("BACKPLANE")
+    if backplane == "local":
+        relay.configure(LocalBackplane())
+    elif backplane:
+        host, port = backplane.rsplit(":", 1)
+        relay.configure(NetworkBackplane(host, int(port)))
+
+    # Players waiting alone get a server-side opponent after a while
+    ai_wait = os.getenv("AI_OPPONENT_WAIT")
+    ai_opponents.configure(
+        float(ai_wait) if ai_wait else None,
+        float(os.getenv("AI_TICK_RATE", 30)),
+        float(os.getenv("AI_AIM_ERROR", 40))
+    )
+
+    # Rolling deploys: SIGTERM drains the server, SIGUSR2 hands its matches to
+    # a new one, which gets the listening socket and the channel through these
+    handoff.configure(float(os.getenv("DRAIN_TIMEOUT", 60)), float(os.getenv("RESUME_TIMEOUT", 10)))
+    listen_fd, channel_fd = os.getenv("LISTEN_FD"), os.getenv("HANDOFF_FD")
+    handoff.inherit(int(listen_fd) if listen_fd else None, int(channel_fd) if channel_fd else None)
+
+    # Seats of players who dropped out of a match are held for them this long
+    sessions.configure(float(os.getenv("SESSION_GRACE", 0)), float(os.getenv("SESSION_SWEEP_INTERVAL", 1)))
+
+    lag_limit = os.getenv("SPECTATOR_LAG_LIMIT")
+    spectator_stream.configure(
+        float(os.getenv("SPECTATOR_TICK_RATE", 0)),
+        int(os.getenv("SPECTATOR_KEYFRAME_INTERVAL", 30)),
+        int(lag_limit) if lag_limit else None
+    )
+
+    batch = None
+    if os.getenv("PHYSICS_BACKEND", "scalar") == "numpy":
+        from packages.ecs_systems.batch_physics_system import BatchPhysicSystem
+        batch = BatchPhysicSystem()
+
+    physics_system.configure(float(os.getenv("PHYSICS_TICK_RATE", 0)), on_goal=score_round, batch=batch)
+
+    # Version 2 stamps count physics steps when the server simulates the ball
+    server_clock.configure(physics_system.tick_rate or float(os.getenv("SERVER_TICK_RATE", 60)))
+    clock_sync.configure(float(os.getenv("PING_INTERVAL", 2)), os.getenv("LAG_COMPENSATION", "0") == "1")
+
+    # What the replay tool needs to run the same server again
+    recorder.configure(os.getenv("RECORD_DIR"), {
+        "matchmaking_max_wait": room_manager.matchmaking.max_wait,
+        "motion_tick_rate": motion_scheduler.tick_rate,
+        "physics_tick_rate": physics_system.tick_rate,
+        "physics_backend": "numpy" if batch is not None else "scalar",
+        "server_tick_rate": server_clock.tick_rate,
+        "lag_compensation": clock_sync.lag_compensation,
+        "rate_limit": event_gate.rate_limit,
+    })
+
+
+def configure_runtime():
+    # Read before the event loop exists, the cluster's workers inherit it
+    def size(name, default):
+        value = os.getenv(name)
+        if value is None:
+            return default
+        return int(value) if value else None
+
+    runtime.configure(
+        loop=os.getenv("EVENT_LOOP", "asyncio"),
+        nodelay=os.getenv("TCP_NODELAY", "1") == "1",
+        send_buffer=size("SOCKET_SEND_BUFFER", None),
+        recv_buffer=size("SOCKET_RECV_BUFFER", None),
+        compression=os.getenv("WS_COMPRESSION", "0") == "1",
+        max_size=size("WS_MAX_SIZE", 1 << 10),
+        max_queue=size("WS_MAX_QUEUE", 32),
+        write_limit=int(os.getenv("WS_WRITE_LIMIT", 1 << 16)),
+    )
+    runtime.started = started
 
 
 async def main():
     logging.info("APP: Booting up WebSocket server...")
-    async with websockets.serve(
-        handle_connection,
-        os.getenv("SERVER_HOST", "10.0.0.180"),
-        int(os.getenv("SERVER_PORT", 8001)),
-        logger=None
-    ):
-        await asyncio.Future()
+    configure()
+
+    if metrics.enabled:
+        await serve_metrics(metrics.host, metrics.port)
+
+    await relay.start()
+
+    listener = runtime.listen(
+        os.getenv("SERVER_HOST", "10.0.0.180"), int(os.getenv("SERVER_PORT", 8001)), fd=handoff.listen_fd)
+
+    # After a hot restart, the matches of the previous server are back before the first client is
+    await handoff.take_over()
+
+    async with websockets.serve(handle_connection, sock=listener, logger=None, **runtime.serve_options()) as server:
+        handoff.install(server)
+        runtime.ready()
+        await handoff.finished
 
 
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO, format="[%(levelname)s]\t %(message)s")
     
     if os.path.exists('../.env'):
+        from dotenv import load_dotenv
+
         logging.info("Setup environment variables...")
         os.unsetenv("SERVER_HOST")
         os.unsetenv("SERVER_PORT")
         
         load_dotenv()
         
+    configure_runtime()
+    workers = int(os.getenv("SERVER_WORKERS", 1))
 
     try:
-        asyncio.run(main())
+        if workers > 1:
+            logging.info(f"APP: Booting up {workers} WebSocket server workers...")
+            run_cluster(
+                os.getenv("SERVER_HOST", "10.0.0.180"),
+                int(os.getenv("SERVER_PORT", 8001)),
+                workers,
+                setup=configure
+            )
+        else:
+            runtime.run(main())
     except KeyboardInterrupt:
         logging.info("APP: App exited.")
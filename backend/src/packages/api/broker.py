@@ -0,0 +1,95 @@
+import os
+import asyncio
+import logging
+import itertools
+
+from ..managers.backplane import (
+    RoomRegistry, HEADER_STRUCT, NODE_STRUCT, POST_STRUCT, WITHDRAW_STRUCT, WITHDRAWN_STRUCT,
+    CLAIM_STRUCT, CLAIMED_STRUCT, ASSIGNED_STRUCT, HELLO, POST, WITHDRAW, WITHDRAWN, CLAIM,
+    CLAIMED, ASSIGNED, RELAY, NODE_DOWN, NO_NODE,
+)
+
+
+class Broker:
+    # Stand-in for the shared store and message bus of a deployment: one
+    # process keeping the room registry of every node and passing RELAY
+    # batches between them. A node that disconnects loses its waiting rooms
+    # and every other node is told it is down
+    registry: RoomRegistry
+    nodes: dict[int, asyncio.StreamWriter]
+
+    def __init__(self):
+        self.registry = RoomRegistry()
+        self.nodes = {}
+        self.ids = itertools.count(1)
+
+        self.relayed = 0
+
+    @staticmethod
+    def write(writer: asyncio.StreamWriter, kind: int, body: bytes):
+        writer.write(HEADER_STRUCT.pack(len(body) + 1, kind) + body)
+
+    def handle(self, node: int, writer: asyncio.StreamWriter, kind: int, body: bytes):
+        registry = self.registry
+
+        if kind == RELAY:
+            # Forwarded as it is, only the node id is swapped for the source
+            target = self.nodes.get(NODE_STRUCT.unpack_from(body)[0])
+            if target is not None:
+                self.write(target, RELAY, NODE_STRUCT.pack(node) + body[NODE_STRUCT.size:])
+                self.relayed += 1
+
+        elif kind == POST:
+            registry.post(node, *POST_STRUCT.unpack(body))
+
+        elif kind == WITHDRAW:
+            request, room_id = WITHDRAW_STRUCT.unpack(body)
+            ok = registry.withdraw(node, room_id)
+            if request:
+                self.write(writer, WITHDRAWN, WITHDRAWN_STRUCT.pack(request, ok))
+
+        elif kind == CLAIM:
+            # The claimant's batch goes to the room's node in the same step,
+            # so a claimed room always hears from its new player
+            request, bucket = CLAIM_STRUCT.unpack_from(body)
+            room = registry.claim(node, bucket)
+            if room is not None:
+                self.write(self.nodes[room[0]], ASSIGNED,
+                           ASSIGNED_STRUCT.pack(node, room[1]) + body[CLAIM_STRUCT.size:])
+            self.write(writer, CLAIMED, CLAIMED_STRUCT.pack(request, *(room or (NO_NODE, 0))))
+
+    async def serve_node(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        node = next(self.ids)
+        self.nodes[node] = writer
+        self.write(writer, HELLO, NODE_STRUCT.pack(node))
+        logging.info(f"BROKER: Node {node} joined.")
+
+        try:
+            while True:
+                size, kind = HEADER_STRUCT.unpack(await reader.readexactly(HEADER_STRUCT.size))
+                self.handle(node, writer, kind, await reader.readexactly(size - 1))
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            del self.nodes[node]
+            self.registry.drop_node(node)
+            writer.close()
+
+            for other in self.nodes.values():
+                self.write(other, NODE_DOWN, NODE_STRUCT.pack(node))
+            logging.info(f"BROKER: Node {node} left.")
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.serve_node, host, port)
+        logging.info(f"BROKER: Listening on {host}:{port}...")
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s]\t %(message)s")
+
+    try:
+        asyncio.run(Broker().serve(os.getenv("BROKER_HOST", "127.0.0.1"), int(os.getenv("BROKER_PORT", 8200))))
+    except KeyboardInterrupt:
+        pass
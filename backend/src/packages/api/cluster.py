@@ -0,0 +1,351 @@
+import os
+import socket
+import asyncio
+import logging
+import functools
+import multiprocessing
+from struct import Struct
+from urllib.parse import urlsplit, parse_qs
+
+from websockets.server import WebSocketServer, WebSocketServerProtocol
+
+from .server import handle_connection
+from .runtime import runtime
+from .metrics_server import serve_metrics
+from ..managers import room_manager
+from ..managers.metrics import metrics
+from ..managers.relay import relay
+
+
+# Worker -> dispatcher: live connections and the number of buckets that follow,
+# then per bucket its settled connections and players waiting alone. A handed
+# over connection is settled once it joined a room or closed without joining.
+REPORT_STRUCT = Struct("<II")
+BUCKET_STRUCT = Struct("<BII")
+
+# Bytes of the client's handshake peeked for the bucket, and how long for
+PEEK_SIZE = 1024
+PEEK_TIMEOUT = 5
+
+
+def request_bucket(head: bytes):
+    # The bucket a client names in the target of its handshake request, as in
+    # GET /?bucket=3, 0 when it names none
+    parts = head.split(b"\r\n", 1)[0].split(b" ")
+    if len(parts) != 3:
+        return 0
+
+    values = parse_qs(urlsplit(parts[1].decode("latin-1")).query).get("bucket")
+    try:
+        bucket = int(values[0]) if values else 0
+    except ValueError:
+        return 0
+
+    return bucket if 0 <= bucket < 256 else 0
+
+
+class WorkerHandle:
+    # The dispatcher's view of a worker process
+    def __init__(self, index, process, fd_socket, report_socket):
+        self.index = index
+        self.process = process
+        self.fd_socket = fd_socket
+        self.report_socket = report_socket
+        self.alive = True
+
+        # Per bucket
+        self.sent = {}
+        self.settled = {}
+        self.waiting = {}
+
+        self.in_flight = 0
+        self.connections = 0
+
+    def expected_waiting(self, bucket: int):
+        # Players of the bucket that will still be waiting once every
+        # connection of the bucket in flight has joined
+        pending = self.sent.get(bucket, 0) - self.settled.get(bucket, 0)
+        waiting = self.waiting.get(bucket, 0)
+        if pending <= waiting:
+            return waiting - pending
+
+        return (pending - waiting) % 2
+
+    def load(self):
+        return self.connections + self.in_flight
+
+    def hand_over(self, conn: socket.socket, bucket: int):
+        # The bucket goes along with the descriptor
+        socket.send_fds(self.fd_socket, [bytes((bucket,))], [conn.fileno()])
+        self.sent[bucket] = self.sent.get(bucket, 0) + 1
+        self.in_flight += 1
+
+    def update(self, connections: int, buckets: bytes):
+        self.connections = connections
+        self.settled = {}
+        self.waiting = {}
+        for bucket, settled, waiting in BUCKET_STRUCT.iter_unpack(buckets):
+            self.settled[bucket] = settled
+            self.waiting[bucket] = waiting
+
+        self.in_flight = sum(self.sent.values()) - sum(self.settled.values())
+
+
+class Dispatcher:
+    # Accepts every TCP connection and hands its file descriptor to the worker
+    # that owns a waiting player of the client's bucket, so players on any
+    # worker still get paired. The bucket is peeked from the handshake request
+    def __init__(self, host: str, port: int, worker_count: int, setup=None):
+        self.host = host
+        self.port = port
+        self.worker_count = worker_count
+        self.setup = setup
+        self.workers: list[WorkerHandle] = []
+
+    def choose_worker(self, bucket: int = 0):
+        best = None
+        for worker in self.workers:
+            if not worker.alive:
+                continue
+
+            # Room affinity: the next player completes this worker's waiting room
+            if worker.expected_waiting(bucket) > 0:
+                return worker
+
+            if best is None or worker.load() < best.load():
+                best = worker
+
+        return best
+
+    def start_workers(self, listener: socket.socket):
+        # Workers are forked before the dispatcher's event loop starts
+        context = multiprocessing.get_context("fork")
+
+        for index in range(self.worker_count):
+            fd_parent, fd_child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            report_parent, report_child = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+
+            # Dispatcher side sockets the worker must not keep open
+            parent_sockets = [fd_parent, report_parent]
+            for worker in self.workers:
+                parent_sockets += [worker.fd_socket, worker.report_socket]
+
+            process = context.Process(
+                target=run_worker,
+                args=(index, listener, fd_child, report_child, parent_sockets, self.setup),
+                daemon=True
+            )
+            process.start()
+
+            fd_child.close()
+            report_child.close()
+            self.workers.append(WorkerHandle(index, process, fd_parent, report_parent))
+
+    async def read_reports(self, worker: WorkerHandle):
+        reader, _ = await asyncio.open_unix_connection(sock=worker.report_socket)
+
+        try:
+            while True:
+                connections, count = REPORT_STRUCT.unpack(await reader.readexactly(REPORT_STRUCT.size))
+                worker.update(connections, await reader.readexactly(count * BUCKET_STRUCT.size))
+        except asyncio.IncompleteReadError:
+            worker.alive = False
+            logging.error(f"CLUSTER: Worker {worker.index} exited.")
+
+    async def peek_request(self, conn: socket.socket):
+        # The start of the client's handshake, left on the socket for the worker
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + PEEK_TIMEOUT
+        head = b""
+
+        while b"\r\n" not in head and len(head) < PEEK_SIZE:
+            readable = loop.create_future()
+            loop.add_reader(conn, lambda: readable.done() or readable.set_result(None))
+            try:
+                await asyncio.wait_for(readable, deadline - loop.time())
+            except asyncio.TimeoutError:
+                break
+            finally:
+                loop.remove_reader(conn)
+
+            try:
+                peeked = conn.recv(PEEK_SIZE, socket.MSG_PEEK)
+            except OSError:
+                break
+
+            # Closed by the client
+            if not peeked:
+                break
+
+            # Nothing new since the last peek, the socket stays readable
+            if peeked == head:
+                await asyncio.sleep(0.01)
+            head = peeked
+
+        return head
+
+    async def route(self, conn: socket.socket):
+        try:
+            bucket = request_bucket(await self.peek_request(conn))
+
+            worker = self.choose_worker(bucket)
+            if worker is None:
+                logging.error("CLUSTER: No worker available.")
+            else:
+                worker.hand_over(conn, bucket)
+        finally:
+            # The worker owns its own duplicate of the descriptor
+            conn.close()
+
+    async def serve(self, listener: socket.socket):
+        loop = asyncio.get_running_loop()
+        listener.setblocking(False)
+
+        report_tasks = [asyncio.create_task(self.read_reports(worker)) for worker in self.workers]
+        logging.info(f"CLUSTER: Dispatching {self.host}:{self.port} to {self.worker_count} workers...")
+
+        routes = set()
+        try:
+            while True:
+                conn, _ = await loop.sock_accept(listener)
+                conn.setblocking(False)
+
+                # Clients are routed once their handshake request is in
+                route = asyncio.create_task(self.route(conn))
+                routes.add(route)
+                route.add_done_callback(routes.discard)
+        finally:
+            for task in report_tasks + list(routes):
+                task.cancel()
+            listener.close()
+
+
+class Worker:
+    def __init__(self, index, fd_socket, report_socket):
+        self.index = index
+        self.fd_socket = fd_socket
+        self.report_socket = report_socket
+
+        self.connections = 0
+        self.settled = {}  # Per bucket
+        self.unsettled = {}  # Bucket of each connection that has not joined a room yet
+
+        self.factory = None
+        self.stopped = None
+        self.tasks = set()
+
+    def report(self):
+        waiting = room_manager.matchmaking.buckets
+        buckets = self.settled.keys() | waiting.keys()
+
+        report = bytearray(REPORT_STRUCT.pack(self.connections, len(buckets)))
+        for bucket in buckets:
+            report += BUCKET_STRUCT.pack(bucket, self.settled.get(bucket, 0), len(waiting.get(bucket, ())))
+        self.report_socket.sendall(report)
+
+    def settle(self, bucket: int):
+        self.settled[bucket] = self.settled.get(bucket, 0) + 1
+
+    def on_room_change(self, ws_id, joined: bool):
+        if joined and ws_id in self.unsettled:
+            self.settle(self.unsettled.pop(ws_id))
+
+        self.report()
+
+    async def accept(self, sock: socket.socket, bucket: int):
+        loop = asyncio.get_running_loop()
+
+        try:
+            _, ws = await loop.connect_accepted_socket(self.factory, sock)
+        except OSError:
+            self.settle(bucket)
+            self.report()
+            return
+
+        self.connections += 1
+        self.unsettled[ws.id] = bucket
+        try:
+            await ws.wait_closed()
+        finally:
+            self.connections -= 1
+
+            # Connections that never joined a room (e.g. failed handshakes)
+            # settle when they close
+            if self.unsettled.pop(ws.id, None) is not None:
+                self.settle(bucket)
+
+            self.report()
+
+    def receive(self):
+        loop = asyncio.get_running_loop()
+
+        message, fds, _, _ = socket.recv_fds(self.fd_socket, 1, 1)
+        if not message:
+            # The dispatcher is gone
+            self.stopped.set_result(None)
+            loop.remove_reader(self.fd_socket)
+            return
+
+        for fd in fds:
+            sock = socket.socket(fileno=fd)
+            sock.setblocking(False)
+
+            task = loop.create_task(self.accept(sock, message[0]))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.stopped = loop.create_future()
+
+        # The websockets server only needs a serving socket to accept handshakes,
+        # connections are injected from the dispatcher instead of this one
+        private = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        private.bind(f"\0multiplayer-pong-worker-{os.getpid()}")
+
+        ws_server = WebSocketServer()
+        self.factory = functools.partial(
+            WebSocketServerProtocol, handle_connection, ws_server, **runtime.protocol_options()
+        )
+        ws_server.wrap(await loop.create_unix_server(self.factory, sock=private))
+
+        # Every worker serves its own metrics, on consecutive ports
+        if metrics.enabled:
+            await serve_metrics(metrics.host, metrics.port + self.index)
+
+        # Every worker is a node of its own on the backplane
+        await relay.start()
+
+        room_manager.on_change = self.on_room_change
+        loop.add_reader(self.fd_socket, self.receive)
+
+        logging.info(f"CLUSTER: Worker {self.index} ready (pid {os.getpid()}).")
+        runtime.ready()
+        await self.stopped
+
+        ws_server.close()
+        await ws_server.wait_closed()
+
+
+def run_worker(index, listener, fd_socket, report_socket, parent_sockets, setup=None):
+    # Only the dispatcher accepts connections
+    listener.close()
+    for sock in parent_sockets:
+        sock.close()
+
+    if setup is not None:
+        setup()
+
+    try:
+        runtime.run(Worker(index, fd_socket, report_socket).run())
+    except KeyboardInterrupt:
+        pass
+
+
+def run_cluster(host: str, port: int, worker_count: int, setup=None):
+    dispatcher = Dispatcher(host, port, worker_count, setup)
+
+    listener = runtime.listen(host, port)
+    dispatcher.start_workers(listener)
+
+    runtime.run(dispatcher.serve(listener))
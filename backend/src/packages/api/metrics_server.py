@@ -0,0 +1,47 @@
+import asyncio
+import logging
+
+from ..managers.metrics import metrics
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def response(status: str, body: bytes, content_type="text/plain; charset=utf-8"):
+    head = (
+        f"HTTP/1.1 {status}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        "Connection: close\r\n\r\n"
+    )
+    return head.encode() + body
+
+
+async def handle_request(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        request_line = await reader.readline()
+
+        # Skip the headers, the request never has a body
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+
+        parts = request_line.split()
+        if len(parts) < 2 or parts[0] != b"GET":
+            writer.write(response("405 Method Not Allowed", b""))
+        elif parts[1].split(b"?")[0] != b"/metrics":
+            writer.write(response("404 Not Found", b""))
+        else:
+            writer.write(response("200 OK", metrics.render().encode(), CONTENT_TYPE))
+
+        await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(host: str, port: int):
+    # Served from the game's event loop, a scrape only walks the counters
+    server = await asyncio.start_server(handle_request, host, port)
+    logging.info(f"APP: Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,111 @@
+import time
+import socket
+import asyncio
+import logging
+
+from websockets.extensions.permessage_deflate import enable_server_permessage_deflate
+
+
+class Runtime:
+    # Event loop, listening socket and websockets settings shared by the
+    # single process server and the cluster. Every frame of the protocol is a
+    # few bytes long, so permessage-deflate is off unless asked for
+    loop: str  # "asyncio" or "uvloop"
+
+    nodelay: bool
+    send_buffer: int | None  # SO_SNDBUF/SO_RCVBUF of the listener, None keeps the OS default
+    recv_buffer: int | None
+
+    compression: bool
+    max_size: int | None  # Largest incoming frame, None for no limit
+    max_queue: int | None  # Incoming frames buffered per connection
+    write_limit: int  # Write buffer high-water mark of a connection
+
+    def __init__(self):
+        self.loop = "asyncio"
+
+        self.nodelay = True
+        self.send_buffer = None
+        self.recv_buffer = None
+
+        self.compression = False
+        self.max_size = 1 << 10
+        self.max_queue = 32
+        self.write_limit = 1 << 16
+
+        # main.py sets the time it started, before its own imports
+        self.started = time.perf_counter()
+
+    def configure(self, loop: str = "asyncio", nodelay: bool = True,
+                  send_buffer: int | None = None, recv_buffer: int | None = None,
+                  compression: bool = False, max_size: int | None = 1 << 10,
+                  max_queue: int | None = 32, write_limit: int = 1 << 16):
+        self.loop = loop
+        self.nodelay = nodelay
+        self.send_buffer = send_buffer
+        self.recv_buffer = recv_buffer
+        self.compression = compression
+        self.max_size = max_size
+        self.max_queue = max_queue
+        self.write_limit = write_limit
+
+    def loop_factory(self):
+        if self.loop == "asyncio":
+            return None
+
+        if self.loop != "uvloop":
+            raise ValueError(f"Unknown event loop {self.loop}.")
+
+        try:
+            import uvloop
+        except ImportError:
+            logging.warning("APP: uvloop is not installed, using the asyncio event loop.")
+            self.loop = "asyncio"
+            return None
+
+        return uvloop.new_event_loop
+
+    def run(self, main):
+        with asyncio.Runner(loop_factory=self.loop_factory()) as runner:
+            return runner.run(main)
+
+    def tune(self, sock: socket.socket):
+        # Accepted sockets inherit the options of the listener
+        if sock.family in (socket.AF_INET, socket.AF_INET6):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.nodelay))
+
+        if self.send_buffer is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.send_buffer)
+        if self.recv_buffer is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.recv_buffer)
+
+    def listen(self, host: str, port: int, backlog: int = 1024, fd: int | None = None):
+        # Options are set before the first connection is accepted. A listener
+        # inherited from the server this one replaces is bound already
+        if fd is not None:
+            sock = socket.socket(fileno=fd)
+        else:
+            sock = socket.create_server((host, port), backlog=backlog)
+        self.tune(sock)
+        return sock
+
+    def protocol_options(self):
+        # Keyword arguments of WebSocketServerProtocol, also accepted by websockets.serve
+        return {
+            "extensions": enable_server_permessage_deflate(None) if self.compression else None,
+            "max_size": self.max_size,
+            "max_queue": self.max_queue,
+            "write_limit": self.write_limit,
+        }
+
+    def serve_options(self):
+        return {"compression": None, **self.protocol_options()}
+
+    def ready(self):
+        # Seconds from the start of main.py until the server accepts connections
+        elapsed = time.perf_counter() - self.started
+        logging.info(f"APP: Ready after {elapsed * 1000:.0f} ms ({self.loop} loop).")
+        return elapsed
+
+
+runtime = Runtime()
@@ -3,9 +3,16 @@ import functools
 import logging
 
 import websockets
+from websockets.frames import CloseCode
 
 from ..event_handlers import handlers
 from ..event_handlers.lost_connection import lost_connection
+from ..managers import room_manager
+from ..managers.connection_manager import connection_manager
+from ..managers.recorder import recorder
+from ..managers.event_gate import event_gate
+from ..managers.relay import relay
+from ..types import codec
 
 
 def handle_unfinished_task(task: asyncio.Task):
@@ -22,21 +29,102 @@ def handle_unfinished_task(task: asyncio.Task):
 def handle_message_loop(func):
     @functools.wraps(func)
     async def wrapped(ws: websockets.WebSocketServerProtocol):
+        # Pipelined connections get a writer coroutine next to this reader
+        connection_manager.open(ws)
+
         try:
-            while True:
-                await func(ws)
-        except ValueError as value_e:
-            logging.error(type(value_e), value_e)
-        except websockets.ConnectionClosed:
-            await lost_connection(ws)
-            logging.info(f"Client {ws.id} disconnected.")
+            try:
+                while True:
+                    await func(ws)
+            except websockets.ConnectionClosed:
+                pass
+            except Exception as e:
+                # A failed handler leaves the client in an unknown state,
+                # so it is dropped like a closed connection
+                logging.error(f"Client {ws.id}: {type(e)}: {e}")
+                ws.fail_connection(CloseCode.INTERNAL_ERROR)
+
+            await disconnected(ws)
+        finally:
+            forget(ws)
     return wrapped
 
 
+async def disconnected(ws: websockets.WebSocketServerProtocol):
+    if recorder.enabled:
+        room = room_manager.client_room_map.get(ws.id)
+        recorder.closed(ws.id, room and room.room_id)
+
+    await lost_connection(ws)
+    logging.info(f"Client {ws.id} disconnected.")
+
+
+def forget(ws: websockets.WebSocketServerProtocol):
+    connection_manager.close(ws)
+    event_gate.forget(ws)
+    recorder.connections.pop(ws.id, None)
+
+
+def accepts_bundles(ws: websockets.WebSocketServerProtocol):
+    # Only players that set BUNDLE_FLAG in their CONNECT may send a BUNDLE
+    room = room_manager.client_room_map.get(ws.id)
+    if room is None:
+        return False
+
+    player = room.p1 if room.p1 is not None and room.p1.ws_connection is ws else room.p2
+    return bool(player.flags & codec.BUNDLE_FLAG)
+
+
 @handle_message_loop
 async def handle_connection(ws: websockets.WebSocketServerProtocol):
     data = await ws.recv()
 
+    # Clients playing on another node only pass through this one
+    if relay.homed and ws.id in relay.homed:
+        relay.forward(ws, data)
+        return
+
+    await dispatch(ws, data)
+
+
+async def dispatch(ws: websockets.WebSocketServerProtocol, data: bytes):
+    if recorder.enabled:
+        room = room_manager.client_room_map.get(ws.id)
+        recorder.inbound(ws.id, room and room.room_id, data)
+
+    # Every event of a BUNDLE goes through the gate and its handler in order,
+    # as views into the message. Clients that did not negotiate bundles have
+    # theirs dropped, a malformed one closes the connection before any of its
+    # events is handled
+    if data[0] == codec.BUNDLE:
+        if not accepts_bundles(ws):
+            return
+
+        try:
+            events = codec.split_bundle(data)
+        except ValueError:
+            ws.fail_connection(CloseCode.PROTOCOL_ERROR, "malformed bundle")
+            return
+
+        for event in events:
+            await handle_event(ws, event)
+            if ws.id in event_gate.flooding:
+                return
+        return
+
+    await handle_event(ws, data)
+
+
+async def handle_event(ws: websockets.WebSocketServerProtocol, data: bytes):
+    room = room_manager.client_room_map.get(ws.id)
+
+    # Frames the room's phase, their size or the client's budget does not
+    # allow are dropped before a handler decodes them
+    if not event_gate.admit(ws, data, room):
+        if ws.id in event_gate.flooding:
+            ws.fail_connection(CloseCode.POLICY_VIOLATION, "too many messages")
+        return
+
     # Get a handler function by message type
     handle_func = handlers.get(data[0])
     if handle_func is None:
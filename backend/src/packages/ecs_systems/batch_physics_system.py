@@ -0,0 +1,213 @@
+import numpy as np
+
+from .physics_system import PhysicSystem
+from ..types.payloads import IncomingPayload
+
+
+class BatchPhysicSystem:
+    # Structure-of-arrays store for the ball and paddles of every simulated room,
+    # stepped with whole-array operations instead of one room at a time
+    NO_CONTACT = -1
+
+    def __init__(self, capacity=1024):
+        self.capacity = 0
+        self.size = 0  # High-water mark of the used slots
+
+        self.ball_x = np.zeros(0)
+        self.ball_y = np.zeros(0)
+        self.vel_x = np.zeros(0)
+        self.vel_y = np.zeros(0)
+        self.p1_y = np.zeros(0)
+        self.p2_y = np.zeros(0)
+        self.active = np.zeros(0, dtype=bool)
+
+        self.rooms = []
+        self.slots = {}
+        self.free_slots = []
+
+        self.grow(capacity)
+
+    def __len__(self):
+        return len(self.slots)
+
+    def grow(self, capacity):
+        def resize(array):
+            result = np.zeros(capacity, dtype=array.dtype)
+            result[:self.capacity] = array
+            return result
+
+        self.ball_x = resize(self.ball_x)
+        self.ball_y = resize(self.ball_y)
+        self.vel_x = resize(self.vel_x)
+        self.vel_y = resize(self.vel_y)
+        self.p1_y = resize(self.p1_y)
+        self.p2_y = resize(self.p2_y)
+        self.active = resize(self.active)
+
+        self.rooms.extend([None] * (capacity - self.capacity))
+        self.capacity = capacity
+
+    def add_room(self, room):
+        if room in self.slots:
+            slot = self.slots[room]
+        elif self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            if self.size == self.capacity:
+                self.grow(2 * self.capacity)
+            slot = self.size
+            self.size += 1
+
+        self.ball_x[slot], self.ball_y[slot] = room.ball_pos
+        self.vel_x[slot], self.vel_y[slot] = room.ball_vel
+        self.p1_y[slot] = room.p1.position[1]
+        self.p2_y[slot] = room.p2.position[1]
+        self.active[slot] = True
+
+        self.rooms[slot] = room
+        self.slots[room] = slot
+
+    def remove_room(self, room):
+        slot = self.slots.pop(room, None)
+        if slot is None:
+            return
+
+        self.sync_room(slot)
+
+        # A resting ball never produces a contact, so freed slots can stay in the arrays
+        self.vel_x[slot] = 0
+        self.vel_y[slot] = 0
+        self.active[slot] = False
+        self.rooms[slot] = None
+        self.free_slots.append(slot)
+
+    def move_paddle(self, room, is_player2: bool, y):
+        slot = self.slots.get(room)
+        if slot is None:
+            return
+
+        if is_player2:
+            self.p2_y[slot] = y
+        else:
+            self.p1_y[slot] = y
+
+    def sync_room(self, slot):
+        room = self.rooms[slot]
+        room.ball_pos = [float(self.ball_x[slot]), float(self.ball_y[slot])]
+        room.ball_vel = [float(self.vel_x[slot]), float(self.vel_y[slot])]
+
+    @staticmethod
+    def earliest(t, kind, t_hit, contact):
+        # Keep the earlier contact, later checks win ties like in PhysicSystem.sweep_ball
+        mask = t <= t_hit
+        np.copyto(t_hit, np.maximum(t, 0), where=mask)
+        np.copyto(contact, kind, where=mask)
+
+    def sweep_paddle(self, x, y, vx, vy, paddle_x, paddle_y, t_hit, contact):
+        # Array-wide version of PhysicSystem.sweep_box
+        half_w = PhysicSystem.PADDLE_SCALE[0] / 2 + PhysicSystem.BALL_RADIUS
+        half_h = PhysicSystem.PADDLE_SCALE[1] / 2 + PhysicSystem.BALL_RADIUS
+
+        tx1 = (paddle_x - half_w - x) / vx
+        tx2 = (paddle_x + half_w - x) / vx
+        ty1 = (paddle_y - half_h - y) / vy
+        ty2 = (paddle_y + half_h - y) / vy
+
+        tx_lo, tx_hi = np.minimum(tx1, tx2), np.maximum(tx1, tx2)
+        ty_lo, ty_hi = np.minimum(ty1, ty2), np.maximum(ty1, ty2)
+
+        # A resting axis either always or never overlaps its slab
+        inside_x = np.abs(x - paddle_x) <= half_w
+        inside_y = np.abs(y - paddle_y) <= half_h
+        still_x = vx == 0
+        still_y = vy == 0
+        tx_lo = np.where(still_x, np.where(inside_x, -np.inf, np.inf), tx_lo)
+        tx_hi = np.where(still_x, np.where(inside_x, np.inf, -np.inf), tx_hi)
+        ty_lo = np.where(still_y, np.where(inside_y, -np.inf, np.inf), ty_lo)
+        ty_hi = np.where(still_y, np.where(inside_y, np.inf, -np.inf), ty_hi)
+
+        t_enter = np.maximum(tx_lo, ty_lo)
+        t_exit = np.minimum(tx_hi, ty_hi)
+        is_side = tx_lo >= ty_lo
+
+        # Overlapping balls only collide while they move inwards
+        inwards = np.where(is_side, (paddle_x - x) * vx > 0, (paddle_y - y) * vy > 0)
+        hit = (t_enter <= t_exit) & (t_exit >= 0) & ((t_enter >= 0) | inwards)
+
+        self.earliest(
+            np.where(hit, t_enter, np.inf),
+            np.where(is_side, PhysicSystem.PADDLE_SIDE, PhysicSystem.PADDLE_EDGE),
+            t_hit,
+            contact
+        )
+
+    def step(self, dt):
+        n = self.size
+        radius = PhysicSystem.BALL_RADIUS
+        width = PhysicSystem.WORLD_WIDTH
+        height = PhysicSystem.WORLD_HEIGHT
+
+        # Views into the storage, updated in place
+        x, y = self.ball_x[:n], self.ball_y[:n]
+        vx, vy = self.vel_x[:n], self.vel_y[:n]
+
+        live = self.active[:n].copy()
+        remaining = np.full(n, dt)
+        bounced = np.zeros(n, dtype=bool)
+        goal = np.full(n, self.NO_CONTACT, dtype=np.int8)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for _ in range(PhysicSystem.MAX_CONTACTS):
+                t_hit = remaining.copy()
+                contact = np.full(n, self.NO_CONTACT, dtype=np.int8)
+
+                # Top and bottom walls
+                self.earliest(np.where(vy < 0, (radius - y) / vy, np.inf), PhysicSystem.TOP_WALL, t_hit, contact)
+                self.earliest(
+                    np.where(vy > 0, (height - radius - y) / vy, np.inf), PhysicSystem.BOTTOM_WALL, t_hit, contact)
+
+                # Goals behind each paddle
+                self.earliest(np.where(vx < 0, (radius - x) / vx, np.inf), PhysicSystem.LEFT_GOAL, t_hit, contact)
+                self.earliest(
+                    np.where(vx > 0, (width - radius - x) / vx, np.inf), PhysicSystem.RIGHT_GOAL, t_hit, contact)
+
+                # Paddles
+                self.sweep_paddle(x, y, vx, vy, PhysicSystem.PADDLE_OFFSET, self.p1_y[:n], t_hit, contact)
+                self.sweep_paddle(x, y, vx, vy, width - PhysicSystem.PADDLE_OFFSET, self.p2_y[:n], t_hit, contact)
+
+                # Rooms that are done for this step stay where they are
+                t_hit[~live] = 0
+                contact[~live] = self.NO_CONTACT
+
+                x += vx * t_hit
+                y += vy * t_hit
+                remaining -= t_hit
+
+                goal[contact == PhysicSystem.LEFT_GOAL] = IncomingPayload.LEFT_WALL
+                goal[contact == PhysicSystem.RIGHT_GOAL] = IncomingPayload.RIGHT_WALL
+
+                side = contact == PhysicSystem.PADDLE_SIDE
+                edge = (contact == PhysicSystem.PADDLE_EDGE) | \
+                    (contact == PhysicSystem.TOP_WALL) | (contact == PhysicSystem.BOTTOM_WALL)
+                np.negative(vx, out=vx, where=side)
+                np.negative(vy, out=vy, where=edge)
+                bounced |= side | edge
+
+                live &= side | edge
+                if not live.any():
+                    break
+
+        bounced_rooms = []
+        goals = []
+
+        for slot in np.flatnonzero(goal != self.NO_CONTACT):
+            room = self.rooms[slot]
+            goals.append((room, int(goal[slot])))
+            self.remove_room(room)
+
+        bounced &= goal == self.NO_CONTACT
+        for slot in np.flatnonzero(bounced):
+            self.sync_room(slot)
+            bounced_rooms.append(self.rooms[slot])
+
+        return bounced_rooms, goals
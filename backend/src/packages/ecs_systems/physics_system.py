@@ -1,13 +1,323 @@
-from math import atan2
+import asyncio
+import logging
+from math import atan2, inf
 
-from ..types.payloads import CollisionMotionPayload
+from ..types import codec
+from ..types.payloads import CollisionMotionPayload, IncomingPayload
 
 
 class PhysicSystem:
     BALL_RADIUS = 25
 
-    def __init__(self):
-        pass
+    # Game world as seen by player 1, player 2's view is mirrored horizontally
+    WORLD_WIDTH = 1280
+    WORLD_HEIGHT = 720
+
+    PADDLE_SCALE = (25, 150)
+    PADDLE_OFFSET = 75  # Distance between a paddle's center and its side of the screen
+
+    # Upper bound of contacts resolved for one ball within a single step
+    MAX_CONTACTS = 4
+
+    # Upper bound of steps run at once when the loop falls behind
+    MAX_CATCHUP_STEPS = 4
+
+    # Contact kinds returned by sweep_ball
+    TOP_WALL = 0
+    BOTTOM_WALL = 1
+    PADDLE_SIDE = 2
+    PADDLE_EDGE = 3
+    LEFT_GOAL = 4
+    RIGHT_GOAL = 5
+
+    def __init__(self, tick_rate=0, on_goal=None, batch=None):
+        self.tick_rate = tick_rate
+        self.on_goal = on_goal
+        self.batch = batch
+        self.rooms = set()
+        self.task = None
+        self.pending_tasks = set()
+
+    @property
+    def enabled(self):
+        return self.tick_rate > 0
+
+    def configure(self, tick_rate: float, on_goal=None, batch=None):
+        self.tick_rate = tick_rate
+        self.on_goal = on_goal
+
+        # Optional vectorized store that steps every room at once
+        self.batch = batch
+
+    def add_room(self, room):
+        self.rooms.add(room)
+        if self.batch is not None:
+            self.batch.add_room(room)
+
+        # A single fixed-timestep loop simulates every room
+        if self.task is None and self.enabled:
+            self.task = asyncio.create_task(self.run())
+
+    def remove_room(self, room):
+        self.rooms.discard(room)
+        if self.batch is not None:
+            self.batch.remove_room(room)
+
+    def move_paddle(self, room, player, y):
+        player.position[1] = y
+        if self.batch is not None:
+            self.batch.move_paddle(room, player is room.p2, y)
+
+    @staticmethod
+    def sweep_box(b_pos, b_vel, cx, cy, half_w, half_h):
+        # Cast the ball's center against the box grown by the ball's radius
+        # and return the time and axis of the first contact
+        left, right = cx - half_w, cx + half_w
+        top, bottom = cy - half_h, cy + half_h
+
+        if b_vel[0] != 0:
+            tx1 = (left - b_pos[0]) / b_vel[0]
+            tx2 = (right - b_pos[0]) / b_vel[0]
+            if tx1 > tx2:
+                tx1, tx2 = tx2, tx1
+        elif left <= b_pos[0] <= right:
+            tx1, tx2 = -inf, inf
+        else:
+            return None
+
+        if b_vel[1] != 0:
+            ty1 = (top - b_pos[1]) / b_vel[1]
+            ty2 = (bottom - b_pos[1]) / b_vel[1]
+            if ty1 > ty2:
+                ty1, ty2 = ty2, ty1
+        elif top <= b_pos[1] <= bottom:
+            ty1, ty2 = -inf, inf
+        else:
+            return None
+
+        t_enter = max(tx1, ty1)
+        t_exit = min(tx2, ty2)
+        if t_enter > t_exit or t_exit < 0:
+            return None
+
+        is_side = tx1 >= ty1
+
+        # The ball is already overlapping the box (e.g. the paddle moved into it),
+        # only resolve the contact if the ball is still moving inwards
+        if t_enter < 0:
+            if is_side and (cx - b_pos[0]) * b_vel[0] <= 0:
+                return None
+            if not is_side and (cy - b_pos[1]) * b_vel[1] <= 0:
+                return None
+            t_enter = 0
+
+        return t_enter, is_side
+
+    def sweep_ball(self, b_pos, b_vel, paddles, duration):
+        # Find the earliest contact of the ball within the given duration
+        radius = self.BALL_RADIUS
+        t_hit = duration
+        contact = None
+
+        # Top and bottom walls
+        if b_vel[1] < 0:
+            t = (radius - b_pos[1]) / b_vel[1]
+            if t <= t_hit:
+                t_hit, contact = max(t, 0), self.TOP_WALL
+        elif b_vel[1] > 0:
+            t = (self.WORLD_HEIGHT - radius - b_pos[1]) / b_vel[1]
+            if t <= t_hit:
+                t_hit, contact = max(t, 0), self.BOTTOM_WALL
+
+        # Goals behind each paddle
+        if b_vel[0] < 0:
+            t = (radius - b_pos[0]) / b_vel[0]
+            if t <= t_hit:
+                t_hit, contact = max(t, 0), self.LEFT_GOAL
+        elif b_vel[0] > 0:
+            t = (self.WORLD_WIDTH - radius - b_pos[0]) / b_vel[0]
+            if t <= t_hit:
+                t_hit, contact = max(t, 0), self.RIGHT_GOAL
+
+        # Paddles
+        half_w = self.PADDLE_SCALE[0] / 2 + radius
+        half_h = self.PADDLE_SCALE[1] / 2 + radius
+        for px, py in paddles:
+            hit = self.sweep_box(b_pos, b_vel, px, py, half_w, half_h)
+            if hit is not None and hit[0] <= t_hit:
+                t_hit = hit[0]
+                contact = self.PADDLE_SIDE if hit[1] else self.PADDLE_EDGE
+
+        return t_hit, contact
+
+    @classmethod
+    def intercept_y(cls, b_pos, b_vel, x):
+        # Height of the ball's center when it reaches x, with only the top and
+        # bottom walls in the way. Each wall mirrors the path, so the height
+        # of the straight line is folded back into the field instead of
+        # stepping the ball from bounce to bounce. None when it moves away
+        if b_vel[0] == 0 or (x - b_pos[0]) * b_vel[0] < 0:
+            return None
+
+        radius = cls.BALL_RADIUS
+        span = cls.WORLD_HEIGHT - 2 * radius
+        y = (b_pos[1] + b_vel[1] * (x - b_pos[0]) / b_vel[0] - radius) % (2 * span)
+        return radius + (y if y <= span else 2 * span - y)
+
+    def step_room(self, room, dt):
+        # Advance the room's ball by dt, returns whether it bounced
+        # and the tag of the goal it reached (if any)
+        b_pos = room.ball_pos
+        b_vel = room.ball_vel
+        paddles = (
+            (self.PADDLE_OFFSET, room.p1.position[1]),
+            (self.WORLD_WIDTH - self.PADDLE_OFFSET, room.p2.position[1]),
+        )
+
+        bounced = False
+        remaining = dt
+        for _ in range(self.MAX_CONTACTS):
+            t_hit, contact = self.sweep_ball(b_pos, b_vel, paddles, remaining)
+
+            b_pos[0] += b_vel[0] * t_hit
+            b_pos[1] += b_vel[1] * t_hit
+            remaining -= t_hit
+
+            if contact is None:
+                break
+
+            if contact == self.LEFT_GOAL:
+                return bounced, IncomingPayload.LEFT_WALL
+            if contact == self.RIGHT_GOAL:
+                return bounced, IncomingPayload.RIGHT_WALL
+
+            if contact == self.PADDLE_SIDE:
+                b_vel[0] = -b_vel[0]
+            else:
+                b_vel[1] = -b_vel[1]
+            bounced = True
+
+        return bounced, None
+
+    def step(self, dt):
+        if self.batch is not None:
+            bounced_rooms, goals = self.batch.step(dt)
+            for room, _ in goals:
+                self.rooms.discard(room)
+
+            return bounced_rooms, goals
+
+        bounced_rooms = []
+        goals = []
+
+        for room in tuple(self.rooms):
+            # A player may have left during the round
+            if not room.has_two_players():
+                self.rooms.discard(room)
+                continue
+
+            bounced, tag = self.step_room(room, dt)
+
+            if tag is not None:
+                self.rooms.discard(room)
+                goals.append((room, tag))
+            elif bounced:
+                bounced_rooms.append(room)
+
+        return bounced_rooms, goals
+
+    def publish(self, bounced_rooms, goals):
+        # Push the authoritative ball state to the clients of every bounced room
+        for room in bounced_rooms:
+            b_pos, b_vel = room.ball_pos, room.ball_vel
+            frame = codec.encode_collision_motion(
+                round(b_pos[0]), round(b_pos[1]), round(b_vel[0]), round(b_vel[1])
+            )
+            room.send_all(frame)
+
+        if self.on_goal is None:
+            return
+
+        for room, tag in goals:
+            task = asyncio.create_task(self.on_goal(room, tag))
+            self.pending_tasks.add(task)
+            task.add_done_callback(self.finish_task)
+
+    def finish_task(self, task: asyncio.Task):
+        self.pending_tasks.discard(task)
+
+        if not task.cancelled() and task.exception():
+            logging.error(f"{type(task.exception())}: {task.exception()}")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        dt = 1 / self.tick_rate
+        deadline = loop.time()
+
+        try:
+            while self.rooms:
+                deadline += dt
+                await asyncio.sleep(max(0, deadline - loop.time()))
+
+                # Catch up with fixed steps if the loop fell behind
+                steps = 0
+                while True:
+                    self.publish(*self.step(dt))
+                    steps += 1
+
+                    if deadline + dt > loop.time() or steps >= self.MAX_CATCHUP_STEPS:
+                        break
+                    deadline += dt
+        finally:
+            self.task = None
+
+    @staticmethod
+    def hits_edge(b_pos, w_pos, w_scale):
+        # Whether reflect_object treats the hit as a top/bottom hit, i.e. whether
+        # the direction to the wall's center lies between the directions to the
+        # bottom (or top) corners, compared without atan2.
+        #
+        # atan2(ay, ax) <= atan2(by, bx) holds when a's half-plane rank is lower,
+        # or when both share a rank and the cross product a x b is not negative.
+        # The ranks follow atan2's order: (-pi, 0) -> 0, 0 -> 1, (0, pi) -> 2, pi -> 3
+        dx = w_pos[0] - b_pos[0]
+        dy = w_pos[1] - b_pos[1]
+        top = w_pos[1] - w_scale[1] // 2 - b_pos[1]
+        bottom = w_pos[1] + w_scale[1] // 2 - b_pos[1]
+        right = w_pos[0] + w_scale[0] // 2 - b_pos[0]
+        left = w_pos[0] - w_scale[0] // 2 - b_pos[0]
+
+        h_d = 0 if dy < 0 else 2 if dy > 0 else 1 if dx >= 0 else 3
+        h_br = 0 if bottom < 0 else 2 if bottom > 0 else 1 if right >= 0 else 3
+        h_bl = 0 if bottom < 0 else 2 if bottom > 0 else 1 if left >= 0 else 3
+        h_tl = 0 if top < 0 else 2 if top > 0 else 1 if left >= 0 else 3
+        h_tr = 0 if top < 0 else 2 if top > 0 else 1 if right >= 0 else 3
+
+        return (
+            (h_br < h_d or (h_br == h_d and (h_d & 1 or right * dy - bottom * dx >= 0))) and
+            (h_d < h_bl or (h_d == h_bl and (h_d & 1 or dx * bottom - dy * left >= 0)))
+        ) or (
+            (h_tl < h_d or (h_tl == h_d and (h_d & 1 or left * dy - top * dx >= 0))) and
+            (h_d < h_tr or (h_d == h_tr and (h_d & 1 or dx * top - dy * right >= 0)))
+        )
+
+    @staticmethod
+    def reflect(b_pos, b_vel, w_pos, w_scale):
+        # Trigonometry-free reflect_object, returns (pos_x, pos_y, vel_x, vel_y)
+        if PhysicSystem.hits_edge(b_pos, w_pos, w_scale):
+            if w_pos[1] - b_pos[1] >= 0:
+                pos_y = w_pos[1] - w_scale[1] // 2 - PhysicSystem.BALL_RADIUS
+            else:
+                pos_y = w_pos[1] + w_scale[1] // 2 + PhysicSystem.BALL_RADIUS
+
+            return b_pos[0], pos_y, b_vel[0], -b_vel[1]
+
+        if w_pos[0] - b_pos[0] >= 0:
+            pos_x = w_pos[0] - w_scale[0] // 2 - PhysicSystem.BALL_RADIUS
+        else:
+            pos_x = w_pos[0] + w_scale[0] // 2 + PhysicSystem.BALL_RADIUS
+
+        return pos_x, b_pos[1], -b_vel[0], b_vel[1]
 
     @staticmethod
     def reflect_object(
@@ -46,3 +356,6 @@ class PhysicSystem:
                 result.ball_pos[0] = w_right + PhysicSystem.BALL_RADIUS
 
         return result
+
+
+physics_system = PhysicSystem()
@@ -5,13 +5,54 @@ from websockets import WebSocketServerProtocol
 
 from .end_round import end_round
 from ..managers import room_manager
-from ..types import CollisionPayload
+from ..managers.clock_sync import clock_sync
+from ..managers.ai_opponents import ai_opponents
+from ..types import codec
 from ..ecs_systems.physics_system import PhysicSystem
 
 
+# Distance in pixels between a reported paddle and its rewound position
+# that still counts as a hit
+REWIND_TOLERANCE = 20
+
+
+def rewind_error(room, payload, view_tick):
+    # How far the paddle a report hit was from where the server had it at
+    # the reporter's view tick. Walls do not move, None when the tick is
+    # older than the paddle's history
+    if (payload[6], payload[7]) != PhysicSystem.PADDLE_SCALE:
+        return 0
+
+    owner = room.p1 if payload[4] < PhysicSystem.WORLD_WIDTH / 2 else room.p2
+    y = owner.paddle_at(view_tick)
+    if y is None:
+        return None
+
+    return abs(payload[5] - y)
+
+
+def lag_compensated(room, p1_payload, p2_payload):
+    # Keep the reports that match the paddles as each reporter saw them,
+    # of two valid ones the earlier hit happened first
+    valid = []
+    for payload, player in ((p1_payload, room.p1), (p2_payload, room.p2)):
+        error = rewind_error(room, payload, player.view_tick)
+        if error is not None and error <= REWIND_TOLERANCE:
+            valid.append((player.view_tick, payload))
+
+    if not valid:
+        return None
+
+    return min(valid, key=lambda report: report[0])[1]
+
+
 async def collision(ws: WebSocketServerProtocol, message: bytes):
     room = room_manager.client_room_map[ws.id]
 
+    # The server resolves collisions on its own
+    if room.authoritative:
+        return
+
     # Determine player number of the client
     if room.p1.ws_connection.id == ws.id:
         index = 0
@@ -26,6 +67,17 @@ async def collision(ws: WebSocketServerProtocol, message: bytes):
     room.collision_payloads[index] = message
     room.collision_payload_received[index] = True
 
+    # Remember when the reporter saw the collision, for rewinding the paddles
+    if room.lag_compensation:
+        reporter = room.p1 if index == 0 else room.p2
+        reporter.view_tick = clock_sync.view_tick(reporter, message)
+
+    # An AI opponent backs the report of the player it plays against
+    if ai_opponents.paddles:
+        opponent = room.p2 if index == 0 else room.p1
+        if opponent is not None:
+            ai_opponents.witness(opponent.ws_connection, message)
+
     # Check if there are two collision messages received already
     if not all(room.collision_payload_received):
         return
@@ -34,45 +86,37 @@ async def collision(ws: WebSocketServerProtocol, message: bytes):
     # Calculate the result of the collision
     
     # Get the values from the payload
-    p1_payload = CollisionPayload.from_bytes(room.collision_payloads[0])
-    p2_payload = CollisionPayload.from_bytes(room.collision_payloads[1])
+    # (b_pos_x, b_pos_y, b_vel_x, b_vel_y, w_pos_x, w_pos_y, w_scale_x, w_scale_y, tag)
+    p1_payload = codec.decode_collision(room.collision_payloads[0])
+    p2_payload = codec.decode_collision(room.collision_payloads[1])
     
     # Check if the ball hits a win zone
-    if p1_payload.tag is not None and p2_payload.tag is not None:
-        return await end_round(p1_payload, p2_payload, room)
+    if p1_payload[8] is not None and p2_payload[8] is not None:
+        return await end_round(p1_payload[8], p2_payload[8], room)
 
     # Calculate the result of the collision
-    if p1_payload.ball_vel[0] < 0 and p2_payload.ball_vel[0] < 0:
-        result = PhysicSystem.reflect_object(
-            p1_payload.ball_pos,
-            p1_payload.ball_vel,
-            p1_payload.wall_pos,
-            p1_payload.wall_scale,
-        )
-    elif p1_payload.ball_vel[0] > 0 and p2_payload.ball_vel[0] > 0:
-        result = PhysicSystem.reflect_object(
-            p2_payload.ball_pos,
-            p2_payload.ball_vel,
-            p2_payload.wall_pos,
-            p2_payload.wall_scale,
-        )
+    if p1_payload[2] < 0 and p2_payload[2] < 0:
+        payload = p1_payload
+    elif p1_payload[2] > 0 and p2_payload[2] > 0:
+        payload = p2_payload
     else:
-        logging.error("[UNHANDLED CASE] Payload values doesn't match.")
-        
-        # Temporary
-        payload = random.choice([p1_payload, p2_payload])
-        result = PhysicSystem.reflect_object(
-            payload.ball_pos,
-            payload.ball_vel,
-            payload.wall_pos,
-            payload.wall_scale
-        )
-
-        # raise ValueError("Payload values doesn't match.")
+        # The reporters saw the paddles at different times
+        payload = lag_compensated(room, p1_payload, p2_payload) if room.lag_compensation else None
+
+        if payload is not None:
+            logging.info(f"Room {room.room_id}: Conflicting collision reports settled by rewinding the paddles.")
+        else:
+            logging.error("[UNHANDLED CASE] Payload values doesn't match.")
+
+            # Temporary
+            payload = random.choice([p1_payload, p2_payload])
+
+            # raise ValueError("Payload values doesn't match.")
+
+    result = PhysicSystem.reflect(payload[0:2], payload[2:4], payload[4:6], payload[6:8])
 
     # Refresh the collision payload statuses
-    room.collision_payload_received = [False, False]
-    room.collision_payloads = [None, None]
+    room.reset_collisions()
     
     # Broadcast the message to the room
-    await room.broadcast(result.to_bytes())
+    await room.broadcast(codec.encode_collision_motion(*result))
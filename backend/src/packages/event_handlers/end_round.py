@@ -1,44 +1,52 @@
-import asyncio
+import random
+import logging
 
-from .start_round import start_round
-from ..types.payloads import \
-    CollisionPayload, RoundEndPayload, CountdownStartPayload, ResultPayload
+from .start_round import countdown
+from ..managers.phase_timer import phase_timer
+from ..types import codec
+from ..types.payloads import CollisionPayload
 from ..objects.room import Room
 
 
-async def next_step(room: Room):
-    await asyncio.sleep(1.5)
-    
-    # During the timeout, a player may have disconnected
-    if not room.has_two_players():
-        return
+# Seconds between ROUND_END and the next countdown or the result
+ROUND_END_TIME = 1.5
+
 
+async def next_step(room: Room):
     # A player has won the game
     if room.game_end() != -1:
-        await room.broadcast(ResultPayload(room.p1.score, room.p2.score).to_bytes())
-        return f"Room {room.room_id}: Game finished."
-    
-    await room.broadcast(CountdownStartPayload().to_bytes())
-    await asyncio.sleep(3)
-    await start_round(room.p1.ws_connection)
+        room.phase = Room.FINISHED
+        await room.broadcast(codec.encode_result(room.p1.score, room.p2.score))
+        logging.info(f"Room {room.room_id}: Game finished.")
+        return
 
-    return None
+    await countdown(room)
 
 
-async def end_round(p1_payload: CollisionPayload, p2_payload: CollisionPayload, room: Room):
-    # P1 and P2 payloads states that ball hits different side wall (unable to determine who won)
-    if p1_payload.tag == p2_payload.tag:
-        raise Exception("Payload values contains conflicting values for the walls' tags")
+async def score_round(room: Room, tag: int):
+    # The tag is the wall the ball hit, seen from player 1's side
 
     # Ball hits left wall -> Player 2 won
-    if p1_payload.tag == CollisionPayload.LEFT_WALL and p2_payload.tag == CollisionPayload.RIGHT_WALL:
+    if tag == CollisionPayload.LEFT_WALL:
         room.p2.score += 1
 
     # Ball hits right wall -> Player 1 won
-    elif p1_payload.tag == CollisionPayload.RIGHT_WALL and p2_payload.tag == CollisionPayload.LEFT_WALL:
+    elif tag == CollisionPayload.RIGHT_WALL:
         room.p1.score += 1
 
-    payload = RoundEndPayload(room.p1.score, room.p2.score)
-    await room.broadcast(payload.to_bytes())
+    room.phase = Room.ROUND_OVER
+    await room.broadcast(codec.encode_round_end(room.p1.score, room.p2.score))
+
+    # A player leaving before then cancels the timer
+    phase_timer.schedule(room, ROUND_END_TIME, next_step)
+
+
+async def end_round(p1_tag: int, p2_tag: int, room: Room):
+    # P1 and P2 payloads states that ball hits different side wall (unable to determine who won)
+    if p1_tag == p2_tag:
+        logging.error("[UNHANDLED CASE] Payload values contains conflicting values for the walls' tags")
+
+        # Same as conflicting collision reports, rather than leaving the round hanging
+        p1_tag = random.choice([CollisionPayload.LEFT_WALL, CollisionPayload.RIGHT_WALL])
 
-    return asyncio.create_task(next_step(room))
+    return await score_round(room, p1_tag)
@@ -1,27 +1,59 @@
-import logging
+from websockets import WebSocketServerProtocol
 
-from websockets import WebSocketServerProtocol, \
-    ConnectionClosedError, ConnectionClosedOK
-
-from ..types import SERVER_EVENT
+from ..types import codec
 from ..managers import room_manager
+from ..managers.spectator_stream import spectator_stream
+from ..managers.relay import relay
+from ..managers.sessions import sessions
+from ..managers.phase_timer import phase_timer
+from ..objects.room import Room
+from ..ecs_systems.physics_system import physics_system
 
 
 async def lost_connection(ws: WebSocketServerProtocol):
+    # Spectators only leave the stream of the room they watched
+    if spectator_stream.leave(ws):
+        return
+
+    # The room of a client playing on another node is left there
+    if relay.closed(ws):
+        return
+
     # Get the room of the client before removing the player
-    room = room_manager.client_room_map[ws.id]
+    room = room_manager.client_room_map.get(ws.id)
+    if room is None:
+        # The client never joined a room
+        return
+
+    # Stop simulating the round of the room
+    physics_system.remove_room(room)
+
+    # The seat of a player of a match under way waits for the client to come
+    # back with its token, the round in play is played again then
+    player = room.p1 if room.p1.ws_connection.id == ws.id else room.p2
+    if sessions.keeps(room, player):
+        room_manager.hold_player(ws.id, sessions.grace)
+        phase_timer.cancel(room)
+        room.phase = Room.ROUND_OVER
+
+        # Only version 2 clients know OP_AWAY, spectators are not told
+        opponent = room.p2 if player is room.p1 else room.p1
+        if opponent.version > 1:
+            opponent.send_nowait(opponent.stamp(codec.OP_AWAY_FRAME))
+            if room.recorder is not None:
+                room.recorder.outbound(opponent.ws_connection.id, room.room_id, codec.OP_AWAY_FRAME)
+        return
     
     # Remove the player from their room
     await room_manager.remove_player(ws.id)
 
+    # A seat nobody came back to has no match left to resume
+    if room.p1 is not None and sessions.is_detached(room.p1):
+        await room_manager.remove_player(room.p1.ws_connection.id)
+
     # Notify the other player in the room that
     # the opponent has disconnected
-    if not room.is_room_empty():
-        try:
-            await room.p1.ws_connection.send(SERVER_EVENT.OP_DISCONNECT.value.to_bytes())
-        except ConnectionClosedError:
-            room.p1 = None
-            logging.error("Unable to send message to player 1")
-        except ConnectionClosedOK:
-            room.p1 = None
-            logging.error("Unable to send message to player 1")
+    room.send_all(codec.OP_DISCONNECT_FRAME)
+
+    if room.is_room_empty():
+        spectator_stream.close_room(room)
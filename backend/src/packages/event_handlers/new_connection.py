@@ -1,46 +1,84 @@
-import asyncio
-
 import websockets
+from websockets.frames import CloseCode
 
-from .start_round import start_round
+from .start_round import countdown
+from .end_round import next_step
+from .lost_connection import lost_connection
 from ..managers.room_manager import room_manager
-from ..types.payloads import CountdownStartPayload
-from ..types import SERVER_EVENT
+from ..managers.sessions import sessions
+from ..managers.handoff import handoff
+from ..managers.clock_sync import clock_sync
+from ..managers.relay import relay
+from ..types import codec
 
 
-def create_connected_message(is_player1: bool):
-    code = SERVER_EVENT.CONNECTED.value.to_bytes(1, "little")
-    if is_player1:
-        payload = (0).to_bytes()
-    else:
-        payload = (1).to_bytes()
+async def new_connection(ws: websockets.WebSocketServerProtocol, message: bytes):
+    # Assign the player a room
+    bucket, version, flags = codec.decode_connect(message)
 
-    return code + payload
+    # A client back after a restart or a dropped connection takes its seat
+    # again. One back before its old connection was found dead replaces it
+    room = None
+    if flags & codec.RESUME_FLAG:
+        token = codec.decode_resume_token(message)
+        replaced = sessions.connection(token)
+        if replaced is not None and replaced is not ws:
+            replaced.fail_connection(CloseCode.POLICY_VIOLATION, "replaced by a new connection")
+            await lost_connection(replaced)
 
+        room = room_manager.resume_player(ws, token)
+    resumed = room is not None
 
-async def initialize_game(ws: websockets.WebSocketServerProtocol):
-    await asyncio.sleep(3)
-    await start_round(ws)
+    if room is None:
+        # A draining server takes no new players, the client finds another server
+        if handoff.draining:
+            ws.fail_connection(CloseCode.SERVICE_RESTART, "server restarting")
+            return
 
-    room = room_manager.client_room_map[ws.id]
-    return f"Room {room.room_id}: Finish game initialization"
+        # Without a local opponent, a player waiting on another node is claimed
+        # and the client's messages go to that node from then on
+        if relay.enabled and ws.id not in room_manager.claims and not room_manager.matchmaking.buckets.get(bucket):
+            if await relay.pair(ws, message, bucket):
+                return
 
+        room = await room_manager.add_player(ws, bucket)
 
-async def new_connection(ws: websockets.WebSocketServerProtocol, message: bytes):
-    # Assign the player a room
-    room = await room_manager.add_player(ws)
     if room.p1.ws_connection.id == ws.id:
         is_player1 = True
+        player = room.p1
     else:
         is_player1 = False
+        player = room.p2
 
-    # Prepare and send the server's payload
-    payload = create_connected_message(is_player1)
-    await ws.send(payload)
+    # Version 2 clients get stamped frames and are pinged for their clock
+    player.version = version
+    if version > 1 or room.lag_compensation:
+        clock_sync.start()
 
-    # Start the game timer if the room is ready
-    if room.has_two_players():
-        await room.broadcast(CountdownStartPayload().to_bytes())
-        return asyncio.create_task(initialize_game(ws))
-    
-    return None
+    # Pipelined connections queue every frame already, bundles are for the direct writes
+    player.flags = flags
+    player.bundle = bytearray() if flags & codec.BUNDLE_FLAG and player.outbox is None else None
+
+    # Prepare and send the server's payload, with the seat's token and the
+    # score so far when the client asked for one
+    if flags & codec.RESUME_FLAG:
+        if not player.token:
+            sessions.issue(player)
+        p2_score = room.p2.score if room.p2 is not None else 0
+        frame = codec.encode_connected_resumable(is_player1, version, player.token, room.p1.score, p2_score)
+    else:
+        frame = codec.encode_connected(is_player1, version)
+    player.send_nowait(frame if version == 1 else player.stamp(frame))
+
+    if room.recorder is not None:
+        room.recorder.outbound(ws.id, room.room_id, frame)
+
+    # Start the game timer if the room is ready. A resumed match goes on
+    # once both players are back, or shows its result again
+    if not room.has_two_players() or sessions.is_detached(room.p1) or sessions.is_detached(room.p2):
+        return
+
+    if resumed:
+        await next_step(room)
+    else:
+        await countdown(room)
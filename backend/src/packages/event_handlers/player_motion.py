@@ -1,23 +1,77 @@
 from websockets import WebSocketServerProtocol
 
 from ..managers import room_manager
-from ..types.payloads import MotionPayload, OpponentMotionPayload
+from ..managers.motion_scheduler import motion_scheduler
+from ..ecs_systems.physics_system import physics_system
+from ..objects.server_clock import server_clock
+from ..types import codec
 
 
 async def player_motion(ws: WebSocketServerProtocol, message: bytes):
+    size = len(message)
+    if size != codec.MOTION_SIZE and size != codec.MOTION_V2_SIZE:
+        raise Exception("Expected payload size of 5 or 7 bytes.")
+
     # Get the room associated with the client
     room = room_manager.client_room_map.get(ws.id)
 
     if room is None:
         raise Exception("Unable to find the client's room.")
-    
-    incoming_message = MotionPayload.from_bytes(message)
-    outgoing_message = OpponentMotionPayload(incoming_message.position)
 
     # Source client is player 1
-    if room.p1.ws_connection.id == ws.id and room.p2 is not None:
-        await room.p2.ws_connection.send(outgoing_message.to_bytes())
-    
+    if room.p1.ws_connection is ws:
+        source, target = room.p1, room.p2
+
     # Source client is player 2
-    elif room.p1 is not None:
-        await room.p1.ws_connection.send(outgoing_message.to_bytes())
+    else:
+        source, target = room.p2, room.p1
+
+    # Version 2 inputs are numbered, the latest seq is echoed in the client's stamps
+    if size != codec.MOTION_SIZE:
+        source.input_seq = codec.MOTION_V2_STRUCT.unpack_from(message)[2]
+
+    # Track the paddle for the server-side simulation
+    if room.authoritative:
+        physics_system.move_paddle(room, source, codec.MOTION_STRUCT.unpack_from(message)[1])
+
+    # Keep the paddle's path for rewinding conflicting collision reports
+    if room.lag_compensation:
+        source.record_paddle(server_clock.tick(), codec.MOTION_STRUCT.unpack_from(message)[1])
+
+    if target is None:
+        return
+
+    # OP_MOTION carries the same position bytes as MOTION, so only the
+    # opcode is rewritten in the sender's preallocated frame. The frame is
+    # serialized by send() before it yields and the next MOTION of this
+    # client is only read after the send returns, so reusing it is safe.
+    frame = source.motion_frame
+    frame[:] = message
+    frame[0] = codec.OP_MOTION
+
+    # The frame always has the version 1 layout, stamped for version 2 targets
+    if size != codec.MOTION_SIZE:
+        del frame[codec.MOTION_SIZE:]
+    if target.version > 1:
+        frame += codec.STAMP_STRUCT.pack(server_clock.tick(), target.input_seq)
+
+    # Recorded when relayed, the scheduler may still replace it with a newer one
+    if room.recorder is not None:
+        room.recorder.outbound(target.ws_connection.id, room.room_id, frame)
+
+    # Only the latest position is sent on the scheduler's next tick
+    if room.coalesce_motion:
+        motion_scheduler.schedule(source, target)
+        return
+
+    # A queued frame outlives this one, so the outbox gets a copy
+    if target.outbox is not None:
+        target.outbox.push_motion(bytes(frame))
+        return
+
+    # Bundles copy the frame in
+    if target.bundle is not None:
+        target.send_nowait(frame)
+        return
+
+    await target.ws_connection.send(frame)
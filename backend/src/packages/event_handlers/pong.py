@@ -0,0 +1,18 @@
+from websockets import WebSocketServerProtocol
+
+from ..managers import room_manager
+from ..managers.clock_sync import clock_sync
+from ..types import codec
+
+
+async def pong(ws: WebSocketServerProtocol, message: bytes):
+    # A truncated frame carries no usable sample
+    if len(message) < codec.PONG_STRUCT.size:
+        return
+
+    room = room_manager.client_room_map.get(ws.id)
+    if room is None:
+        return
+
+    player = room.p1 if room.p1.ws_connection is ws else room.p2
+    clock_sync.pong(player, *codec.decode_pong(message))
@@ -0,0 +1,22 @@
+from websockets import WebSocketServerProtocol
+
+from ..managers import room_manager
+from ..managers.spectator_stream import spectator_stream
+from ..types import codec
+
+
+async def spectate(ws: WebSocketServerProtocol, message: bytes):
+    if not spectator_stream.enabled:
+        return
+
+    # Players watch their own match
+    if ws.id in room_manager.client_room_map:
+        raise ValueError(f"Client {ws.id} is playing and cannot spectate.")
+
+    room_id, = codec.decode_spectate(message)
+    room = room_manager.find_room(room_id)
+    if room is None:
+        raise ValueError(f"No room to spectate for client {ws.id}.")
+
+    await ws.send(codec.encode_spectating(int(room.room_id)))
+    spectator_stream.join(ws, room)
@@ -1,19 +1,24 @@
-import os
 import random
 
-from websockets import WebSocketServerProtocol
+from ..managers.phase_timer import phase_timer
+from ..objects.room import Room
+from ..types import codec
+from ..ecs_systems.physics_system import PhysicSystem, physics_system
 
-from ..managers import room_manager
-from ..types.payloads import RoundStartPayload
-from ..ecs_systems.physics_system import PhysicSystem
 
+# Seconds between COUNTDOWN_START and ROUND_START
+COUNTDOWN_TIME = 3
 
-async def start_round(ws: WebSocketServerProtocol):
-    # Get the client's room
-    room = room_manager.client_room_map.get(ws.id)
-    if room is None:
-        raise ValueError(f"Client {ws.id} disconnected during round start phase.")
 
+async def countdown(room: Room):
+    # The round starts when the countdown runs out, unless a player leaves first
+    room.phase = Room.COUNTDOWN
+    await room.broadcast(codec.COUNTDOWN_START_FRAME)
+    phase_timer.schedule(room, COUNTDOWN_TIME, start_round)
+
+
+async def start_round(room: Room):
+    room.phase = Room.PLAYING
 
     # Create a random ball position and velocity
     # Screen and dimensions when two browser tabs are open with equal widths and full height, and zoom in the browsers to 67%
@@ -35,10 +40,15 @@ async def start_round(ws: WebSocketServerProtocol):
     # ball_vel = [-10, 10]
 
     # Create the message
-    payload = RoundStartPayload(ball_pos, ball_vel)
+    payload = codec.encode_round_start(ball_pos[0], ball_pos[1], ball_vel[0], ball_vel[1])
 
     # Make sure the collision payloads are properly reset
-    room.collision_payload_received = [False, False]
-    room.collision_payloads = [None, None]
+    room.reset_collisions()
+
+    # Let the server simulate the ball from here on
+    if room.authoritative:
+        room.ball_pos = ball_pos
+        room.ball_vel = ball_vel
+        physics_system.add_room(room)
 
-    await room.broadcast(payload.to_bytes())
+    await room.broadcast(payload)
@@ -0,0 +1,282 @@
+import random
+import asyncio
+import logging
+from uuid import UUID, uuid4
+
+from websockets.frames import CloseCode
+from websockets.protocol import State
+
+from .room_manager import room_manager
+from .phase_timer import phase_timer
+from ..ecs_systems.physics_system import PhysicSystem
+from ..objects.room import Room
+from ..objects.connection import VirtualConnection
+from ..types import codec
+
+
+# Ball x of a contact with the face of player 1's paddle, player 2's is mirrored
+FACE_X = PhysicSystem.PADDLE_OFFSET + PhysicSystem.PADDLE_SCALE[0] / 2 + PhysicSystem.BALL_RADIUS
+
+# Range of the paddle's center
+TOP_Y = PhysicSystem.PADDLE_SCALE[1] / 2
+BOTTOM_Y = PhysicSystem.WORLD_HEIGHT - PhysicSystem.PADDLE_SCALE[1] / 2
+CENTER_Y = PhysicSystem.WORLD_HEIGHT / 2
+
+
+class AIPaddle(VirtualConnection):
+    # The connection of a player played by the server. The frames its room
+    # writes to it set where the paddle aims, its moves are sent as MOTION
+    # frames by AIOpponents
+    __slots__ = ("owner", "filler", "face_x", "opponent_x", "y", "target", "sent_y", "frame")
+
+    def __init__(self, owner: "AIOpponents", filler: bool):
+        super().__init__(uuid4())
+        self.owner = owner
+        self.filler = filler  # Joined a player left waiting, leaves when that player does
+
+        self.face_x = PhysicSystem.WORLD_WIDTH - FACE_X
+        self.opponent_x = FACE_X
+
+        # Position of the paddle, the position it moves to and the last one sent
+        self.y = self.target = CENTER_Y
+        self.sent_y = None
+
+        self.frame = bytearray(codec.MOTION_SIZE)
+
+    def deliver(self, frame: bytes):
+        self.owner.receive(self, frame)
+
+    def fail_connection(self, code: int = CloseCode.ABNORMAL_CLOSURE, reason: str = ""):
+        self.owner.leave(self)
+
+
+class AIOpponents:
+    # Server-side players for players left waiting, and for load runs without
+    # sockets. A paddle aims where the ball crosses its side, projected once
+    # per ball state its room sends instead of stepping the ball, and one
+    # loop moves every paddle that is off its aim. Paddles that reached their
+    # aim cost nothing until the ball changes course
+    PADDLE_SPEED = 400  # Pixels per second, the clients' MAX_PADDLE_VELOCITY
+
+    wait: float | None  # Seconds a player waits alone before an AI opponent joins
+    tick_rate: float
+    aim_error: float  # Largest distance in pixels between the aim and the ball's path
+
+    paddles: dict[UUID, AIPaddle]
+    moving: dict[AIPaddle, None]
+    leaving: dict[AIPaddle, None]
+    reports: list[tuple[AIPaddle, bytes]]  # COLLISION frames sent on the next update
+
+    rooms_filled: int
+    frames_sent: int
+
+    def __init__(self, wait=None, tick_rate=30, aim_error=40):
+        self.wait = wait
+        self.tick_rate = tick_rate
+        self.aim_error = aim_error
+
+        self.paddles = {}
+        self.moving = {}
+        self.leaving = {}
+        self.reports = []
+        self.task = None
+
+        # Kept apart from the module's generator, which recordings seed
+        self.random = random.Random()
+
+        self.rooms_filled = 0
+        self.frames_sent = 0
+
+    @property
+    def enabled(self):
+        return self.wait is not None
+
+    def configure(self, wait: float | None, tick_rate: float = 30, aim_error: float = 40):
+        self.wait = wait
+        self.tick_rate = tick_rate
+        self.aim_error = aim_error
+
+        room_manager.ai = self if wait is not None else None
+
+    def add(self, filler: bool):
+        paddle = AIPaddle(self, filler)
+        self.paddles[paddle.id] = paddle
+
+        # A single loop moves every paddle
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+        return paddle
+
+    async def spawn(self, bucket: int = 0):
+        # An AI player matched like any client, e.g. to load the server
+        # without sockets. Rooms of two AI players need the server to
+        # simulate the ball, since neither reports collisions
+        paddle = self.add(False)
+        await self.dispatch(paddle, bytes((codec.CONNECT, bucket)))
+        return paddle
+
+    def leave(self, paddle: AIPaddle):
+        # Disconnected on the next update
+        if paddle.state is State.OPEN:
+            paddle.state = State.CLOSING
+            self.leaving[paddle] = None
+
+    def release(self, room: Room):
+        # Called for a room about to wait for a player. An AI opponent left
+        # alone leaves as well, True then as the room is not to wait. A
+        # player gets an AI opponent after a while
+        paddle = self.paddles.get(room.p1.ws_connection.id)
+        if paddle is None:
+            phase_timer.schedule(room, self.wait, self.fill)
+        elif paddle.filler:
+            self.leave(paddle)
+            return True
+
+        return False
+
+    async def fill(self, room: Room):
+        # Out of the matchmaking first, so no other player takes the room meanwhile
+        if room not in room_manager.matchmaking:
+            return
+        room_manager.matchmaking.discard(room)
+
+        # A player of another node may have claimed the room first, and is on the way
+        backplane = room_manager.backplane
+        if backplane is not None and not await backplane.withdraw(int(room.room_id)):
+            return
+
+        if room.is_room_empty():
+            return
+
+        paddle = self.add(True)
+        room_manager.claims[paddle.id] = room.room_id
+        self.rooms_filled += 1
+        await self.dispatch(paddle, bytes((codec.CONNECT, room.bucket)))
+
+    def witness(self, ws, report: bytes):
+        # An AI opponent backs the collision its player reported. Goals are
+        # tagged with the side of the wall as the reporter sees the field,
+        # so the AI reports the other side
+        paddle = self.paddles.get(ws.id)
+        if paddle is None:
+            return
+
+        tag = codec.decode_collision(report)[8]
+        frame = bytes(report[:codec.COLLISION_SIZE])
+        if tag is not None:
+            frame += bytes((1 - tag,))
+        self.reports.append((paddle, frame))
+
+    def receive(self, paddle: AIPaddle, frame: bytes):
+        code = frame[0]
+        if code == codec.OP_MOTION:
+            return
+
+        if code == codec.ROUND_START or code == codec.COLLISION_MOTION:
+            _, x, y, vx, vy = codec.BALL_STATE_STRUCT.unpack_from(frame)
+            self.aim(paddle, self.predict(paddle, x, y, vx, vy))
+
+        elif code == codec.CONNECTED:
+            # Frames are in player 1's view of the field
+            if frame[1] == 0:
+                paddle.face_x, paddle.opponent_x = paddle.opponent_x, paddle.face_x
+
+            # The server learns where the paddle starts
+            paddle.sent_y = None
+            self.aim(paddle, CENTER_Y)
+
+        elif code == codec.COUNTDOWN_START or code == codec.ROUND_END:
+            self.aim(paddle, CENTER_Y)
+
+    def predict(self, paddle: AIPaddle, x, y, vx, vy):
+        # Where the ball reaches the paddle's face. A ball moving away is
+        # expected back off the other paddle, whose face mirrors its path
+        target_x = paddle.face_x
+        if (target_x - x) * vx <= 0:
+            target_x = 2 * paddle.opponent_x - paddle.face_x
+
+        intercept = PhysicSystem.intercept_y((x, y), (vx, vy), target_x)
+        if intercept is None:
+            return CENTER_Y
+
+        return intercept + self.random.uniform(-self.aim_error, self.aim_error)
+
+    def aim(self, paddle: AIPaddle, y: float):
+        paddle.target = min(max(y, TOP_Y), BOTTOM_Y)
+        self.moving[paddle] = None
+
+    async def dispatch(self, paddle: AIPaddle, frame: bytes):
+        # Frames of AI players take the path of client frames
+        from ..api.server import dispatch
+
+        try:
+            await dispatch(paddle, frame)
+        except Exception as e:
+            logging.error(f"AI: {type(e).__name__}: {e}")
+            self.leave(paddle)
+
+    async def update(self, elapsed: float):
+        from ..api.server import disconnected, forget
+
+        # Reports first, the collision they back waits for them
+        reports, self.reports = self.reports, []
+        for paddle, frame in reports:
+            if paddle.state is State.OPEN:
+                await self.dispatch(paddle, frame)
+
+        leaving, self.leaving = self.leaving, {}
+        for paddle in leaving:
+            del self.paddles[paddle.id]
+            self.moving.pop(paddle, None)
+            paddle.state = State.CLOSED
+            await disconnected(paddle)
+            forget(paddle)
+
+        step = self.PADDLE_SPEED * elapsed
+        for paddle in tuple(self.moving):
+            y, target = paddle.y, paddle.target
+            if abs(target - y) <= step:
+                y = target
+                del self.moving[paddle]
+            else:
+                y += step if target > y else -step
+            paddle.y = y
+
+            # Moves under a pixel are not sent
+            position = round(y)
+            if position == paddle.sent_y or paddle.state is not State.OPEN:
+                continue
+
+            paddle.sent_y = position
+            codec.OP_MOTION_STRUCT.pack_into(paddle.frame, 0, codec.MOTION, PhysicSystem.PADDLE_OFFSET, position)
+            self.frames_sent += 1
+            await self.dispatch(paddle, paddle.frame)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        deadline = last = loop.time()
+
+        try:
+            while self.paddles:
+                # A slow update skips ticks rather than running them back to back
+                deadline = max(deadline + interval, loop.time())
+                await asyncio.sleep(deadline - loop.time())
+
+                now = loop.time()
+                await self.update(now - last)
+                last = now
+        finally:
+            self.task = None
+
+    def stats(self):
+        return {
+            "players": len(self.paddles),
+            "moving": len(self.moving),
+            "rooms_filled": self.rooms_filled,
+            "frames_sent": self.frames_sent,
+        }
+
+
+ai_opponents = AIOpponents()
@@ -0,0 +1,334 @@
+import asyncio
+import logging
+import itertools
+from abc import ABC, abstractmethod
+from struct import Struct
+from typing import Callable
+
+
+# Node <-> broker messages (little-endian): size u32 | type u8 | body, where
+# size counts the type and the body
+#   HELLO:      node                  broker -> node, the id the node is known by
+#   POST:       room bucket           a room of the node waits for an opponent
+#   WITHDRAW:   request room          request 0 for no WITHDRAWN reply
+#   WITHDRAWN:  request ok            ok 0: another node claimed the room first
+#   CLAIM:      request bucket batch
+#   CLAIMED:    request node room     node NO_NODE: no room waits in the bucket
+#   ASSIGNED:   node room batch       broker -> the node of a claimed room, before CLAIMED
+#   RELAY:      node batch            to the destination node, from the source node
+#   NODE_DOWN:  node
+HEADER_STRUCT = Struct("<IB")
+HELLO, POST, WITHDRAW, WITHDRAWN, CLAIM, CLAIMED, ASSIGNED, RELAY, NODE_DOWN = range(9)
+
+NODE_STRUCT = Struct("<H")
+POST_STRUCT = Struct("<IB")
+WITHDRAW_STRUCT = Struct("<II")
+WITHDRAWN_STRUCT = Struct("<IB")
+CLAIM_STRUCT = Struct("<IB")
+CLAIMED_STRUCT = Struct("<IHI")
+ASSIGNED_STRUCT = Struct("<HI")
+
+NO_NODE = 0
+
+
+class RoomRegistry:
+    # Rooms waiting for an opponent on every node, by bucket. Rooms are
+    # (node, room id) pairs and the dicts are used as insertion ordered sets,
+    # so posting, withdrawing and claiming the oldest room are O(1)
+    buckets: dict[int, dict[tuple[int, int], None]]
+    rooms: dict[tuple[int, int], int]  # Bucket of every waiting room
+    nodes: dict[int, set[tuple[int, int]]]  # Waiting rooms of every node
+
+    def __init__(self):
+        self.buckets = {}
+        self.rooms = {}
+        self.nodes = {}
+
+    def __len__(self):
+        return len(self.rooms)
+
+    def post(self, node: int, room_id: int, bucket: int):
+        room = (node, room_id)
+        if room in self.rooms:
+            return
+
+        self.rooms[room] = bucket
+        self.buckets.setdefault(bucket, {})[room] = None
+        self.nodes.setdefault(node, set()).add(room)
+
+    def withdraw(self, node: int, room_id: int):
+        room = (node, room_id)
+        bucket = self.rooms.pop(room, None)
+        if bucket is None:
+            return False
+
+        rooms = self.buckets[bucket]
+        del rooms[room]
+        if not rooms:
+            del self.buckets[bucket]
+        self.nodes[node].discard(room)
+        return True
+
+    def claim(self, node: int, bucket: int):
+        # Oldest room of the bucket on another node. A node only claims when
+        # its own matchmaking had no room of the bucket, so few are skipped
+        for room in self.buckets.get(bucket, ()):
+            if room[0] != node:
+                self.withdraw(*room)
+                return room
+
+        return None
+
+    def drop_node(self, node: int):
+        for room in list(self.nodes.pop(node, ())):
+            self.withdraw(*room)
+
+
+class Backplane(ABC):
+    # Room registry and node-to-node link shared by the server nodes of a
+    # deployment. A node posts its rooms that wait for an opponent, claims a
+    # waiting room of another node when it has none itself, and relays
+    # batches of frames to the node hosting a room
+    node: int
+
+    # Called with (source node, batch), with (source node, room id, batch) for
+    # a room of this node that was claimed, and with the id of a node that is gone
+    on_batch: Callable[[int, bytes], None] | None
+    on_claimed: Callable[[int, int, bytes], None] | None
+    on_node_down: Callable[[int], None] | None
+
+    def __init__(self):
+        self.node = NO_NODE
+        self.on_batch = None
+        self.on_claimed = None
+        self.on_node_down = None
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    @abstractmethod
+    def post(self, room_id: int, bucket: int):
+        pass
+
+    @abstractmethod
+    def discard(self, room_id: int):
+        # Withdraw without waiting for the outcome, e.g. for an emptied room
+        pass
+
+    @abstractmethod
+    async def withdraw(self, room_id: int) -> bool:
+        # False when another node claimed the room first, its player is then on the way
+        pass
+
+    @abstractmethod
+    async def claim(self, bucket: int, batch: bytes) -> tuple[int, int] | None:
+        # (node, room id) of a room waiting on another node. The batch reaches
+        # that node with the claim, ahead of anything this node sends it later
+        pass
+
+    @abstractmethod
+    def send(self, node: int, batch: bytes):
+        pass
+
+
+class LocalHub:
+    # Registry and node table shared by the local backplanes of one process
+    def __init__(self):
+        self.registry = RoomRegistry()
+        self.nodes: dict[int, LocalBackplane] = {}
+        self.ids = itertools.count(1)
+
+
+class LocalBackplane(Backplane):
+    # In-process implementation, every node of the hub lives in this process.
+    # A single node never finds a room of another node and relays nothing
+    def __init__(self, hub: LocalHub | None = None):
+        super().__init__()
+        self.hub = hub if hub is not None else LocalHub()
+
+    async def start(self):
+        self.node = next(self.hub.ids)
+        self.hub.nodes[self.node] = self
+
+    async def stop(self):
+        hub = self.hub
+        if hub.nodes.pop(self.node, None) is None:
+            return
+
+        hub.registry.drop_node(self.node)
+        for peer in list(hub.nodes.values()):
+            if peer.on_node_down is not None:
+                peer.on_node_down(self.node)
+
+    def post(self, room_id: int, bucket: int):
+        self.hub.registry.post(self.node, room_id, bucket)
+
+    def discard(self, room_id: int):
+        self.hub.registry.withdraw(self.node, room_id)
+
+    async def withdraw(self, room_id: int):
+        return self.hub.registry.withdraw(self.node, room_id)
+
+    async def claim(self, bucket: int, batch: bytes):
+        room = self.hub.registry.claim(self.node, bucket)
+        if room is not None:
+            peer = self.hub.nodes[room[0]]
+            if peer.on_claimed is not None:
+                asyncio.get_running_loop().call_soon(peer.on_claimed, self.node, room[1], batch)
+
+        return room
+
+    def send(self, node: int, batch: bytes):
+        peer = self.hub.nodes.get(node)
+        if peer is not None and peer.on_batch is not None:
+            asyncio.get_running_loop().call_soon(peer.on_batch, self.node, batch)
+
+
+class NetworkBackplane(Backplane):
+    # Talks to a broker over TCP, replies carry the id of their request. While
+    # the broker is unreachable the node only pairs its own players and keeps
+    # reconnecting
+    RECONNECT_DELAY = 1.0
+
+    host: str
+    port: int
+
+    def __init__(self, host: str, port: int):
+        super().__init__()
+        self.host = host
+        self.port = port
+
+        self.writer: asyncio.StreamWriter | None = None
+        self.task: asyncio.Task | None = None
+        self.connected: asyncio.Event | None = None
+
+        self.requests = itertools.count(1)
+        self.pending: dict[int, asyncio.Future] = {}
+
+        # Waiting rooms of this node, posted again after a reconnect
+        self.posted: dict[int, int] = {}
+
+    async def start(self):
+        self.connected = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+        await self.connected.wait()
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def write(self, kind: int, body: bytes):
+        if self.writer is None:
+            return False
+
+        self.writer.write(HEADER_STRUCT.pack(len(body) + 1, kind) + body)
+        return True
+
+    async def request(self, kind: int, body_struct: Struct, *values, tail: bytes = b""):
+        request = next(self.requests)
+        if not self.write(kind, body_struct.pack(request, *values) + tail):
+            return None
+
+        future = self.pending[request] = asyncio.get_running_loop().create_future()
+        try:
+            return await future
+        finally:
+            self.pending.pop(request, None)
+
+    def post(self, room_id: int, bucket: int):
+        self.posted[room_id] = bucket
+        self.write(POST, POST_STRUCT.pack(room_id, bucket))
+
+    def discard(self, room_id: int):
+        if self.posted.pop(room_id, None) is not None:
+            self.write(WITHDRAW, WITHDRAW_STRUCT.pack(0, room_id))
+
+    async def withdraw(self, room_id: int):
+        if self.posted.pop(room_id, None) is None:
+            return True
+
+        # Without a broker the room is this node's own again
+        ok = await self.request(WITHDRAW, WITHDRAW_STRUCT, room_id)
+        return ok is None or ok
+
+    async def claim(self, bucket: int, batch: bytes):
+        return await self.request(CLAIM, CLAIM_STRUCT, bucket, tail=batch)
+
+    def send(self, node: int, batch: bytes):
+        self.write(RELAY, NODE_STRUCT.pack(node) + batch)
+
+    def dispatch(self, kind: int, body: bytes):
+        if kind == RELAY:
+            if self.on_batch is not None:
+                self.on_batch(NODE_STRUCT.unpack_from(body)[0], body[NODE_STRUCT.size:])
+            return
+
+        if kind == ASSIGNED:
+            if self.on_claimed is not None:
+                self.on_claimed(*ASSIGNED_STRUCT.unpack_from(body), body[ASSIGNED_STRUCT.size:])
+            return
+
+        if kind == WITHDRAWN:
+            request, ok = WITHDRAWN_STRUCT.unpack(body)
+            result = bool(ok)
+        elif kind == CLAIMED:
+            request, node, room_id = CLAIMED_STRUCT.unpack(body)
+            result = None if node == NO_NODE else (node, room_id)
+        elif kind == NODE_DOWN:
+            if self.on_node_down is not None:
+                self.on_node_down(NODE_STRUCT.unpack(body)[0])
+            return
+        elif kind == HELLO:
+            self.node, = NODE_STRUCT.unpack(body)
+            logging.info(f"BACKPLANE: Joined {self.host}:{self.port} as node {self.node}.")
+            for room_id, bucket in self.posted.items():
+                self.write(POST, POST_STRUCT.pack(room_id, bucket))
+            self.connected.set()
+            return
+        else:
+            return
+
+        future = self.pending.get(request)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    async def run(self):
+        reachable = True
+        while True:
+            try:
+                reader, self.writer = await asyncio.open_connection(self.host, self.port)
+                reachable = True
+                while True:
+                    size, kind = HEADER_STRUCT.unpack(await reader.readexactly(HEADER_STRUCT.size))
+                    self.dispatch(kind, await reader.readexactly(size - 1))
+            except (OSError, asyncio.IncompleteReadError) as e:
+                if self.writer is not None:
+                    self.writer.close()
+                    self.writer = None
+
+                # Once per outage
+                if reachable:
+                    logging.error(f"BACKPLANE: Broker {self.host}:{self.port} unreachable ({e}).")
+                    self.lost()
+                reachable = False
+
+            await asyncio.sleep(self.RECONNECT_DELAY)
+
+    def lost(self):
+        # Every other node is out of reach, pending requests get no answer
+        for future in self.pending.values():
+            if not future.done():
+                future.set_result(None)
+
+        # The broker forgets the rooms of a node that went away, they are
+        # posted again after the next HELLO
+        self.connected.set()
+        if self.on_node_down is not None:
+            self.on_node_down(NO_NODE)
@@ -0,0 +1,90 @@
+import asyncio
+
+from websockets import WebSocketServerProtocol
+
+from ..objects.player import Player
+from ..objects.server_clock import server_clock
+from ..types import codec
+
+
+class ClockSync:
+    # Round trip time and clock offset of every player. Version 2 clients
+    # answer PING with PONG, for version 1 clients the latency of the
+    # websocket keepalive pings is used
+    ping_interval: float
+    lag_compensation: bool
+
+    # Weight of a new sample in the moving averages
+    GAIN = 1 / 8
+
+    # Echoes older than this are dropped
+    MAX_RTT = 10
+
+    def __init__(self, ping_interval=2, lag_compensation=False):
+        self.ping_interval = ping_interval
+        self.lag_compensation = lag_compensation
+        self.task = None
+
+    def configure(self, ping_interval: float, lag_compensation: bool):
+        self.ping_interval = ping_interval
+        self.lag_compensation = lag_compensation
+
+    def start(self):
+        # A single timer loop serves every room
+        if self.task is None and self.ping_interval > 0:
+            self.task = asyncio.create_task(self.run())
+
+    @staticmethod
+    def ping(player: Player):
+        player.send_nowait(player.stamp(codec.encode_ping(server_clock.ms())))
+
+    def pong(self, player: Player, server_ms: int, client_ms: int):
+        rtt = ((server_clock.ms() - server_ms) & 0xFFFFFFFF) / 1000
+        if rtt > self.MAX_RTT:
+            return
+
+        # The client read its clock about half a round trip after the PING left
+        offset = ((client_ms - server_ms + 0x80000000) & 0xFFFFFFFF) - 0x80000000 - rtt * 500
+
+        if player.rtt == 0:
+            player.rtt = rtt
+            player.clock_offset = offset
+            return
+
+        player.rtt += (rtt - player.rtt) * self.GAIN
+        player.clock_offset += (offset - player.clock_offset) * self.GAIN
+
+    @staticmethod
+    def view_tick(player: Player, message: bytes):
+        # Version 2 reports name the tick they were seen at, for version 1
+        # the view is a round trip behind the server
+        stamp = codec.decode_collision_stamp(message)
+        if stamp is not None:
+            return stamp[0]
+
+        return server_clock.tick() - server_clock.ticks(player.rtt)
+
+    def update(self, player: Player):
+        if player.version > 1:
+            self.ping(player)
+        else:
+            ws: WebSocketServerProtocol = player.ws_connection
+            player.rtt = ws.latency
+
+    async def run(self):
+        from .room_manager import room_manager
+
+        try:
+            while room_manager.rooms:
+                for room in room_manager.rooms.values():
+                    if room.p1 is not None:
+                        self.update(room.p1)
+                    if room.p2 is not None:
+                        self.update(room.p2)
+
+                await asyncio.sleep(self.ping_interval)
+        finally:
+            self.task = None
+
+
+clock_sync = ClockSync()
@@ -0,0 +1,45 @@
+import asyncio
+from uuid import UUID
+
+from websockets import WebSocketServerProtocol
+
+from ..objects.outbox import Outbox
+
+
+class ConnectionManager:
+    # Writer coroutines of pipelined connections. With a queue size of 0
+    # handlers write to the connections themselves
+    queue_size: int
+    outboxes: dict[UUID, Outbox]
+    writers: dict[UUID, asyncio.Task]
+
+    def __init__(self, queue_size=0):
+        self.queue_size = queue_size
+        self.outboxes = {}
+        self.writers = {}
+
+    @property
+    def enabled(self):
+        return self.queue_size > 0
+
+    def configure(self, queue_size: int):
+        self.queue_size = queue_size
+
+    def open(self, ws: WebSocketServerProtocol):
+        if not self.enabled:
+            return None
+
+        outbox = Outbox(ws, self.queue_size)
+        self.outboxes[ws.id] = outbox
+        self.writers[ws.id] = asyncio.create_task(outbox.run())
+        return outbox
+
+    def close(self, ws: WebSocketServerProtocol):
+        self.outboxes.pop(ws.id, None)
+
+        writer = self.writers.pop(ws.id, None)
+        if writer is not None:
+            writer.cancel()
+
+
+connection_manager = ConnectionManager()
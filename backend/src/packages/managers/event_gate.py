@@ -0,0 +1,138 @@
+import time
+from uuid import UUID
+from typing import Callable
+
+from websockets import WebSocketServerProtocol
+
+from ..objects.room import Room
+from ..types import codec
+from ..types.payload_types import CLIENT_EVENT
+
+
+EVENT_COUNT = CLIENT_EVENT.CLIENT_EVENT_COUNT.value
+
+# Pseudo phase of a client that is not in a room (new clients and spectators)
+OUTSIDE = Room.FINISHED + 1
+
+IN_ROOM = (1 << Room.WAITING) | (1 << Room.COUNTDOWN) | (1 << Room.PLAYING) \
+    | (1 << Room.ROUND_OVER) | (1 << Room.FINISHED)
+
+
+class EventGate:
+    # Drops client frames before any handler decodes them: frames the
+    # client's room does not accept in its current phase, frames too short
+    # for their opcode, and frames past the client's per-opcode budget. The
+    # checks are a few lookups per frame, a client far over budget is marked
+    # as flooding
+    rate_limit: bool
+    window: float  # Seconds the per-opcode budgets are counted over
+    clock: Callable[[], float]
+
+    # Room phases accepting each opcode, one bit per phase
+    phases: dict[int, int]
+
+    # Smallest frame, opcode included, each opcode's handler can decode
+    sizes: dict[int, int]
+
+    # Frames per opcode and window, past FLOOD_FACTOR times that the client is let go
+    limits: list[int]
+    FLOOD_FACTOR = 4
+
+    # Frame counts of the current window per client, its start last
+    counts: dict[UUID, list]
+    flooding: set[UUID]
+
+    rejected_phase: list[int]
+    rejected_size: list[int]
+    rejected_rate: list[int]
+
+    def __init__(self, rate_limit=False, window=1.0, clock=time.monotonic):
+        self.rate_limit = rate_limit
+        self.window = window
+        self.clock = clock
+
+        # Opcodes without a handler are in no phase
+        self.phases = {
+            CLIENT_EVENT.CONNECT.value: 1 << OUTSIDE,
+            CLIENT_EVENT.MOTION.value: IN_ROOM,
+            CLIENT_EVENT.COLLISION.value: 1 << Room.PLAYING,
+            CLIENT_EVENT.SPECTATE.value: 1 << OUTSIDE,
+            CLIENT_EVENT.PONG.value: IN_ROOM | (1 << OUTSIDE),
+        }
+
+        self.sizes = {
+            CLIENT_EVENT.CONNECT.value: 1,
+            CLIENT_EVENT.MOTION.value: codec.MOTION_SIZE,
+            CLIENT_EVENT.COLLISION.value: codec.COLLISION_SIZE,
+            CLIENT_EVENT.SPECTATE.value: 1,
+            CLIENT_EVENT.PONG.value: codec.PONG_STRUCT.size,
+        }
+
+        # Clients send MOTION once per rendered frame
+        self.limits = [2] * EVENT_COUNT
+        self.limits[CLIENT_EVENT.MOTION.value] = 240
+        self.limits[CLIENT_EVENT.COLLISION.value] = 30
+        self.limits[CLIENT_EVENT.PONG.value] = 4
+
+        self.counts = {}
+        self.flooding = set()
+
+        self.rejected_phase = [0] * EVENT_COUNT
+        self.rejected_size = [0] * EVENT_COUNT
+        self.rejected_rate = [0] * EVENT_COUNT
+
+    def configure(self, rate_limit: bool, window: float = 1.0):
+        self.rate_limit = rate_limit
+        self.window = window
+
+    def admit(self, ws: WebSocketServerProtocol, frame: bytes, room: Room | None):
+        if not frame:
+            return False
+
+        opcode = frame[0]
+        phases = self.phases.get(opcode)
+        if phases is None:
+            return False
+
+        if not phases >> (OUTSIDE if room is None else room.phase) & 1:
+            self.rejected_phase[opcode] += 1
+            return False
+
+        if len(frame) < self.sizes[opcode]:
+            self.rejected_size[opcode] += 1
+            return False
+
+        if not self.rate_limit:
+            return True
+
+        now = self.clock()
+        counts = self.counts.get(ws.id)
+        if counts is None:
+            counts = self.counts[ws.id] = [0] * EVENT_COUNT + [now]
+        elif now - counts[EVENT_COUNT] >= self.window:
+            counts[:] = [0] * EVENT_COUNT + [now]
+
+        count = counts[opcode] = counts[opcode] + 1
+        limit = self.limits[opcode]
+        if count <= limit:
+            return True
+
+        self.rejected_rate[opcode] += 1
+        if count > limit * self.FLOOD_FACTOR:
+            self.flooding.add(ws.id)
+
+        return False
+
+    def forget(self, ws: WebSocketServerProtocol):
+        self.counts.pop(ws.id, None)
+        self.flooding.discard(ws.id)
+
+    def stats(self):
+        return {
+            "rejected_phase": dict(enumerate(self.rejected_phase)),
+            "rejected_size": dict(enumerate(self.rejected_size)),
+            "rejected_rate": dict(enumerate(self.rejected_rate)),
+        }
+
+
+event_gate = EventGate()
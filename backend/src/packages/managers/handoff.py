@@ -0,0 +1,284 @@
+import os
+import sys
+import time
+import signal
+import socket
+import asyncio
+import logging
+import subprocess
+from struct import Struct
+
+from websockets.frames import CloseCode
+from websockets.server import WebSocketServer
+
+from .room_manager import room_manager
+from .sessions import sessions
+from ..objects.room import Room
+from ..objects.player import Player
+
+
+# Matches handed to the next server: a header, then one record per room with
+# its seats in order (all values are little-endian)
+#   header:  magic format id_count rooms
+#   room:    room_id bucket phase p1_score p2_score p1_token p2_token
+SNAPSHOT_HEADER_STRUCT = Struct("<4sBII")
+SNAPSHOT_ROOM_STRUCT = Struct("<IBBBBQQ")
+SNAPSHOT_MAGIC = b"PONG"
+SNAPSHOT_FORMAT = 1
+
+# The next server writes READY on the channel, the snapshot comes back with its size first
+SIZE_STRUCT = Struct("<I")
+READY = b"R"
+
+
+class Handoff:
+    # Rolling deploys. SIGTERM drains the server: it stops accepting
+    # connections and new players, lets the players waiting alone go, and
+    # exits once the matches under way are over or drain_timeout ran out.
+    # SIGUSR2 starts the next server on the same listening socket and hands
+    # it the matches under way, whose players reconnect with their resume
+    # token and find their seat and score there
+    drain_timeout: float
+    resume_timeout: float  # Seconds a restored room waits for its players
+    ready_timeout: float  # Seconds the next server has to start
+
+    draining: bool
+    server: WebSocketServer | None
+    finished: asyncio.Future | None  # Resolved once the server may exit
+
+    # Inherited by a server started by a hot restart
+    listen_fd: int | None
+    channel_fd: int | None
+
+    rooms_handed_off: int
+    rooms_restored: int
+
+    POLL = 0.5  # Seconds between two looks at the rooms while draining
+
+    def __init__(self, drain_timeout=60, resume_timeout=10, ready_timeout=30):
+        self.drain_timeout = drain_timeout
+        self.resume_timeout = resume_timeout
+        self.ready_timeout = ready_timeout
+
+        self.draining = False
+        self.server = None
+        self.finished = None
+        self.task = None
+
+        self.listen_fd = None
+        self.channel_fd = None
+
+        self.rooms_handed_off = 0
+        self.rooms_restored = 0
+
+    def configure(self, drain_timeout: float = 60, resume_timeout: float = 10):
+        self.drain_timeout = drain_timeout
+        self.resume_timeout = resume_timeout
+
+    def inherit(self, listen_fd: int | None, channel_fd: int | None):
+        self.listen_fd = listen_fd
+        self.channel_fd = channel_fd
+
+    def install(self, server: WebSocketServer):
+        loop = asyncio.get_running_loop()
+        self.server = server
+        self.finished = loop.create_future()
+
+        loop.add_signal_handler(signal.SIGTERM, self.drain)
+        loop.add_signal_handler(signal.SIGUSR2, self.restart)
+
+    def stop_accepting(self):
+        # Connections already accepted stay open, CONNECT is refused from now on
+        self.draining = True
+        self.server.close(close_connections=False)
+
+    @staticmethod
+    def let_go(player: Player | None):
+        if player is not None and not sessions.is_detached(player):
+            player.ws_connection.fail_connection(CloseCode.SERVICE_RESTART, "server restarting")
+
+    def close_all(self):
+        for ws in list(self.server.websockets):
+            ws.fail_connection(CloseCode.SERVICE_RESTART, "server restarting")
+
+    ##################
+    # Drain
+
+    def drain(self):
+        if self.draining:
+            return
+
+        logging.info("HANDOFF: Draining, new players go to other servers.")
+        self.stop_accepting()
+        self.task = asyncio.create_task(self.run_drain())
+
+    async def run_drain(self):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout
+
+        while True:
+            # Players waiting alone have no match to finish, they find one elsewhere
+            playing = 0
+            for room in list(room_manager.rooms.values()):
+                if Room.IN_PROGRESS >> room.phase & 1 and room.has_two_players():
+                    playing += 1
+                elif room.phase == Room.WAITING:
+                    self.let_go(room.p1)
+                    self.let_go(room.p2)
+
+            if not playing or loop.time() >= deadline:
+                break
+            await asyncio.sleep(self.POLL)
+
+        if playing:
+            logging.warning(f"HANDOFF: Drain timed out, {playing} matches are dropped.")
+        else:
+            logging.info("HANDOFF: Drained.")
+
+        self.close_all()
+        self.finished.set_result(None)
+
+    ##################
+    # Hot restart
+
+    def restart(self):
+        if self.draining:
+            return
+
+        self.task = asyncio.create_task(self.run_restart())
+
+    async def run_restart(self):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        # The next server gets the listening socket and one end of a channel
+        listener = self.server.sockets[0].fileno()
+        channel, theirs = socket.socketpair()
+        env = dict(os.environ, LISTEN_FD=str(listener), HANDOFF_FD=str(theirs.fileno()))
+        try:
+            process = subprocess.Popen([sys.executable, *sys.argv], env=env, pass_fds=(listener, theirs.fileno()))
+        finally:
+            theirs.close()
+
+        logging.info(f"HANDOFF: Restarting, next server is pid {process.pid}.")
+        self.stop_accepting()
+
+        channel.setblocking(False)
+        with channel:
+            try:
+                ready = await asyncio.wait_for(loop.sock_recv(channel, 1), self.ready_timeout)
+            except (asyncio.TimeoutError, OSError):
+                ready = b""
+
+            if ready != READY:
+                logging.error("HANDOFF: The next server did not start, draining instead.")
+                process.kill()
+                await self.run_drain()
+                return
+
+            # Nothing runs between the snapshot and letting every client go,
+            # the send blocks rather than let the loop run the clients' handlers
+            snapshot = self.snapshot()
+            channel.settimeout(self.ready_timeout)
+            channel.sendall(SIZE_STRUCT.pack(len(snapshot)) + snapshot)
+            self.close_all()
+
+        logging.info(f"HANDOFF: Handed {self.rooms_handed_off} matches ({len(snapshot)} bytes) "
+                     f"over in {(time.perf_counter() - started) * 1000:.0f} ms.")
+        self.finished.set_result(None)
+
+    def snapshot(self):
+        # Matches under way whose players can both come back
+        rooms = [
+            room for room in room_manager.rooms.values()
+            if Room.IN_PROGRESS >> room.phase & 1 and room.has_two_players() and room.p1.token and room.p2.token
+        ]
+
+        snapshot = bytearray(SNAPSHOT_HEADER_STRUCT.size + len(rooms) * SNAPSHOT_ROOM_STRUCT.size)
+        SNAPSHOT_HEADER_STRUCT.pack_into(snapshot, 0, SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, Room.id_count, len(rooms))
+
+        offset = SNAPSHOT_HEADER_STRUCT.size
+        for room in rooms:
+            p1, p2 = room.p1, room.p2
+            SNAPSHOT_ROOM_STRUCT.pack_into(
+                snapshot, offset, int(room.room_id), room.bucket, room.phase, p1.score, p2.score, p1.token, p2.token)
+            offset += SNAPSHOT_ROOM_STRUCT.size
+
+        self.rooms_handed_off = len(rooms)
+        return snapshot
+
+    async def take_over(self):
+        # Run by a server started by a hot restart before it serves. The
+        # clients of the previous server wait in the listener's backlog
+        # until the rooms are back
+        if self.channel_fd is None:
+            return
+
+        loop = asyncio.get_running_loop()
+        channel = socket.socket(fileno=self.channel_fd)
+        self.channel_fd = None
+        channel.setblocking(False)
+
+        with channel:
+            try:
+                await loop.sock_sendall(channel, READY)
+                size = SIZE_STRUCT.unpack(await self.receive(channel, SIZE_STRUCT.size))[0]
+                snapshot = await self.receive(channel, size)
+            except (ConnectionError, OSError) as e:
+                logging.error(f"HANDOFF: No matches from the previous server: {e}")
+                return
+
+        started = time.perf_counter()
+        self.restore(snapshot)
+        logging.info(f"HANDOFF: Restored {self.rooms_restored} matches in {(time.perf_counter() - started) * 1000:.1f} ms.")
+
+    @staticmethod
+    async def receive(channel: socket.socket, size: int):
+        loop = asyncio.get_running_loop()
+        data = bytearray()
+        while len(data) < size:
+            chunk = await loop.sock_recv(channel, size - len(data))
+            if not chunk:
+                raise ConnectionError("channel closed")
+            data += chunk
+
+        return data
+
+    def restore(self, snapshot: bytes):
+        magic, format, id_count, count = SNAPSHOT_HEADER_STRUCT.unpack_from(snapshot)
+        if magic != SNAPSHOT_MAGIC or format != SNAPSHOT_FORMAT:
+            raise ValueError("Unknown snapshot format.")
+
+        records = memoryview(snapshot)[SNAPSHOT_HEADER_STRUCT.size:]
+        for room_id, bucket, phase, p1_score, p2_score, p1_token, p2_token in SNAPSHOT_ROOM_STRUCT.iter_unpack(records):
+            room = room_manager.create_new_room(bucket)
+            room.room_id = str(room_id)
+
+            # The ball is not handed over, the round under way is played again
+            room.phase = Room.ROUND_OVER if phase == Room.PLAYING else phase
+            room.p1 = self.seat(room, p1_score, p1_token)
+            room.p2 = self.seat(room, p2_score, p2_token)
+            room_manager.rooms[room.room_id] = room
+
+        # Rooms created from now on do not take the id of a restored one
+        Room.id_count = max(Room.id_count, id_count)
+        self.rooms_restored += count
+
+    def seat(self, room: Room, score: int, token: int):
+        # Held like the seat of a dropped player. One whose opponent is
+        # back when it expires leaves the opponent waiting for a new one
+        player = Player(score=score)
+        sessions.issue(player, token)
+        sessions.detach(player, self.resume_timeout)
+        room_manager.client_room_map[player.ws_connection.id] = room
+        return player
+
+    def stats(self):
+        return {
+            "draining": self.draining,
+            "rooms_handed_off": self.rooms_handed_off,
+            "rooms_restored": self.rooms_restored,
+        }
+
+
+handoff = Handoff()
@@ -0,0 +1,54 @@
+from ..objects.room import Room
+
+
+class MatchmakingIndex:
+    # Half-full rooms indexed by bucket (e.g. skill or region). Insertion ordered
+    # dicts are used as sets, so claiming the oldest room and releasing or
+    # discarding any room are all O(1)
+    buckets: dict[int, dict[Room, None]]
+    waiting: dict[Room, None]
+    max_wait: float | None
+
+    def __init__(self, max_wait=None):
+        self.buckets = {}
+        self.waiting = {}
+        self.max_wait = max_wait
+
+    def __len__(self):
+        return len(self.waiting)
+
+    def __contains__(self, room: Room):
+        return room in self.waiting
+
+    def release(self, room: Room, now: float):
+        # Make a room with a single player available for matchmaking
+        room.waiting_since = now
+        self.buckets.setdefault(room.bucket, {})[room] = None
+        self.waiting[room] = None
+
+    def discard(self, room: Room):
+        if room not in self.waiting:
+            return
+
+        del self.waiting[room]
+        bucket = self.buckets[room.bucket]
+        del bucket[room]
+        if not bucket:
+            del self.buckets[room.bucket]
+
+    def claim(self, bucket: int, now: float):
+        # Oldest room of the same bucket first
+        rooms = self.buckets.get(bucket)
+        if rooms:
+            room = next(iter(rooms))
+            self.discard(room)
+            return room
+
+        # After waiting long enough, a player may be matched from any bucket
+        if self.max_wait is not None and self.waiting:
+            room = next(iter(self.waiting))
+            if now - room.waiting_since >= self.max_wait:
+                self.discard(room)
+                return room
+
+        return None
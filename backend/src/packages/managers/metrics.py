@@ -0,0 +1,344 @@
+import functools
+from time import perf_counter_ns
+
+from websockets.frames import Opcode
+
+from ..types import codec
+from ..types.payload_types import CLIENT_EVENT, SERVER_EVENT
+
+
+class Histogram:
+    # HDR-style log-linear histogram: every power of two is split into
+    # 2 ** SUB_BITS linear buckets, so recording is a couple of integer
+    # operations and each bucket is within 1 / 2 ** SUB_BITS of its values
+    SUB_BITS = 3  # record() has it inlined
+    SUB_COUNT = 1 << SUB_BITS
+
+    QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+    counts: list[int]
+    count: int
+    total: int
+
+    def __init__(self):
+        self.counts = [0] * (64 * self.SUB_COUNT)
+        self.count = 0
+        self.total = 0
+
+    @classmethod
+    def index(cls, value: int):
+        shift = value.bit_length() - cls.SUB_BITS - 1
+        if shift <= 0:
+            return value
+
+        return shift * cls.SUB_COUNT + (value >> shift)
+
+    @classmethod
+    def upper_bound(cls, index: int):
+        shift = index // cls.SUB_COUNT - 1
+        if shift <= 0:
+            return index
+
+        return ((index - shift * cls.SUB_COUNT + 1) << shift) - 1
+
+    def record(self, value: int):
+        # Same as index(), inlined for the hot path
+        shift = value.bit_length() - 4
+        self.counts[value if shift <= 0 else (shift << 3) + (value >> shift)] += 1
+        self.count += 1
+        self.total += value
+
+    def quantile(self, q: float):
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.upper_bound(index)
+
+        return 0
+
+
+class OpcodeStats:
+    messages: int
+    bytes: int
+    latency: Histogram
+    decode: Histogram
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.latency = Histogram()
+        self.decode = Histogram()
+
+
+def time_decode(stats: OpcodeStats, decoder, message: bytes):
+    # Decoders are called here rather than patched into codec, which the
+    # handlers may have imported them from. Malformed messages are left to
+    # the handler
+    start = perf_counter_ns()
+    try:
+        decoder(message)
+    except Exception:
+        return
+
+    stats.decode.record(perf_counter_ns() - start)
+
+
+class Metrics:
+    # Instrumentation is installed by configure(), an unconfigured server
+    # runs the original handlers and pays nothing
+    host: str | None
+    port: int | None
+
+    received: dict[int, OpcodeStats]
+    sent: dict[int, OpcodeStats]
+    send_queue: Histogram
+
+    DECODE_SAMPLE = 16
+
+    def __init__(self):
+        self.host = None
+        self.port = None
+        self.installed = False
+
+        self.received = {}
+        self.sent = {}
+        self.send_queue = Histogram()
+
+    @property
+    def enabled(self):
+        return self.port is not None
+
+    def configure(self, port: int | None, host: str | None = None):
+        self.host = host
+        self.port = port
+
+        if self.enabled and not self.installed:
+            self.install()
+
+    def install(self):
+        from websockets.server import WebSocketServerProtocol
+        from ..event_handlers import handlers
+        from ..objects.room import Room
+
+        for opcode, handler in handlers.items():
+            handlers[opcode] = self.instrument_handler(opcode, handler)
+
+        # send(), websockets.broadcast() and every other write of a frame to
+        # a client go through write_frame_sync
+        WebSocketServerProtocol.write_frame_sync = self.instrument_write(WebSocketServerProtocol.write_frame_sync)
+
+        Room.broadcast = self.instrument_broadcast(Room.broadcast)
+        self.installed = True
+
+    def instrument_handler(self, opcode, handler):
+        stats = self.received.setdefault(opcode, OpcodeStats())
+        decoder = codec.decoders.get(opcode)
+        sample = self.DECODE_SAMPLE
+
+        @functools.wraps(handler)
+        async def wrapped(ws, message):
+            start = perf_counter_ns()
+            try:
+                return await handler(ws, message)
+            finally:
+                stats.latency.record(perf_counter_ns() - start)
+                stats.messages += 1
+                stats.bytes += len(message)
+
+                # The first message and one in DECODE_SAMPLE after it are
+                # decoded again to time the decoder
+                if decoder is not None and stats.messages % sample == 1:
+                    time_decode(stats, decoder, message)
+
+        return wrapped
+
+    def instrument_write(self, write_frame_sync):
+        # Counts the data frames written to a connection by opcode, and
+        # samples its write buffer. Pings and close frames are not counted
+        sent = self.sent
+        record = self.send_queue.record
+
+        @functools.wraps(write_frame_sync)
+        def wrapped(ws, fin, opcode, data):
+            if opcode == Opcode.BINARY and data:
+                stats = sent.get(data[0])
+                if stats is None:
+                    stats = sent[data[0]] = OpcodeStats()
+                stats.messages += 1
+                stats.bytes += len(data)
+
+                transport = ws.transport
+                if transport is not None:
+                    record(transport.get_write_buffer_size())
+
+            return write_frame_sync(ws, fin, opcode, data)
+
+        return wrapped
+
+    def instrument_broadcast(self, broadcast):
+        # The messages are counted by the writes it makes
+        sent = self.sent
+
+        @functools.wraps(broadcast)
+        async def wrapped(room, message):
+            stats = sent.get(message[0])
+            if stats is None:
+                stats = sent[message[0]] = OpcodeStats()
+
+            start = perf_counter_ns()
+            try:
+                return await broadcast(room, message)
+            finally:
+                stats.latency.record(perf_counter_ns() - start)
+
+        return wrapped
+
+    def render(self):
+        from .room_manager import room_manager
+        from .motion_scheduler import motion_scheduler
+        from .spectator_stream import spectator_stream
+        from .phase_timer import phase_timer
+        from .event_gate import event_gate
+        from ..objects.bundles import bundles
+        from .relay import relay
+        from .ai_opponents import ai_opponents
+        from .sessions import sessions
+        from .handoff import handoff
+        from ..ecs_systems.physics_system import physics_system
+
+        lines = []
+
+        def family(name, kind, description):
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def summary(name, labels, histogram: Histogram, scale):
+            prefix = labels + "," if labels else ""
+            suffix = "{" + labels + "}" if labels else ""
+            for q in Histogram.QUANTILES:
+                value = f"{histogram.quantile(q) * scale:.9g}" if histogram.count else "NaN"
+                lines.append(f'{name}{{{prefix}quantile="{q}"}} {value}')
+            lines.append(f"{name}_sum{suffix} {histogram.total * scale:.9g}")
+            lines.append(f"{name}_count{suffix} {histogram.count}")
+
+        received = sorted(self.received.items())
+        sent = sorted(self.sent.items())
+
+        def event(opcode, events):
+            try:
+                return f'event="{events(opcode).name}"'
+            except ValueError:
+                return f'event="{opcode}"'
+
+        family("pong_messages_received_total", "counter", "Client messages handled, by opcode.")
+        for opcode, stats in received:
+            lines.append(f"pong_messages_received_total{{{event(opcode, CLIENT_EVENT)}}} {stats.messages}")
+
+        family("pong_bytes_received_total", "counter", "Client payload bytes handled, by opcode.")
+        for opcode, stats in received:
+            lines.append(f"pong_bytes_received_total{{{event(opcode, CLIENT_EVENT)}}} {stats.bytes}")
+
+        family("pong_handler_seconds", "summary", "Handler latency, by opcode.")
+        for opcode, stats in received:
+            summary("pong_handler_seconds", event(opcode, CLIENT_EVENT), stats.latency, 1e-9)
+
+        family("pong_decode_seconds", "summary", "Payload decode time of one message in 16, by opcode.")
+        for opcode, stats in received:
+            if stats.decode.count:
+                summary("pong_decode_seconds", event(opcode, CLIENT_EVENT), stats.decode, 1e-9)
+
+        family("pong_messages_rejected_total", "counter", "Client messages dropped before their handler, by opcode and reason.")
+        for reason, counts in (
+            ("phase", event_gate.rejected_phase),
+            ("size", event_gate.rejected_size),
+            ("rate", event_gate.rejected_rate),
+        ):
+            for opcode, count in enumerate(counts):
+                if count:
+                    lines.append(f'pong_messages_rejected_total{{{event(opcode, CLIENT_EVENT)},reason="{reason}"}} {count}')
+
+        family("pong_messages_sent_total", "counter", "Messages written to clients, by opcode.")
+        for opcode, stats in sent:
+            lines.append(f"pong_messages_sent_total{{{event(opcode, SERVER_EVENT)}}} {stats.messages}")
+
+        family("pong_bytes_sent_total", "counter", "Bytes written to clients, by opcode.")
+        for opcode, stats in sent:
+            lines.append(f"pong_bytes_sent_total{{{event(opcode, SERVER_EVENT)}}} {stats.bytes}")
+
+        family("pong_broadcast_seconds", "summary", "Room.broadcast latency, by opcode.")
+        for opcode, stats in sent:
+            if stats.latency.count:
+                summary("pong_broadcast_seconds", event(opcode, SERVER_EVENT), stats.latency, 1e-9)
+
+        family("pong_send_queue_bytes", "summary", "Write buffer size of a client when a message is written to it.")
+        summary("pong_send_queue_bytes", "", self.send_queue, 1)
+
+        family("pong_connected_players", "gauge", "Players in a room.")
+        lines.append(f"pong_connected_players {len(room_manager.client_room_map)}")
+
+        family("pong_waiting_players", "gauge", "Players waiting for an opponent.")
+        lines.append(f"pong_waiting_players {room_manager.waiting_players}")
+
+        family("pong_simulated_rooms", "gauge", "Rooms simulated by the physics system.")
+        lines.append(f"pong_simulated_rooms {len(physics_system.rooms)}")
+
+        family("pong_pending_timers", "gauge", "Rooms waiting on a countdown, a round end or an AI opponent.")
+        lines.append(f"pong_pending_timers {phase_timer.pending}")
+
+        family("pong_spectators", "gauge", "Spectators watching a room.")
+        lines.append(f"pong_spectators {spectator_stream.spectators}")
+
+        family("pong_motion_frames_total", "counter", "OP_MOTION frames handled by the motion scheduler.")
+        for name, value in motion_scheduler.stats().items():
+            if name.startswith("frames_"):
+                lines.append(f'pong_motion_frames_total{{state="{name[7:]}"}} {value}')
+
+        family("pong_remote_players", "gauge", "Players of rooms hosted here that are connected to another node.")
+        lines.append(f"pong_remote_players {len(relay.remote)}")
+
+        family("pong_relayed_players", "gauge", "Players connected here whose room is hosted on another node.")
+        lines.append(f"pong_relayed_players {len(relay.homed)}")
+
+        family("pong_relay_batches_total", "counter", "Batches sent to other nodes.")
+        lines.append(f"pong_relay_batches_total {relay.batches_sent}")
+
+        family("pong_relay_entries_total", "counter", "Frames and control entries sent to other nodes.")
+        lines.append(f"pong_relay_entries_total {relay.entries_sent}")
+
+        family("pong_ai_players", "gauge", "Players played by the server.")
+        lines.append(f"pong_ai_players {len(ai_opponents.paddles)}")
+
+        family("pong_ai_rooms_filled_total", "counter", "Waiting players given an AI opponent.")
+        lines.append(f"pong_ai_rooms_filled_total {ai_opponents.rooms_filled}")
+
+        family("pong_ai_motion_frames_total", "counter", "MOTION frames sent by AI players.")
+        lines.append(f"pong_ai_motion_frames_total {ai_opponents.frames_sent}")
+
+        family("pong_detached_players", "gauge", "Seats held for players who are to reconnect with their resume token.")
+        lines.append(f"pong_detached_players {len(sessions.detached)}")
+
+        family("pong_sessions_resumed_total", "counter", "Players who took their seat again with a resume token.")
+        lines.append(f"pong_sessions_resumed_total {sessions.resumed}")
+
+        family("pong_sessions_expired_total", "counter", "Held seats given up because their player did not come back in time.")
+        lines.append(f"pong_sessions_expired_total {sessions.expired}")
+
+        family("pong_rooms_restored_total", "counter", "Matches taken over from the previous server.")
+        lines.append(f"pong_rooms_restored_total {handoff.rooms_restored}")
+
+        family("pong_draining", "gauge", "1 while the server takes no new players.")
+        lines.append(f"pong_draining {int(handoff.draining)}")
+
+        family("pong_bundles_sent_total", "counter", "Messages written to bundling clients.")
+        lines.append(f"pong_bundles_sent_total {bundles.messages}")
+
+        family("pong_bundled_events_total", "counter", "Events written to bundling clients.")
+        lines.append(f"pong_bundled_events_total {bundles.events}")
+
+        lines.append("")
+        return "\n".join(lines)
+
+
+metrics = Metrics()
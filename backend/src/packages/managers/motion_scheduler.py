@@ -0,0 +1,80 @@
+import asyncio
+
+from ..objects.player import Player
+
+
+class MotionScheduler:
+    tick_rate: float
+    pending: dict[Player, Player]
+
+    frames_scheduled: int
+    frames_coalesced: int
+    frames_sent: int
+
+    def __init__(self, tick_rate=0):
+        self.tick_rate = tick_rate
+        self.pending = {}
+        self.task = None
+
+        self.frames_scheduled = 0
+        self.frames_coalesced = 0
+        self.frames_sent = 0
+
+    @property
+    def enabled(self):
+        return self.tick_rate > 0
+
+    def configure(self, tick_rate: float):
+        self.tick_rate = tick_rate
+
+    def schedule(self, source: Player, target: Player):
+        self.frames_scheduled += 1
+
+        # The source's frame always holds its latest position,
+        # a frame that is still pending is replaced by the new one
+        if source in self.pending:
+            self.frames_coalesced += 1
+        self.pending[source] = target
+
+        # A single timer loop serves every room
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def flush(self):
+        pending = self.pending
+        self.pending = {}
+
+        # send_nowait() writes synchronously, so each frame is copied to the
+        # transport before the source can overwrite it
+        for source, target in pending.items():
+            if target.outbox is not None:
+                target.outbox.push_motion(bytes(source.motion_frame))
+            else:
+                target.send_nowait(source.motion_frame)
+
+        self.frames_sent += len(pending)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        deadline = loop.time()
+
+        try:
+            while self.pending:
+                # Keep a fixed cadence regardless of how long a flush takes
+                deadline += interval
+                await asyncio.sleep(max(0, deadline - loop.time()))
+                self.flush()
+        finally:
+            self.task = None
+
+    def stats(self):
+        return {
+            "tick_rate": self.tick_rate,
+            "frames_scheduled": self.frames_scheduled,
+            "frames_coalesced": self.frames_coalesced,
+            "frames_sent": self.frames_sent,
+        }
+
+
+motion_scheduler = MotionScheduler()
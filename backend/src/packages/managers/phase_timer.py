@@ -0,0 +1,109 @@
+import math
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+from ..objects.room import Room
+from ..objects.timer_wheel import Timer, TimerWheel
+
+
+class PhaseTimer:
+    # Timed phase changes of every room (countdown -> round start, round end
+    # -> next countdown or result) run from a single coroutine on a timer
+    # wheel. A room holds at most one pending timer, dropped in O(1) when a
+    # player leaves, so rooms waiting on a timer cost no task or timer handle
+    resolution: float  # Seconds per wheel tick
+    wheel: TimerWheel
+    origin: float  # Loop time of wheel tick 0
+
+    timers_fired: int
+
+    def __init__(self, resolution=0.01):
+        self.resolution = resolution
+        self.wheel = TimerWheel()
+        self.origin = 0
+        self.task = None
+
+        # Resolved when the loop should wake up, True once its tick is due
+        self.sleeper = None
+        self.wake_tick = 0
+
+        self.timers_fired = 0
+
+    @property
+    def pending(self):
+        return len(self.wheel)
+
+    def schedule(self, room: Room, delay: float, callback: Callable[[Room], Awaitable]):
+        loop = asyncio.get_running_loop()
+        self.cancel(room)
+
+        # A single timer loop serves every room, ticks count from its start
+        if self.task is None:
+            self.wheel = TimerWheel()
+            self.origin = loop.time()
+            self.task = asyncio.create_task(self.run())
+
+        deadline = math.ceil((loop.time() + delay - self.origin) / self.resolution)
+        room.timer = self.wheel.add(deadline, callback, room)
+
+        # The loop sleeps past the new deadline
+        if self.sleeper is not None and deadline < self.wake_tick:
+            self.wake(False)
+
+    def cancel(self, room: Room):
+        timer: Timer | None = room.timer
+        if timer is None:
+            return False
+
+        room.timer = None
+        return self.wheel.cancel(timer)
+
+    def wake(self, due: bool):
+        if self.sleeper is not None and not self.sleeper.done():
+            self.sleeper.set_result(due)
+
+    async def fire(self, timer: Timer):
+        # Cancelled while an earlier timer of the same tick ran
+        room: Room = timer.arg
+        if room.timer is not timer:
+            return
+
+        room.timer = None
+        self.timers_fired += 1
+
+        try:
+            await timer.callback(room)
+        except Exception as e:
+            logging.error(f"{type(e)}: {e}")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        wheel = self.wheel
+
+        try:
+            while (tick := wheel.next_tick()) is not None:
+                self.wake_tick = tick
+                self.sleeper = loop.create_future()
+                handle = loop.call_at(self.origin + tick * self.resolution, self.wake, True)
+                try:
+                    due = await self.sleeper
+                finally:
+                    handle.cancel()
+                    self.sleeper = None
+
+                now = int((loop.time() - self.origin) / self.resolution)
+                for timer in wheel.advance(max(now, tick) if due else now):
+                    await self.fire(timer)
+        finally:
+            self.task = None
+
+    def stats(self):
+        return {
+            "resolution": self.resolution,
+            "pending": self.pending,
+            "timers_fired": self.timers_fired,
+        }
+
+
+phase_timer = PhaseTimer()
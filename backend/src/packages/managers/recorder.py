@@ -0,0 +1,202 @@
+import os
+import json
+import mmap
+import time
+import queue
+import atexit
+import random
+import asyncio
+import logging
+import threading
+from uuid import UUID
+from struct import Struct
+
+
+# Log layout (little-endian), written once per server process:
+#   header: magic seed config_size | config (JSON)
+#   record: time_ns connection room_id kind frame_size | frame
+# time_ns is monotonic and relative to the header, rooms and connections
+# are numbered by the server. Records are only ever appended.
+MAGIC = b"PONGREC1"
+HEADER_STRUCT = Struct("<8sQH")
+RECORD_STRUCT = Struct("<QIIBH")
+
+# Record kinds
+INBOUND = 0   # Frame received from a connection
+OUTBOUND = 1  # Frame sent to a connection, or to both players of the room
+CLOSED = 2    # The connection was lost
+
+# Connection of a frame sent to the whole room, room of a client without one
+EVERYONE = NO_ROOM = 0xFFFFFFFF
+
+
+class Recorder:
+    # Appends every frame of every room to a binary log. The event loop only
+    # packs records into a buffer, full batches go to a writer thread through
+    # a bounded queue. Batches that do not fit are dropped and counted rather
+    # than stalling the game
+    path: str | None
+    batch_size: int
+    flush_interval: float
+
+    connections: dict[UUID, int]
+    buffer: bytearray
+
+    batches_dropped: int
+    bytes_written: int
+
+    def __init__(self, path=None, batch_size=1 << 16, max_batches=64, flush_interval=0.1):
+        self.path = path
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.flush_interval = flush_interval
+
+        self.connections = {}
+        self.connection_count = 0
+        self.buffer = bytearray()
+        self.start_ns = 0
+        self.flush_handle = None
+
+        self.queue = None
+        self.thread = None
+
+        self.batches_dropped = 0
+        self.bytes_written = 0
+
+    @property
+    def enabled(self):
+        return self.thread is not None
+
+    def configure(self, directory: str | None, config: dict | None = None):
+        if directory is None:
+            return
+
+        # One log per process, cluster workers write their own
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"match-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.rec")
+        self.start(config or {})
+
+    def start(self, config: dict, seed: int | None = None):
+        # The server's random choices are replayed from the seed
+        if seed is None:
+            seed = random.getrandbits(64)
+        random.seed(seed)
+
+        config = json.dumps(config).encode()
+        self.buffer += HEADER_STRUCT.pack(MAGIC, seed, len(config)) + config
+        self.start_ns = time.monotonic_ns()
+
+        self.queue = queue.Queue(self.max_batches)
+        self.thread = threading.Thread(target=self.write, args=(open(self.path, "ab"),), daemon=True)
+        self.thread.start()
+
+        atexit.register(self.close)
+        logging.info(f"RECORDER: Writing frames to {self.path}")
+
+    def write(self, file):
+        # Writer thread
+        with file:
+            while True:
+                batch = self.queue.get()
+                if batch is None:
+                    return
+
+                file.write(batch)
+                file.flush()
+                self.bytes_written += len(batch)
+
+    def record(self, kind: int, connection: int, room_id: str | None, frame: bytes):
+        buffer = self.buffer
+        buffer += RECORD_STRUCT.pack(
+            time.monotonic_ns() - self.start_ns, connection,
+            NO_ROOM if room_id is None else int(room_id), kind, len(frame)
+        )
+        buffer += frame
+
+        if len(buffer) >= self.batch_size:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(self.flush_interval, self.flush)
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+        if not self.buffer:
+            return
+
+        try:
+            self.queue.put_nowait(bytes(self.buffer))
+        except queue.Full:
+            self.batches_dropped += 1
+
+        self.buffer.clear()
+
+    def connection(self, ws_id: UUID):
+        number = self.connections.get(ws_id)
+        if number is None:
+            number = self.connections[ws_id] = self.connection_count
+            self.connection_count += 1
+
+        return number
+
+    def inbound(self, ws_id: UUID, room_id: str | None, frame: bytes):
+        self.record(INBOUND, self.connection(ws_id), room_id, frame)
+
+    def outbound(self, ws_id: UUID | None, room_id: str, frame: bytes):
+        connection = EVERYONE if ws_id is None else self.connections.get(ws_id, EVERYONE)
+        self.record(OUTBOUND, connection, room_id, frame)
+
+    def closed(self, ws_id: UUID, room_id: str | None):
+        connection = self.connections.pop(ws_id, None)
+        if connection is not None:
+            self.record(CLOSED, connection, room_id, b"")
+
+    def close(self):
+        if self.thread is None:
+            return
+
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+
+class RecordLog:
+    # Read side of a log, records are parsed straight from a memory map
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.seed, config_size = HEADER_STRUCT.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a match recording.")
+
+        offset = HEADER_STRUCT.size
+        self.config = json.loads(self.map[offset:offset + config_size])
+        self.offset = offset + config_size
+
+    def __iter__(self):
+        # (time_ns, connection, room_id, kind, frame), a record cut off
+        # by a crash ends the log
+        data = self.map
+        unpack_from = RECORD_STRUCT.unpack_from
+        header_size = RECORD_STRUCT.size
+        offset = self.offset
+        end = len(data)
+
+        while offset + header_size <= end:
+            time_ns, connection, room_id, kind, size = unpack_from(data, offset)
+            offset += header_size
+            if offset + size > end:
+                return
+
+            yield time_ns, connection, room_id, kind, data[offset:offset + size]
+            offset += size
+
+    def close(self):
+        self.map.close()
+
+
+recorder = Recorder()
@@ -0,0 +1,259 @@
+import asyncio
+import logging
+from uuid import UUID
+from struct import Struct
+
+from websockets import WebSocketServerProtocol
+from websockets.frames import CloseCode
+from websockets.protocol import State
+
+from .backplane import Backplane, NO_NODE
+from .room_manager import room_manager
+from .connection_manager import connection_manager
+from ..objects.player import Player
+from ..objects.connection import VirtualConnection
+from ..types import codec
+
+
+# Relay batch entries (little-endian): kind u8 | client u128 | size u16 | data
+#   JOIN:      CONNECT frame           client node -> host, sent with the claim of a room
+#   INBOUND:   frame                   client node -> host, a message of the client
+#   CLOSED:                            client node -> host, the client disconnected
+#   OUTBOUND:  frame                   host -> client node, a message to the client
+#   KICK:      close_code              host -> client node, the host closed the client
+ENTRY_STRUCT = Struct("<B16sH")
+JOIN, INBOUND, CLOSED, OUTBOUND, KICK = range(5)
+
+CLOSE_STRUCT = Struct("<H")
+
+
+class RemoteConnection(VirtualConnection):
+    # The connection of a client of another node on the node hosting its
+    # room. What is written to it is relayed
+    def __init__(self, id: UUID, node: int, relay: "NodeRelay"):
+        super().__init__(id)
+        self.node = node
+        self.relay = relay
+
+    def deliver(self, frame: bytes):
+        self.relay.queue(self.node, OUTBOUND, self.id, frame)
+
+    def fail_connection(self, code: int = CloseCode.ABNORMAL_CLOSURE, reason: str = ""):
+        # The client's node closes the connection, CLOSED comes back
+        if self.state is State.OPEN:
+            self.state = State.CLOSING
+            self.relay.queue(self.node, KICK, self.id, CLOSE_STRUCT.pack(code))
+
+
+class NodeRelay:
+    # Pairs players connected to different nodes. The room stays on the node
+    # of the player that waited (the host), the node of the player that
+    # claimed it forwards its client's messages there and writes back what
+    # the room sends. Entries for a node are batched over one pass of the
+    # event loop, received batches are handled in order by one task
+    backplane: Backplane | None
+
+    # Hosted clients of other nodes, and local clients with their room on
+    # another node: (writer, host node, CONNECT frame)
+    remote: dict[UUID, RemoteConnection]
+    homed: dict[UUID, tuple[Player, int, bytes]]
+
+    batches: dict[int, bytearray]
+    inbox: asyncio.Queue | None
+
+    def __init__(self):
+        self.backplane = None
+        self.remote = {}
+        self.homed = {}
+
+        self.batches = {}
+        self.handle = None
+        self.inbox = None
+        self.task = None
+
+        self.batches_sent = 0
+        self.entries_sent = 0
+
+    @property
+    def enabled(self):
+        return self.backplane is not None
+
+    def configure(self, backplane: Backplane | None):
+        self.backplane = backplane
+        room_manager.backplane = backplane
+
+        if backplane is not None:
+            backplane.on_batch = self.receive
+            backplane.on_claimed = self.claimed
+            backplane.on_node_down = self.node_down
+
+    async def start(self):
+        if self.enabled:
+            await self.backplane.start()
+
+    def queue(self, node: int, kind: int, client: UUID, data: bytes):
+        batch = self.batches.get(node)
+        if batch is None:
+            batch = self.batches[node] = bytearray()
+            if self.handle is None:
+                self.handle = asyncio.get_running_loop().call_soon(self.flush)
+
+        batch += ENTRY_STRUCT.pack(kind, client.bytes, len(data))
+        batch += data
+        self.entries_sent += 1
+
+    def flush(self):
+        self.handle = None
+        batches, self.batches = self.batches, {}
+
+        for node, batch in batches.items():
+            self.backplane.send(node, bytes(batch))
+            self.batches_sent += 1
+
+    async def pair(self, ws: WebSocketServerProtocol, message: bytes, bucket: int):
+        # Claims a room waiting on another node, False when there is none
+        if ws.id in self.remote:
+            return False
+
+        # Known before the claim returns, the host may answer right away
+        player = Player(ws_connection=ws, outbox=connection_manager.outboxes.get(ws.id))
+        player.version = codec.decode_connect(message)[1]
+        self.homed[ws.id] = (player, NO_NODE, bytes(message))
+
+        join = ENTRY_STRUCT.pack(JOIN, ws.id.bytes, len(message)) + message
+        claimed = await self.backplane.claim(bucket, join)
+        if claimed is None:
+            self.homed.pop(ws.id, None)
+            return False
+
+        self.homed[ws.id] = (player, claimed[0], bytes(message))
+
+        # A client that left while the room was claimed leaves it again right away
+        if ws.state is not State.OPEN:
+            self.closed(ws)
+
+        return True
+
+    def forward(self, ws: WebSocketServerProtocol, message: bytes):
+        self.queue(self.homed[ws.id][1], INBOUND, ws.id, message)
+
+    def closed(self, ws: WebSocketServerProtocol):
+        entry = self.homed.get(ws.id)
+        if entry is None:
+            return False
+
+        # While the claim is pending, pair() sends CLOSED once it knows the host
+        if entry[1] != NO_NODE:
+            del self.homed[ws.id]
+            self.queue(entry[1], CLOSED, ws.id, b"")
+        return True
+
+    def receive(self, node: int, batch: bytes | None, room_id: int | None = None):
+        if self.inbox is None:
+            self.inbox = asyncio.Queue()
+            self.task = asyncio.create_task(self.run())
+
+        self.inbox.put_nowait((node, batch, room_id))
+
+    def claimed(self, node: int, room_id: int, batch: bytes):
+        # The JOIN of a client of the node that claimed one of this node's rooms
+        self.receive(node, batch, room_id)
+
+    def node_down(self, node: int):
+        # Handled after the batches received before it. NO_NODE stands for
+        # every node, when the backplane itself is gone
+        self.receive(node, None)
+
+    async def run(self):
+        while True:
+            node, batch, room_id = await self.inbox.get()
+            if batch is None:
+                await self.failover(node)
+                continue
+
+            view = memoryview(batch)
+            offset = 0
+            while offset < len(view):
+                kind, client, size = ENTRY_STRUCT.unpack_from(view, offset)
+                offset += ENTRY_STRUCT.size
+                data = view[offset:offset + size]
+                offset += size
+
+                try:
+                    await self.apply(node, kind, UUID(bytes=client), data, room_id)
+                except Exception as e:
+                    logging.error(f"RELAY: {type(e).__name__}: {e}")
+                    ws = self.remote.get(UUID(bytes=client))
+                    if ws is not None:
+                        ws.fail_connection(CloseCode.INTERNAL_ERROR)
+
+    async def apply(self, node: int, kind: int, client: UUID, data: memoryview, room_id: int | None):
+        from ..api.server import dispatch, disconnected, forget
+
+        if kind == OUTBOUND or kind == KICK:
+            entry = self.homed.get(client)
+            if entry is None:
+                return
+
+            player = entry[0]
+            if kind == OUTBOUND:
+                player.send_nowait(bytes(data))
+            elif player.ws_connection.state is State.OPEN:
+                player.ws_connection.fail_connection(CLOSE_STRUCT.unpack(data)[0])
+            return
+
+        if kind == JOIN:
+            ws = self.remote[client] = RemoteConnection(client, node, self)
+            room_manager.claims[client] = str(room_id)
+            await dispatch(ws, data)
+            return
+
+        ws = self.remote.get(client)
+        if ws is None:
+            return
+
+        if kind == INBOUND:
+            if ws.state is State.OPEN:
+                await dispatch(ws, data)
+        elif kind == CLOSED:
+            del self.remote[client]
+            ws.state = State.CLOSED
+            await disconnected(ws)
+            forget(ws)
+
+    async def failover(self, node: int):
+        from ..api.server import dispatch, disconnected, forget
+
+        # Clients of the node leave the rooms hosted here, their opponents wait for a new one
+        for client, ws in list(self.remote.items()):
+            if (node == NO_NODE or ws.node == node) and self.remote.pop(client, None) is not None:
+                ws.state = State.CLOSED
+                await disconnected(ws)
+                forget(ws)
+
+        # Clients whose room was on the node are told their opponent left and
+        # connect again on this node
+        for client, (player, host, message) in list(self.homed.items()):
+            if host == NO_NODE or (node != NO_NODE and host != node):
+                continue
+            if self.homed.pop(client, None) is None:
+                continue
+
+            frame = codec.OP_DISCONNECT_FRAME
+            player.send_nowait(frame if player.version == 1 else player.stamp(frame))
+            if player.ws_connection.state is State.OPEN:
+                await dispatch(player.ws_connection, message)
+
+        if node != NO_NODE:
+            logging.warning(f"RELAY: Node {node} is down.")
+
+    def stats(self):
+        return {
+            "remote": len(self.remote),
+            "homed": len(self.homed),
+            "batches_sent": self.batches_sent,
+            "entries_sent": self.entries_sent,
+        }
+
+
+relay = NodeRelay()
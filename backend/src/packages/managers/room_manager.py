@@ -1,61 +1,188 @@
+import time
 from uuid import UUID
-from asyncio import Queue
+from typing import Callable, TYPE_CHECKING
 
 from websockets import WebSocketServerProtocol
 
+from .matchmaking import MatchmakingIndex
+from .connection_manager import connection_manager
+from .motion_scheduler import motion_scheduler
+from .recorder import recorder
+from .clock_sync import clock_sync
+from .phase_timer import phase_timer
+from .backplane import Backplane
+from .sessions import sessions
+from ..ecs_systems.physics_system import physics_system
 from ..objects.room import Room
 
+if TYPE_CHECKING:
+    from .ai_opponents import AIOpponents
+
 
 class RoomManager:
     client_room_map: dict[UUID, Room]
-    room_queue: Queue[Room]
+    rooms: dict[str, Room]  # Rooms with at least one player by id
+    matchmaking: MatchmakingIndex
+    clock: Callable[[], float]
+
+    # Called with (client id, joined) whenever a player joins or leaves a room
+    on_change: Callable[[UUID, bool], None] | None
+
+    # Waiting rooms are posted to the backplane when there is one, clients of
+    # other nodes join the room their node claimed
+    backplane: Backplane | None
+    claims: dict[UUID, str]
+
+    # Fills rooms that waited too long with an AI opponent when enabled
+    ai: "AIOpponents | None"
     
-    def __init__(self):
-        self.room_queue = Queue()
+    def __init__(self, max_wait=None, clock=time.monotonic):
+        self.matchmaking = MatchmakingIndex(max_wait)
         self.client_room_map = {}
+        self.rooms = {}
+        self.on_change = None
+        self.clock = clock
+        self.backplane = None
+        self.claims = {}
+        self.ai = None
+
+    @property
+    def waiting_players(self):
+        # Number of players sitting alone in a room
+        return len(self.matchmaking)
 
-    async def get_queue_room(self, ws: WebSocketServerProtocol):
-        room = None
-        while not self.room_queue.empty():
-            room = await self.room_queue.get()
-            
-            if not room.is_room_empty():
+    def configure(self, max_wait: float | None):
+        self.matchmaking.max_wait = max_wait
+
+    async def get_queue_room(self, bucket: int = 0):
+        while True:
+            room = self.matchmaking.claim(bucket, self.clock())
+            if room is None:
+                return self.create_new_room(bucket)
+
+            # Another node may have claimed the room first, its player is on the way
+            if self.backplane is None or await self.backplane.withdraw(int(room.room_id)):
                 return room
-            
-        return await self.create_new_room()
 
-    async def create_new_room(self):
+    def claimed_room(self, ws_id: UUID):
+        # The room claimed for a client of another node or an AI opponent, unless it emptied or filled up meanwhile
+        room = self.rooms.get(self.claims.pop(ws_id))
+        if room is None or room.has_two_players():
+            return None
+
+        self.matchmaking.discard(room)
+        if self.backplane is not None:
+            self.backplane.discard(int(room.room_id))
+        return room
+
+    def find_room(self, room_id: int | None = None):
+        # A room by id, or any room with a match going on
+        if room_id is not None:
+            return self.rooms.get(str(room_id))
+
+        for room in self.rooms.values():
+            if room.has_two_players():
+                return room
+
+        return None
+
+    def create_new_room(self, bucket: int = 0):
         # Create a new room
         room = Room()
+        room.bucket = bucket
+        room.coalesce_motion = motion_scheduler.enabled
+        room.authoritative = physics_system.enabled
+        room.lag_compensation = clock_sync.lag_compensation
+        room.recorder = recorder if recorder.enabled else None
 
-        # Place room in the queue
-        await self.room_queue.put(room)
         return room
         
-    async def add_player(self, ws: WebSocketServerProtocol):
-        # Get a room from the queue
-        room = await self.get_queue_room(ws)
+    def release(self, room: Room):
+        if self.ai is not None and self.ai.release(room):
+            return
+
+        self.matchmaking.release(room, self.clock())
+        if self.backplane is not None:
+            self.backplane.post(int(room.room_id), room.bucket)
+
+    async def add_player(self, ws: WebSocketServerProtocol, bucket: int = 0):
+        # Get a half-full room of the bucket or a new one
+        room = self.claimed_room(ws.id) if ws.id in self.claims else None
+        if room is None:
+            room = await self.get_queue_room(bucket)
 
         # Add the player into the room
-        room.add_player(ws)
+        room.add_player(ws, connection_manager.outboxes.get(ws.id))
 
         # Map the client id to the room
         self.client_room_map[ws.id] = room
+        self.rooms[room.room_id] = room
+
+        # A room with a single player waits for an opponent
+        if not room.has_two_players():
+            self.release(room)
+
+        if self.on_change is not None:
+            self.on_change(ws.id, True)
+
         return room
     
+    def hold_player(self, ws_id: UUID, hold: float):
+        # The player's seat waits hold seconds for the client to come back,
+        # mapped by the seat's token in the meantime
+        room = self.client_room_map.pop(ws_id)
+        player = room.p1 if room.p1.ws_connection.id == ws_id else room.p2
+        sessions.detach(player, hold)
+        self.client_room_map[player.ws_connection.id] = room
+
+        if self.on_change is not None:
+            self.on_change(ws_id, False)
+
+        return room
+
+    def resume_player(self, ws: WebSocketServerProtocol, token: int):
+        # The client takes the seat of its detached player again, None when
+        # the token has no seat waiting for it
+        player = sessions.claim(token)
+        if player is None:
+            return None
+
+        room = self.client_room_map.pop(player.ws_connection.id)
+        sessions.rebind(player, ws, connection_manager.outboxes.get(ws.id))
+        self.client_room_map[ws.id] = room
+
+        if self.on_change is not None:
+            self.on_change(ws.id, True)
+
+        return room
+
     async def remove_player(self, ws_id: UUID):
-        # Get the client's room
-        room = self.client_room_map.get(ws_id)
+        # Remove the client from the room mappings
+        room = self.client_room_map.pop(ws_id, None)
         if room is None:
             return False
-    
-        # Place the room back into the queue if it originally has two players
-        if room.has_two_players():
-            await self.room_queue.put(room)
 
-        # Remove the player from the room and the room mappings
+        # The seat is given up, its token with it
+        player = room.p1 if room.p1 is not None and room.p1.ws_connection.id == ws_id else room.p2
+        if player is not None:
+            sessions.revoke(player)
+
+        # Remove the player from the room, a pending countdown or round end stops
         room.remove_player(ws_id)
-        self.client_room_map.pop(ws_id)
+        phase_timer.cancel(room)
+
+        # The remaining player waits for a new opponent,
+        # an empty room is dropped right away
+        if room.is_room_empty():
+            self.matchmaking.discard(room)
+            self.rooms.pop(room.room_id, None)
+            if self.backplane is not None:
+                self.backplane.discard(int(room.room_id))
+        elif room not in self.matchmaking:
+            self.release(room)
+
+        if self.on_change is not None:
+            self.on_change(ws_id, False)
 
         return True
 
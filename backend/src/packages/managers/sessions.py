@@ -0,0 +1,170 @@
+import math
+import secrets
+import asyncio
+import logging
+
+from websockets import WebSocketServerProtocol
+from websockets.protocol import State
+
+from ..objects.room import Room
+from ..objects.player import Player
+from ..objects.outbox import Outbox
+from ..objects.connection import VirtualConnection
+from ..objects.timer_wheel import Timer, TimerWheel
+
+
+class DetachedConnection(VirtualConnection):
+    # Holds the seat of a player whose client is away. It is never open, so
+    # frames written to the player are dropped until the client is back. Its
+    # id is the seat's token, an int that no client's UUID equals
+    __slots__ = ()
+
+    def __init__(self, token: int):
+        super().__init__(token)
+        self.state = State.CLOSED
+
+    def deliver(self, frame: bytes):
+        pass
+
+
+class Sessions:
+    # Resume tokens of the players that asked for one. A token finds its
+    # player in one lookup, and a reconnecting client takes the seat of a
+    # detached player, score and side included, in place of its connection.
+    # Detached seats expire on a timer wheel that a single sweeper advances
+    # every sweep_interval, giving up every seat due since the last sweep
+    grace: float  # Seconds the seat of a dropped player is held, 0 gives it up at once
+    sweep_interval: float
+
+    tokens: dict[int, Player]
+    detached: dict[Player, Timer]  # Held seats and their expiry
+    wheel: TimerWheel  # Ticks of sweep_interval seconds
+    origin: float  # Loop time of wheel tick 0
+
+    resumed: int
+    expired: int
+
+    def __init__(self, grace=0, sweep_interval=1.0):
+        self.grace = grace
+        self.sweep_interval = sweep_interval
+
+        self.tokens = {}
+        self.detached = {}
+        self.wheel = TimerWheel()
+        self.origin = 0
+        self.task = None
+
+        self.resumed = 0
+        self.expired = 0
+
+    def configure(self, grace: float, sweep_interval: float = 1.0):
+        self.grace = grace
+        self.sweep_interval = sweep_interval
+
+    def issue(self, player: Player, token: int = 0):
+        # A random 64 bit token, or the one the seat had on the previous server
+        while not token or token in self.tokens:
+            token = secrets.randbits(64)
+
+        player.token = token
+        self.tokens[token] = player
+        return token
+
+    def revoke(self, player: Player):
+        if player.token:
+            self.tokens.pop(player.token, None)
+            player.token = 0
+
+        timer = self.detached.pop(player, None)
+        if timer is not None:
+            self.wheel.cancel(timer)
+
+    def keeps(self, room: Room, player: Player):
+        # Whether the seat of a dropped player is held: one of a match under
+        # way, whose client can come back for it
+        if not self.grace or not player.token or player in self.detached:
+            return False
+
+        return room.has_two_players() and Room.IN_PROGRESS >> room.phase & 1 != 0
+
+    def detach(self, player: Player, hold: float):
+        # The seat is given up once hold seconds passed, on the sweep after
+        player.ws_connection = DetachedConnection(player.token)
+        player.ws_connections = (player.ws_connection,)
+        player.outbox = None
+
+        # A single sweeper serves every held seat, ticks count from its start
+        loop = asyncio.get_running_loop()
+        if self.task is None:
+            self.wheel = TimerWheel()
+            self.origin = loop.time()
+            self.task = asyncio.create_task(self.sweep())
+
+        deadline = math.ceil((loop.time() + hold - self.origin) / self.sweep_interval)
+        self.detached[player] = self.wheel.add(deadline, None, player)
+
+    def is_detached(self, player: Player):
+        return player in self.detached
+
+    def claim(self, token: int):
+        # The detached player of the token, None when there is none
+        player = self.tokens.get(token)
+        if player is None or player not in self.detached:
+            return None
+
+        return player
+
+    def connection(self, token: int):
+        # The connection still holding the token's seat, None when it is held for the client
+        player = self.tokens.get(token)
+        if player is None or player in self.detached:
+            return None
+
+        return player.ws_connection
+
+    def rebind(self, player: Player, ws: WebSocketServerProtocol, outbox: Outbox | None):
+        self.wheel.cancel(self.detached.pop(player))
+        player.ws_connection = ws
+        player.ws_connections = (ws,)
+        player.outbox = outbox
+        self.resumed += 1
+
+    async def expire(self, player: Player):
+        from ..event_handlers.lost_connection import lost_connection
+
+        # Given up along with an opponent's seat already
+        if player not in self.detached:
+            return
+
+        self.expired += 1
+        try:
+            await lost_connection(player.ws_connection)
+        except Exception as e:
+            logging.error(f"{type(e)}: {e}")
+
+    async def sweep(self):
+        loop = asyncio.get_running_loop()
+        wheel = self.wheel
+
+        try:
+            while len(wheel):
+                await asyncio.sleep(self.sweep_interval)
+
+                # Every seat due since the last sweep at once, sleeping more
+                # than an interval does not skip any
+                tick = int((loop.time() - self.origin) / self.sweep_interval)
+                for timer in wheel.advance(tick):
+                    await self.expire(timer.arg)
+        finally:
+            self.task = None
+
+    def stats(self):
+        return {
+            "tokens": len(self.tokens),
+            "detached": len(self.detached),
+            "resumed": self.resumed,
+            "expired": self.expired,
+        }
+
+
+sessions = Sessions()
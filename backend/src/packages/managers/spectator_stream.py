@@ -0,0 +1,128 @@
+import time
+import asyncio
+from uuid import UUID
+
+from websockets import WebSocketServerProtocol
+
+from ..objects.room import Room
+from ..objects.player import Player
+from ..objects.spectators import Spectators
+from ..types import codec
+
+
+class SpectatorStream:
+    tick_rate: float
+    keyframe_interval: int  # Ticks between two keyframes
+
+    rooms: dict[Room, None]
+    spectator_room_map: dict[UUID, Room]
+
+    def __init__(self, tick_rate=0, keyframe_interval=30):
+        self.tick_rate = tick_rate
+        self.keyframe_interval = keyframe_interval
+        self.rooms = {}
+        self.spectator_room_map = {}
+        self.task = None
+        self.ticks = 0
+
+    @property
+    def enabled(self):
+        return self.tick_rate > 0
+
+    @property
+    def spectators(self):
+        return len(self.spectator_room_map)
+
+    def configure(self, tick_rate: float, keyframe_interval: int = 30, lag_limit: int | None = None):
+        self.tick_rate = tick_rate
+        self.keyframe_interval = max(1, keyframe_interval)
+        if lag_limit is not None:
+            Spectators.lag_limit = lag_limit
+
+    def join(self, ws: WebSocketServerProtocol, room: Room):
+        # A spectator watches a single room at a time
+        self.leave(ws)
+
+        if room.spectators is None:
+            room.spectators = Spectators()
+            self.rooms[room] = None
+
+            # A simulated ball is known right away, otherwise the
+            # stream picks it up with the next COLLISION_MOTION
+            if room.authoritative:
+                room.spectators.ball = tuple(round(value) for value in room.ball_pos + room.ball_vel)
+                room.spectators.ball_time = time.monotonic()
+
+        room.spectators.add(ws)
+        self.spectator_room_map[ws.id] = room
+
+        # A single timer loop serves every watched room
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    def leave(self, ws: WebSocketServerProtocol):
+        room = self.spectator_room_map.pop(ws.id, None)
+        if room is None:
+            return False
+
+        spectators = room.spectators
+        spectators.discard(ws)
+
+        # Rooms nobody watches cost nothing again
+        if not spectators:
+            room.spectators = None
+            self.rooms.pop(room, None)
+
+        return True
+
+    def close_room(self, room: Room):
+        # Spectators of a room that lost all its players are let go,
+        # they may SPECTATE another room
+        if room.spectators is None:
+            return
+
+        for ws in room.spectators.members:
+            self.spectator_room_map.pop(ws.id, None)
+
+        room.spectators = None
+        self.rooms.pop(room, None)
+
+    @staticmethod
+    def paddle_y(player: Player | None):
+        # The last OP_MOTION relayed for the player holds its paddle position
+        if player is None:
+            return 0
+        return codec.OP_MOTION_STRUCT.unpack_from(player.motion_frame)[2]
+
+    def tick(self, now: float):
+        keyframe = self.ticks % self.keyframe_interval == 0
+        self.ticks += 1
+
+        paddle_y = self.paddle_y
+        for room in self.rooms:
+            room.spectators.tick(paddle_y(room.p1), paddle_y(room.p2), now, keyframe)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.tick_rate
+        deadline = loop.time()
+
+        try:
+            while self.rooms:
+                # Keep a fixed cadence regardless of how long a tick takes
+                deadline += interval
+                await asyncio.sleep(max(0, deadline - loop.time()))
+                self.tick(time.monotonic())
+        finally:
+            self.task = None
+
+    def stats(self):
+        return {
+            "tick_rate": self.tick_rate,
+            "rooms": len(self.rooms),
+            "spectators": self.spectators,
+            "frames_sent": sum(room.spectators.frames_sent for room in self.rooms),
+        }
+
+
+spectator_stream = SpectatorStream()
@@ -0,0 +1,65 @@
+import asyncio
+
+from ..types import codec
+
+
+class Bundles:
+    # Events sent to a bundling client during one pass of the event loop are
+    # written as a single BUNDLE message right after the pass, so the frames
+    # of a room tick cost one frame header and one write per connection
+    pending: list  # Players with a non-empty bundle
+    handle: asyncio.Handle | None
+
+    messages: int
+    events: int
+
+    def __init__(self):
+        self.pending = []
+        self.handle = None
+
+        self.messages = 0
+        self.events = 0
+
+    def add(self, player, message: bytes):
+        # The bundle is the player's own buffer, BUNDLE code first
+        bundle = player.bundle
+        if not bundle:
+            bundle.append(codec.SERVER_BUNDLE)
+            self.pending.append(player)
+            if self.handle is None:
+                self.handle = asyncio.get_running_loop().call_soon(self.flush)
+
+        size = len(message)
+        if size > 0xFF:
+            raise ValueError("Event too large for a bundle.")
+
+        bundle.append(size)
+        bundle += message
+        self.events += 1
+
+    def flush(self):
+        self.handle = None
+        pending, self.pending = self.pending, []
+
+        for player in pending:
+            bundle = player.bundle
+
+            # Replaced by a reconnect since, or already flushed by the same
+            # player queued again with the new buffer
+            if not bundle:
+                continue
+
+            # A lone event goes out as it is
+            if bundle[1] + 2 == len(bundle):
+                player.write(bytes(bundle[2:]))
+            else:
+                player.write(bytes(bundle))
+
+            bundle.clear()
+            self.messages += 1
+
+    def stats(self):
+        return {"messages": self.messages, "events": self.events}
+
+
+bundles = Bundles()
@@ -0,0 +1,44 @@
+import logging
+from abc import ABC, abstractmethod
+from uuid import UUID
+
+from websockets.frames import CloseCode
+from websockets.protocol import State
+
+
+class VirtualConnection(ABC):
+    # Takes the place of a client's websocket where there is no socket: what
+    # Player, websockets.broadcast, the handlers and the managers use of a
+    # connection. Frames the server writes to it are passed to deliver().
+    #
+    # Player.write sends through websockets.broadcast, which reads private
+    # attributes of the legacy protocol. This is the only place that fakes
+    # them, for websockets 12 as pinned in requirements.txt:
+    #   _fragmented_message_waiter  None, no fragmented message is being sent
+    #   write_frame_sync()          where the frame is written
+    __slots__ = ("id", "state", "transport", "_fragmented_message_waiter")
+
+    logger = logging.getLogger("connection")
+
+    # Keepalive round trip time read for version 1 players, there is no wire
+    latency: float = 0
+
+    def __init__(self, id: UUID | int):
+        self.id = id
+        self.state = State.OPEN
+        self.transport = None  # No write buffer to watch for slow consumers
+        self._fragmented_message_waiter = None
+
+    @abstractmethod
+    def deliver(self, frame: bytes):
+        pass
+
+    def write_frame_sync(self, fin, opcode, data):
+        self.deliver(data)
+
+    async def send(self, message):
+        if self.state is State.OPEN:
+            self.deliver(message)
+
+    def fail_connection(self, code: int = CloseCode.ABNORMAL_CLOSURE, reason: str = ""):
+        self.state = State.CLOSING
@@ -0,0 +1,53 @@
+import asyncio
+from collections import deque
+
+from websockets import WebSocketServerProtocol, ConnectionClosed
+
+
+class Outbox:
+    # Frames waiting to be written to one connection by its writer coroutine.
+    # Round and score events are never dropped and go out before motion,
+    # motion frames past the capacity replace the oldest queued ones
+    ws_connection: WebSocketServerProtocol
+    events: deque[bytes]
+    motion: deque[bytes]
+
+    dropped: int
+
+    def __init__(self, ws_connection: WebSocketServerProtocol, capacity: int):
+        self.ws_connection = ws_connection
+        self.events = deque()
+        self.motion = deque(maxlen=capacity)
+        self.ready = asyncio.Event()
+
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self.events) + len(self.motion)
+
+    def push(self, frame: bytes):
+        self.events.append(frame)
+        self.ready.set()
+
+    def push_motion(self, frame: bytes):
+        if len(self.motion) == self.motion.maxlen:
+            self.dropped += 1
+
+        self.motion.append(frame)
+        self.ready.set()
+
+    async def run(self):
+        ws = self.ws_connection
+        events = self.events
+        motion = self.motion
+
+        try:
+            while True:
+                await self.ready.wait()
+                self.ready.clear()
+
+                # A slow connection only holds up its own writer
+                while events or motion:
+                    await ws.send(events.popleft() if events else motion.popleft())
+        except ConnectionClosed:
+            pass
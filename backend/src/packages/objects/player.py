@@ -1,18 +1,139 @@
+import logging
+from array import array
+
+import websockets
 from websockets import WebSocketServerProtocol
+from websockets.frames import CloseCode
+from websockets.protocol import State
 
 from ..types import Vec2
+from ..types import codec
+from .bundles import bundles
+from .outbox import Outbox
+from .server_clock import server_clock
 
 
 class Player:
+    __slots__ = (
+        "position", "score", "ws_connection", "ws_connections", "outbox", "bundle", "motion_frame",
+        "flags", "version", "token", "input_seq", "rtt", "clock_offset", "view_tick", "paddle_history", "paddle_head",
+    )
+
+    # Bytes a connection may leave unread in its write buffer before it is dropped
+    slow_consumer_limit: int = 1 << 20
+
+    # Paddle positions kept for rewinding, about half a second at 60 Hz
+    HISTORY = 32
+
     position: Vec2
     score: int
     ws_connection: WebSocketServerProtocol
+    ws_connections: tuple[WebSocketServerProtocol]
+    outbox: Outbox | None
+    bundle: bytearray | None  # Events waiting for the end of the loop pass, None unless negotiated
+    motion_frame: bytearray
+
+    # CONNECT flags, protocol version of the client and the seq of its latest input
+    flags: int
+    version: int
+    input_seq: int
+
+    # Resume token of the seat, 0 unless the client asked for one
+    token: int
 
-    def __init__(self, position=None, score=0, ws_connection=None):
+    # Round trip time in seconds and the client's clock minus the server's in milliseconds
+    rtt: float
+    clock_offset: float
+
+    # Server tick the client saw the game at when it sent its latest COLLISION
+    view_tick: int
+
+    # Ring of (tick, y) pairs, allocated once the room compensates lag
+    paddle_history: array | None
+    paddle_head: int
+
+    def __init__(self, position=None, score=0, ws_connection=None, outbox=None):
         self.score = score
         self.ws_connection = ws_connection
+        self.ws_connections = (ws_connection,)  # Reused by websockets.broadcast
+
+        # Set when the connection is pipelined, frames are then queued instead of written
+        self.outbox = outbox
+        self.bundle = None
+
+        # Reusable OP_MOTION frame relayed to the opponent
+        self.motion_frame = bytearray(codec.MOTION_SIZE)
+
+        self.flags = 0
+        self.version = 1
+        self.input_seq = 0
+        self.token = 0
+        self.rtt = 0
+        self.clock_offset = 0
+        self.view_tick = 0
+        self.paddle_history = None
+        self.paddle_head = 0
         
         if position is None:
             self.position = [0, 0]
         else:
             self.position = position
+
+    def send_nowait(self, message: bytes):
+        # Write without yielding or creating a task. Pipelined players get the
+        # message queued, bundling players get it written with the other
+        # events of this loop pass
+        if self.outbox is not None:
+            self.outbox.push(message)
+            return
+
+        if self.bundle is not None:
+            bundles.add(self, message)
+            return
+
+        self.write(message)
+
+    def write(self, message: bytes):
+        # A connection that stopped reading is dropped
+        ws = self.ws_connection
+        transport = ws.transport
+        if transport is not None and transport.get_write_buffer_size() > Player.slow_consumer_limit:
+            if ws.state is State.OPEN:
+                logging.error(f"Client {ws.id} is not reading, closing the connection.")
+                ws.fail_connection(CloseCode.POLICY_VIOLATION, "slow consumer")
+            return
+
+        # Failed writes are logged by websockets and only skip this connection
+        websockets.broadcast(self.ws_connections, message)
+
+    def stamp(self, message: bytes):
+        # Version 2 frames end with the server tick and the client's latest input seq
+        return message + codec.STAMP_STRUCT.pack(server_clock.tick(), self.input_seq)
+
+    def record_paddle(self, tick: int, y: int):
+        history = self.paddle_history
+        if history is None:
+            history = self.paddle_history = array("q", (-1, 0) * Player.HISTORY)
+
+        head = self.paddle_head
+        history[head] = tick
+        history[head + 1] = y
+        self.paddle_head = (head + 2) % len(history)
+
+    def paddle_at(self, tick: int):
+        # Latest position recorded at or before the tick, None when the
+        # tick is older than the history
+        history = self.paddle_history
+        if history is None:
+            return None
+
+        size = len(history)
+        y = None
+        for i in range(self.paddle_head, self.paddle_head + size, 2):
+            i %= size
+            if history[i] > tick:
+                break
+            if history[i] >= 0:
+                y = history[i + 1]
+
+        return y
@@ -1,14 +1,27 @@
-import asyncio
-from asyncio import Task
 from uuid import UUID
-from typing import List
+from typing import TYPE_CHECKING
 
 from websockets import WebSocketServerProtocol
 
 from .player import Player
+from .outbox import Outbox
+from .spectators import Spectators
+
+if TYPE_CHECKING:
+    from .timer_wheel import Timer
+    from ..managers.recorder import Recorder
 
 
 class Room:
+    __slots__ = (
+        "p1", "p2", "room_id",
+        "bucket", "waiting_since",
+        "coalesce_motion", "authoritative", "lag_compensation", "ball_pos", "ball_vel",
+        "collision_payloads", "collision_payload_received",
+        "spectators", "recorder",
+        "phase", "timer",
+    )
+
     id_count: int = 0
 
     p1: Player | None
@@ -17,14 +30,71 @@ class Room:
     
     win_threshold: int = 5
 
-    collision_payloads: list[bytes] = [None, None]
-    collision_payload_received: list[bool] = [False, False]
+    # Phases of a match, see PhaseTimer for the timed transitions
+    #   WAITING -> COUNTDOWN -> PLAYING -> ROUND_OVER -> COUNTDOWN ... -> FINISHED
+    # and back to WAITING whenever a player leaves
+    WAITING = 0
+    COUNTDOWN = 1
+    PLAYING = 2
+    ROUND_OVER = 3
+    FINISHED = 4
+
+    # Phases of a match under way, one bit per phase
+    IN_PROGRESS = (1 << COUNTDOWN) | (1 << PLAYING) | (1 << ROUND_OVER)
+
+    phase: int
+
+    # Pending phase change of the room
+    timer: "Timer | None"
+
+    # Matchmaking bucket and the time the room started waiting for an opponent
+    bucket: int
+    waiting_since: float
+
+    # Relay OP_MOTION through the shared motion scheduler
+    coalesce_motion: bool
+
+    # Simulate the ball on the server instead of agreeing on client reports
+    authoritative: bool
+
+    # Settle conflicting client reports by rewinding the paddles
+    lag_compensation: bool
+    ball_pos: list[float]
+    ball_vel: list[float]
+
+    # Owned by each room and reset in place between collisions
+    collision_payloads: list[bytes | None]
+    collision_payload_received: list[bool]
+
+    # Created by the spectator stream when the first spectator joins
+    spectators: Spectators | None
+
+    # Match recorder shared by every room while recording is enabled
+    recorder: "Recorder | None"
 
     def __init__(self, p1=None, p2=None, ball_pos=(0, 0), ball_vel=(0, 0)):
         self.room_id = str(Room.id_count)
         self.p1: Player = p1
         self.p2: Player = p2
 
+        self.bucket = 0
+        self.waiting_since = 0
+
+        self.coalesce_motion = False
+        self.authoritative = False
+        self.lag_compensation = False
+        self.ball_pos = list(ball_pos)
+        self.ball_vel = list(ball_vel)
+
+        self.collision_payloads = [None, None]
+        self.collision_payload_received = [False, False]
+
+        self.spectators = None
+        self.recorder = None
+
+        self.phase = Room.WAITING
+        self.timer = None
+
         Room.id_count += 1
 
     def is_room_empty(self):
@@ -33,11 +103,11 @@ class Room:
     def has_two_players(self):
         return self.p1 is not None and self.p2 is not None
 
-    def add_player(self, ws: WebSocketServerProtocol):
+    def add_player(self, ws: WebSocketServerProtocol, outbox: Outbox | None = None):
         if self.p1 is None:
-            self.p1 = Player(ws_connection=ws)
+            self.p1 = Player(ws_connection=ws, outbox=outbox)
         elif self.p2 is None:
-            self.p2 = Player(ws_connection=ws)
+            self.p2 = Player(ws_connection=ws, outbox=outbox)
 
     def remove_player(self, ws_id: UUID):
         if self.p1 is not None and self.p1.ws_connection.id == ws_id:
@@ -47,6 +117,13 @@ class Room:
         elif self.p2 is not None and self.p2.ws_connection.id == ws_id:
             self.p2 = None
 
+        # The match is over, the remaining player waits for an opponent
+        self.phase = Room.WAITING
+
+    def reset_collisions(self):
+        self.collision_payloads[0] = self.collision_payloads[1] = None
+        self.collision_payload_received[0] = self.collision_payload_received[1] = False
+
     def reset_score(self):
         if self.p1 is not None:
             self.p1.score = 0
@@ -61,14 +138,21 @@ class Room:
     
         return -1
 
-    async def broadcast(self, message: bytes):
-        targets: List[Task[None]] = []
+    def send_all(self, message: bytes):
+        p1, p2 = self.p1, self.p2
+        if p1 is not None:
+            p1.send_nowait(message if p1.version == 1 else p1.stamp(message))
 
-        # Create an asynchronous task for sending the message to each player
-        if self.p1 is not None:
-            targets.append(asyncio.create_task(self.p1.ws_connection.send(message)))
+        if p2 is not None:
+            p2.send_nowait(message if p2.version == 1 else p2.stamp(message))
 
-        if self.p2 is not None:
-            targets.append(asyncio.create_task(self.p2.ws_connection.send(message)))
+        if self.spectators is not None:
+            self.spectators.forward(message)
+
+        if self.recorder is not None:
+            self.recorder.outbound(None, self.room_id, message)
 
-        await asyncio.wait(targets)
+    async def broadcast(self, message: bytes):
+        # The message is encoded once by the caller and written to every
+        # member without yielding, so no task is created per receiver
+        self.send_all(message)
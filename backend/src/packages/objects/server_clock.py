@@ -0,0 +1,31 @@
+import time
+from typing import Callable
+
+
+class ServerClock:
+    # Server ticks stamped on version 2 frames, counted from the start of the server
+    tick_rate: float
+    epoch: float
+    clock: Callable[[], float]
+
+    def __init__(self, tick_rate=60, clock=time.monotonic):
+        self.tick_rate = tick_rate
+        self.clock = clock
+        self.epoch = clock()
+
+    def configure(self, tick_rate: float):
+        # Ticks count from the time the server is configured
+        self.tick_rate = tick_rate
+        self.epoch = self.clock()
+
+    def tick(self):
+        return int((self.clock() - self.epoch) * self.tick_rate) & 0xFFFFFFFF
+
+    def ms(self):
+        return int((self.clock() - self.epoch) * 1000) & 0xFFFFFFFF
+
+    def ticks(self, seconds: float):
+        return round(seconds * self.tick_rate)
+
+
+server_clock = ServerClock()
@@ -0,0 +1,152 @@
+import time
+
+import websockets
+from websockets import WebSocketServerProtocol
+
+from ..types import codec
+
+
+class Spectators:
+    # Viewers of one room. Room events are forwarded as they are, the ball and
+    # the paddles are streamed as a keyframe every few ticks and small deltas
+    # in between. The players' frames are never touched, the state is read
+    # from what the room already sends and from the players' last OP_MOTION
+    __slots__ = ("members", "lagging", "ball", "ball_time", "scores", "sent", "seq", "frames_sent")
+
+    # Bytes a spectator may leave unread before it skips to the next keyframe
+    lag_limit: int = 1 << 16
+
+    # Area the extrapolated ball bounces in, see PhysicSystem
+    WORLD_WIDTH = 1280
+    WORLD_HEIGHT = 720
+    BALL_RADIUS = 25
+
+    members: dict[WebSocketServerProtocol, None]
+    lagging: set[WebSocketServerProtocol]
+
+    # Position and velocity of the last ROUND_START/COLLISION_MOTION and its time
+    ball: tuple[int, int, int, int]
+    ball_time: float
+    scores: tuple[int, int]
+
+    # State the spectators rebuilt from the last frame, None sends a keyframe next
+    sent: list[int] | None
+    seq: int
+    frames_sent: int
+
+    def __init__(self):
+        self.members = {}
+        self.lagging = set()
+
+        self.ball = (0, 0, 0, 0)
+        self.ball_time = 0
+        self.scores = (0, 0)
+
+        self.sent = None
+        self.seq = 0
+        self.frames_sent = 0
+
+    def __len__(self):
+        return len(self.members)
+
+    def add(self, ws: WebSocketServerProtocol):
+        self.members[ws] = None
+
+        # A late joiner starts from the state the others rebuilt,
+        # the deltas that follow apply to it as well
+        if self.sent is not None:
+            websockets.broadcast((ws,), self.encode_keyframe(self.sent))
+
+    def discard(self, ws: WebSocketServerProtocol):
+        self.members.pop(ws, None)
+        self.lagging.discard(ws)
+
+    def receivers(self, keyframe: bool):
+        # Members that keep up with the stream. One that fell behind is
+        # skipped until it drained its buffer and a keyframe comes
+        limit = Spectators.lag_limit
+        lagging = self.lagging
+        count = 0
+
+        for ws in self.members:
+            transport = ws.transport
+            if transport is not None and transport.get_write_buffer_size() > limit:
+                lagging.add(ws)
+                continue
+
+            if ws in lagging:
+                if not keyframe:
+                    continue
+                lagging.discard(ws)
+
+            count += 1
+            yield ws
+
+        self.frames_sent += count
+
+    def forward(self, message: bytes):
+        # Called with every frame the room sends to both players
+        code = message[0]
+        if code == codec.ROUND_START or code == codec.COLLISION_MOTION:
+            self.ball = codec.BALL_STATE_STRUCT.unpack_from(message)[1:]
+            self.ball_time = time.monotonic()
+
+            # The ball state is part of the stream, only the start is forwarded
+            if code == codec.COLLISION_MOTION:
+                return
+
+        elif code == codec.ROUND_END or code == codec.RESULT:
+            self.scores = codec.SCORE_STRUCT.unpack_from(message)[1:]
+            self.ball = self.ball[:2] + (0, 0)
+
+        elif code == codec.OP_DISCONNECT:
+            self.ball = self.ball[:2] + (0, 0)
+
+        websockets.broadcast(self.receivers(False), message)
+
+    def ball_at(self, now: float):
+        # Dead reckoning from the last ball frame, bouncing off the top and bottom
+        x, y, vx, vy = self.ball
+        dt = now - self.ball_time
+        radius = self.BALL_RADIUS
+
+        x = min(max(x + vx * dt, 0), self.WORLD_WIDTH)
+
+        span = self.WORLD_HEIGHT - 2 * radius
+        y = (y - radius + vy * dt) % (2 * span)
+        if y > span:
+            y = 2 * span - y
+            vy = -vy
+
+        return round(x), round(y + radius), vx, vy
+
+    def encode_keyframe(self, state: list[int]):
+        return codec.encode_keyframe(self.seq, state[0], state[1], *self.ball[2:], state[2], state[3], *self.scores)
+
+    def tick(self, p1_y: int, p2_y: int, now: float, keyframe: bool):
+        x, y, vx, vy = self.ball_at(now)
+        state = [x, y, p1_y, p2_y]
+        sent = self.sent
+
+        if not keyframe and sent is not None:
+            quantum = codec.SPECTATE_QUANTUM
+            deltas = [round((value - last) / quantum) for value, last in zip(state, sent)]
+
+            if not any(deltas):
+                return
+
+            # A jump past one signed byte falls back to a keyframe
+            if -128 <= min(deltas) and max(deltas) <= 127:
+                self.seq = (self.seq + 1) & 0xFF
+                for i, delta in enumerate(deltas):
+                    sent[i] += delta * quantum
+
+                websockets.broadcast(self.receivers(False), codec.encode_delta(self.seq, *deltas))
+                return
+
+        self.seq = (self.seq + 1) & 0xFF
+        self.sent = state
+        websockets.broadcast(
+            self.receivers(True),
+            codec.encode_keyframe(self.seq, x, y, vx, vy, p1_y, p2_y, *self.scores)
+        )
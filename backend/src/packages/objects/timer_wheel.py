@@ -0,0 +1,127 @@
+from typing import Callable
+
+
+class Timer:
+    __slots__ = ("deadline", "callback", "arg", "slot")
+
+    deadline: int  # Wheel tick the timer expires on
+    callback: Callable
+    arg: object
+
+    # Slot of the wheel holding the timer, None once it fired or was cancelled
+    slot: dict | None
+
+    def __init__(self, deadline: int, callback: Callable, arg: object):
+        self.deadline = deadline
+        self.callback = callback
+        self.arg = arg
+        self.slot = None
+
+
+class TimerWheel:
+    # Hierarchical timing wheel counting integer ticks. Level 0 holds the
+    # timers of the next SLOTS ticks one slot per tick, each level above
+    # covers SLOTS times the span of the one below. Higher slots are moved
+    # down (cascaded) when level 0 wraps around, so adding and cancelling a
+    # timer are O(1) and a tick only touches the timers that are due
+    SLOT_BITS = 8
+    SLOTS = 1 << SLOT_BITS
+    MASK = SLOTS - 1
+    LEVELS = 4
+
+    tick: int  # Last tick advanced to
+    levels: list[list[dict[Timer, None]]]
+
+    def __init__(self, tick: int = 0):
+        self.tick = tick
+        self.levels = [[{} for _ in range(self.SLOTS)] for _ in range(self.LEVELS)]
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def place(self, timer: Timer):
+        # A cascaded timer may be due on the current tick, which is
+        # expired right after the cascade
+        delta = timer.deadline - self.tick
+        level = max(delta.bit_length() - 1, 0) // self.SLOT_BITS
+        if level < self.LEVELS:
+            shift = self.SLOT_BITS * level
+            index = (timer.deadline >> shift) & self.MASK
+        else:
+            # Further than the top level reaches, parked in its farthest
+            # slot and placed again when it is cascaded
+            level = self.LEVELS - 1
+            index = ((self.tick >> (self.SLOT_BITS * level)) - 1) & self.MASK
+
+        slot = self.levels[level][index]
+        slot[timer] = None
+        timer.slot = slot
+
+    def add(self, deadline: int, callback: Callable, arg: object = None):
+        # A timer that is already due fires on the next tick
+        timer = Timer(max(deadline, self.tick + 1), callback, arg)
+        self.place(timer)
+        self.count += 1
+        return timer
+
+    def cancel(self, timer: Timer):
+        if timer.slot is None:
+            return False
+
+        del timer.slot[timer]
+        timer.slot = None
+        self.count -= 1
+        return True
+
+    def cascade(self, level: int):
+        # Spread the timers of the level's current slot over the levels below
+        index = (self.tick >> (self.SLOT_BITS * level)) & self.MASK
+        slot = self.levels[level][index]
+        if not slot:
+            return
+
+        self.levels[level][index] = {}
+        for timer in slot:
+            self.place(timer)
+
+    def advance(self, tick: int):
+        # Timers due up to the tick, in the order they expire
+        expired = []
+        levels = self.levels
+        mask = self.MASK
+
+        while self.tick < tick:
+            self.tick += 1
+            index = self.tick & mask
+
+            if index == 0:
+                level = 1
+                while level < self.LEVELS:
+                    self.cascade(level)
+                    if (self.tick >> (self.SLOT_BITS * level)) & mask:
+                        break
+                    level += 1
+
+            slot = levels[0][index]
+            if slot:
+                levels[0][index] = {}
+                for timer in slot:
+                    timer.slot = None
+                expired.extend(slot)
+
+        self.count -= len(expired)
+        return expired
+
+    def next_tick(self):
+        # Earliest tick worth waking up for: the next occupied level 0 slot,
+        # or the next cascade when the rest of level 0 is empty
+        if not self.count:
+            return None
+
+        level0 = self.levels[0]
+        tick = self.tick + 1
+        while True:
+            if level0[tick & self.MASK] or not tick & self.MASK:
+                return tick
+            tick += 1
@@ -0,0 +1,261 @@
+from struct import Struct
+
+from .payload_types import CLIENT_EVENT, SERVER_EVENT
+
+
+# Opcodes resolved once so the hot paths never touch the Enum machinery
+CONNECT = CLIENT_EVENT.CONNECT.value
+MOTION = CLIENT_EVENT.MOTION.value
+COLLISION = CLIENT_EVENT.COLLISION.value
+SPECTATE = CLIENT_EVENT.SPECTATE.value
+PONG = CLIENT_EVENT.PONG.value
+BUNDLE = CLIENT_EVENT.BUNDLE.value
+
+CONNECTED = SERVER_EVENT.CONNECTED.value
+OP_DISCONNECT = SERVER_EVENT.OP_DISCONNECT.value
+COUNTDOWN_START = SERVER_EVENT.COUNTDOWN_START.value
+ROUND_START = SERVER_EVENT.ROUND_START.value
+OP_MOTION = SERVER_EVENT.OP_MOTION.value
+COLLISION_MOTION = SERVER_EVENT.COLLISION_MOTION.value
+ROUND_END = SERVER_EVENT.ROUND_END.value
+RESULT = SERVER_EVENT.RESULT.value
+SPECTATING = SERVER_EVENT.SPECTATING.value
+SPECTATE_KEYFRAME = SERVER_EVENT.SPECTATE_KEYFRAME.value
+SPECTATE_DELTA = SERVER_EVENT.SPECTATE_DELTA.value
+PING = SERVER_EVENT.PING.value
+SERVER_BUNDLE = SERVER_EVENT.BUNDLE.value
+OP_AWAY = SERVER_EVENT.OP_AWAY.value
+
+# Cached single byte frames and opcode prefixes
+OP_DISCONNECT_FRAME = bytes((OP_DISCONNECT,))
+OP_AWAY_FRAME = bytes((OP_AWAY,))
+COUNTDOWN_START_FRAME = bytes((COUNTDOWN_START,))
+CONNECTED_P1_FRAME = bytes((CONNECTED, 0))
+CONNECTED_P2_FRAME = bytes((CONNECTED, 1))
+
+OP_MOTION_PREFIX = bytes((OP_MOTION,))
+COLLISION_MOTION_PREFIX = bytes((COLLISION_MOTION,))
+
+# Precompiled layouts (all values are little-endian)
+#   CONNECT:            code | [bucket] [version] [flags] [token]
+#   MOTION:             code | pos_x pos_y
+#   COLLISION:          code | ball_pos ball_vel wall_pos wall_scale [tag]
+#   OP_MOTION:          code | pos_x pos_y
+#   ROUND_START:        code | ball_pos ball_vel
+#   COLLISION_MOTION:   code | ball_pos ball_vel
+#   ROUND_END / RESULT: code | p1_score p2_score
+#   SPECTATE:           code | [room_id]
+#   SPECTATING:         code | room_id
+#   SPECTATE_KEYFRAME:  code | seq ball_pos ball_vel p1_y p2_y p1_score p2_score
+#   SPECTATE_DELTA:     code | seq d_ball_x d_ball_y d_p1_y d_p2_y (in SPECTATE_QUANTUM units)
+#
+# Protocol version 2, asked for with the version byte of CONNECT:
+#   CONNECTED:          code | is_player2 version
+#   MOTION:             code | pos_x pos_y seq
+#   COLLISION:          code | ball_pos ball_vel wall_pos wall_scale tag view_tick seq (tag NO_TAG: none)
+#   PING:               code | server_ms
+#   PONG:               code | server_ms client_ms
+# and every server frame to a version 2 client ends with a STAMP: the server
+# tick it was sent on and the seq of the client's latest input
+#
+# A client setting BUNDLE_FLAG in the flags of CONNECT may get several
+# events in one message, and may send several in one itself:
+#   BUNDLE:             code | (size event)*  (size: u8, 1 to 255)
+#
+# A client setting RESUME_FLAG gets a token with CONNECTED, and sends it back
+# after the flags of CONNECT to take its seat again once it reconnected:
+#   CONNECTED:          code | is_player2 version token p1_score p2_score
+#   OP_AWAY:            code  (the opponent dropped, its seat is held for it)
+MOTION_STRUCT = Struct("<xhh")
+COLLISION_STRUCT = Struct("<x8h")
+COLLISION_TAGGED_STRUCT = Struct("<x8hB")
+OP_MOTION_STRUCT = Struct("<Bhh")
+BALL_STATE_STRUCT = Struct("<B4h")
+SCORE_STRUCT = Struct("<BBB")
+ROOM_ID_STRUCT = Struct("<BI")
+KEYFRAME_STRUCT = Struct("<BB6hBB")
+DELTA_STRUCT = Struct("<BB4b")
+
+MOTION_V2_STRUCT = Struct("<xhhH")
+COLLISION_V2_STRUCT = Struct("<x8hBIH")
+STAMP_STRUCT = Struct("<IH")
+PING_STRUCT = Struct("<BI")
+PONG_STRUCT = Struct("<xII")
+
+CONNECT_TOKEN_STRUCT = Struct("<4xQ")
+CONNECTED_RESUME_STRUCT = Struct("<BBBQBB")
+
+PROTOCOL_VERSION = 2
+BUNDLE_FLAG = 0x01
+RESUME_FLAG = 0x02
+NO_TAG = 0xFF
+
+# Pixels per unit of a SPECTATE_DELTA value
+SPECTATE_QUANTUM = 2
+
+MOTION_SIZE = MOTION_STRUCT.size
+MOTION_V2_SIZE = MOTION_V2_STRUCT.size
+COLLISION_SIZE = COLLISION_STRUCT.size
+
+
+##################
+# Decoders
+
+def decode_connect(payload):
+    # (bucket, version, flags) - the optional matchmaking bucket, e.g. a skill
+    # tier or region, the protocol version the client speaks and its options
+    size = len(payload)
+    return (
+        payload[1] if size > 1 else 0,
+        min(payload[2], PROTOCOL_VERSION) if size > 2 else 1,
+        payload[3] if size > 3 else 0,
+    )
+
+
+def decode_resume_token(payload):
+    # The token of a seat to take again, 0 for none
+    if len(payload) < CONNECT_TOKEN_STRUCT.size:
+        return 0
+
+    return CONNECT_TOKEN_STRUCT.unpack_from(payload)[0]
+
+
+def decode_motion(payload):
+    size = len(payload)
+    if size != MOTION_SIZE and size != MOTION_V2_SIZE:
+        raise Exception("Expected payload size of 5 or 7 bytes.")
+
+    # (pos_x, pos_y)
+    return MOTION_STRUCT.unpack_from(payload)
+
+
+def decode_collision(payload):
+    size = len(payload)
+    if size < COLLISION_SIZE:
+        raise Exception("Expected payload size of at least 17 bytes.")
+
+    # (b_pos_x, b_pos_y, b_vel_x, b_vel_y, w_pos_x, w_pos_y, w_scale_x, w_scale_y, tag)
+    if size == COLLISION_SIZE:
+        return COLLISION_STRUCT.unpack_from(payload) + (None,)
+    if size == COLLISION_TAGGED_STRUCT.size:
+        return COLLISION_TAGGED_STRUCT.unpack_from(payload)
+    if size == COLLISION_V2_STRUCT.size:
+        values = COLLISION_V2_STRUCT.unpack_from(payload)
+        return values[:8] + (None if values[8] == NO_TAG else values[8],)
+
+    return COLLISION_STRUCT.unpack_from(payload) + (int.from_bytes(payload[COLLISION_SIZE:]),)
+
+
+def decode_collision_stamp(payload):
+    # (view_tick, seq) of a version 2 report, None for version 1
+    if len(payload) != COLLISION_V2_STRUCT.size:
+        return None
+
+    return COLLISION_V2_STRUCT.unpack_from(payload)[9:]
+
+
+def decode_pong(payload):
+    # (server_ms, client_ms)
+    return PONG_STRUCT.unpack_from(payload)
+
+
+def decode_spectate(payload):
+    # (room_id,) - None lets the server pick a room
+    if len(payload) < ROOM_ID_STRUCT.size:
+        return (None,)
+
+    return (ROOM_ID_STRUCT.unpack_from(payload)[1],)
+
+
+def split_bundle(payload):
+    # The events of a BUNDLE as views into the message, nothing is copied.
+    # Every size is checked before the events are returned, so a malformed
+    # bundle is refused as a whole
+    view = memoryview(payload)
+    end = len(view)
+    events = []
+    offset = 1
+    while offset < end:
+        size = view[offset]
+        offset += 1
+        if not size or offset + size > end:
+            raise ValueError("Malformed bundle.")
+
+        events.append(view[offset:offset + size])
+        offset += size
+
+    return events
+
+
+decoders = {
+    CONNECT: decode_connect,
+    MOTION: decode_motion,
+    COLLISION: decode_collision,
+    SPECTATE: decode_spectate,
+    PONG: decode_pong,
+}
+
+
+##################
+# Encoders
+
+def encode_connected(is_player1: bool, version: int = 1):
+    if version > 1:
+        return bytes((CONNECTED, 0 if is_player1 else 1, version))
+    return CONNECTED_P1_FRAME if is_player1 else CONNECTED_P2_FRAME
+
+
+def encode_connected_resumable(is_player1: bool, version: int, token: int, p1_score: int, p2_score: int):
+    return CONNECTED_RESUME_STRUCT.pack(CONNECTED, 0 if is_player1 else 1, version, token, p1_score, p2_score)
+
+
+def encode_op_motion(pos_x, pos_y):
+    return OP_MOTION_STRUCT.pack(OP_MOTION, pos_x, pos_y)
+
+
+def encode_round_start(b_pos_x, b_pos_y, b_vel_x, b_vel_y):
+    return BALL_STATE_STRUCT.pack(ROUND_START, b_pos_x, b_pos_y, b_vel_x, b_vel_y)
+
+
+def encode_collision_motion(b_pos_x, b_pos_y, b_vel_x, b_vel_y):
+    return BALL_STATE_STRUCT.pack(COLLISION_MOTION, b_pos_x, b_pos_y, b_vel_x, b_vel_y)
+
+
+def encode_round_end(p1_score, p2_score):
+    return SCORE_STRUCT.pack(ROUND_END, p1_score, p2_score)
+
+
+def encode_result(p1_score, p2_score):
+    return SCORE_STRUCT.pack(RESULT, p1_score, p2_score)
+
+
+def encode_ping(server_ms):
+    return PING_STRUCT.pack(PING, server_ms)
+
+
+def encode_stamp(tick, seq):
+    return STAMP_STRUCT.pack(tick, seq)
+
+
+def encode_spectating(room_id):
+    return ROOM_ID_STRUCT.pack(SPECTATING, room_id)
+
+
+def encode_keyframe(seq, b_pos_x, b_pos_y, b_vel_x, b_vel_y, p1_y, p2_y, p1_score, p2_score):
+    return KEYFRAME_STRUCT.pack(
+        SPECTATE_KEYFRAME, seq, b_pos_x, b_pos_y, b_vel_x, b_vel_y, p1_y, p2_y, p1_score, p2_score)
+
+
+def encode_delta(seq, d_ball_x, d_ball_y, d_p1_y, d_p2_y):
+    return DELTA_STRUCT.pack(SPECTATE_DELTA, seq, d_ball_x, d_ball_y, d_p1_y, d_p2_y)
+
+
+# In-place variants for callers that own a reusable buffer
+def pack_op_motion_into(buffer, offset, pos_x, pos_y):
+    OP_MOTION_STRUCT.pack_into(buffer, offset, OP_MOTION, pos_x, pos_y)
+    return offset + OP_MOTION_STRUCT.size
+
+
+def pack_collision_motion_into(buffer, offset, b_pos_x, b_pos_y, b_vel_x, b_vel_y):
+    BALL_STATE_STRUCT.pack_into(buffer, offset, COLLISION_MOTION, b_pos_x, b_pos_y, b_vel_x, b_vel_y)
+    return offset + BALL_STATE_STRUCT.size
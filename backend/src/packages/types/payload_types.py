@@ -9,7 +9,10 @@ class CLIENT_EVENT(Enum):
     COLLISION = MOTION + 1
     
     PLAY_AGAIN = COLLISION + 1
-    CLIENT_EVENT_COUNT = PLAY_AGAIN + 1
+    SPECTATE = PLAY_AGAIN + 1
+    PONG = SPECTATE + 1
+    BUNDLE = PONG + 1
+    CLIENT_EVENT_COUNT = BUNDLE + 1
 
 
 class SERVER_EVENT(Enum):
@@ -24,4 +27,12 @@ class SERVER_EVENT(Enum):
     
     RESULT = ROUND_END + 1
     PLAY_AGAIN = RESULT + 1
-    SERVER_EVENT_COUNT = PLAY_AGAIN + 1
+
+    SPECTATING = PLAY_AGAIN + 1
+    SPECTATE_KEYFRAME = SPECTATING + 1
+    SPECTATE_DELTA = SPECTATE_KEYFRAME + 1
+
+    PING = SPECTATE_DELTA + 1
+    BUNDLE = PING + 1
+    OP_AWAY = BUNDLE + 1
+    SERVER_EVENT_COUNT = OP_AWAY + 1
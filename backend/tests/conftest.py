@@ -0,0 +1,84 @@
+import os
+import sys
+import asyncio
+
+import pytest
+
+# The server's packages are imported as main.py does, from the src directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from loopback import LoopbackConnection, connect
+from packages.managers import room_manager
+from packages.managers.phase_timer import phase_timer
+from packages.objects.room import Room
+from packages.types import codec
+
+
+class Clients:
+    # Loopback clients served by handle_connection in this process. The
+    # test's coroutine runs on the session's loop, every client still open
+    # when it returns is closed
+    connections: list[LoopbackConnection]
+
+    def __init__(self):
+        self.connections = []
+
+    def connect(self):
+        connection = connect()
+        self.connections.append(connection)
+        return connection
+
+    async def join(self, version=1, flags=0, bucket=0):
+        # A client that sent CONNECT and whose frames so far were handled
+        connection = self.connect()
+        connection.push(bytes((codec.CONNECT, bucket, version, flags)))
+        await connection.settle()
+        return connection
+
+    async def pair(self, version=1, flags=0):
+        # Two players of a room whose round is under way, with no frame left to read
+        a = await self.join(version, flags)
+        b = await self.join(version, flags)
+
+        room = room_manager.client_room_map[a.id]
+        phase_timer.cancel(room)
+        room.phase = Room.PLAYING
+        a.drain()
+        b.drain()
+        return a, b
+
+    async def close(self):
+        for connection in self.connections:
+            if not connection.task.done():
+                await connection.close()
+
+
+@pytest.fixture(scope="session")
+def loop():
+    # The managers keep their timer tasks between tests, on one loop
+    loop = asyncio.new_event_loop()
+    yield loop
+
+    # Timer loops still waiting for their next tick
+    tasks = asyncio.all_tasks(loop)
+    for task in tasks:
+        task.cancel()
+    loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+    loop.close()
+
+
+@pytest.fixture
+def clients(loop):
+    clients = Clients()
+    yield clients
+    loop.run_until_complete(clients.close())
+
+    # A test leaves no player behind for the next one
+    assert not room_manager.client_room_map
+    assert not room_manager.rooms
+
+
+@pytest.fixture
+def run(loop, clients):
+    # Runs the test's coroutine, its clients are closed after it
+    return loop.run_until_complete
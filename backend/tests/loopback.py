@@ -0,0 +1,104 @@
+import asyncio
+from uuid import uuid4
+from collections import deque
+
+from websockets.exceptions import ConnectionClosedOK
+from websockets.frames import CloseCode
+from websockets.protocol import State
+
+from packages.api.server import handle_connection
+from packages.objects.connection import VirtualConnection
+
+
+class LoopbackConnection(VirtualConnection):
+    # A client connection held in memory. The caller pushes the client's
+    # frames, handle_connection reads them with recv() as from a socket, and
+    # what the server writes waits in frames until it is received or drained
+    inbound: deque[bytes]
+    frames: deque[bytes]
+
+    def __init__(self):
+        super().__init__(uuid4())
+        self.inbound = deque()
+        self.frames = deque()
+        self.reader = None  # Resolved when the server waits in recv() and a frame comes
+        self.receiver = None  # Same for the client in receive()
+        self.task: asyncio.Task | None = None
+
+    @staticmethod
+    def wake(waiter: asyncio.Future | None):
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    def push(self, frame: bytes):
+        # A frame from the client
+        if self.state is State.OPEN:
+            self.inbound.append(frame)
+            self.wake(self.reader)
+
+    async def recv(self):
+        # Frames pushed before the connection closed are still read, like
+        # the messages a websocket received before its close frame
+        while not self.inbound:
+            if self.state is not State.OPEN:
+                raise ConnectionClosedOK(None, None)
+
+            self.reader = asyncio.get_running_loop().create_future()
+            try:
+                await self.reader
+            finally:
+                self.reader = None
+
+        return self.inbound.popleft()
+
+    def deliver(self, frame: bytes):
+        # Frames may be buffers the server reuses, a socket would have copied them
+        self.frames.append(bytes(frame))
+        self.wake(self.receiver)
+
+    async def receive(self):
+        # The next frame from the server, as a client reads it
+        while not self.frames:
+            self.receiver = asyncio.get_running_loop().create_future()
+            try:
+                await self.receiver
+            finally:
+                self.receiver = None
+
+        return self.frames.popleft()
+
+    def drain(self):
+        frames = list(self.frames)
+        self.frames.clear()
+        return frames
+
+    @property
+    def idle(self):
+        # The server read every pushed frame and waits for the next
+        return not self.inbound and (self.reader is not None or self.task.done())
+
+    async def settle(self):
+        # One more loop pass for what the server deferred to the end of the
+        # pass, such as bundles
+        while not self.idle:
+            await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+    async def close(self):
+        # The client goes away, handle_connection runs the disconnect
+        self.state = State.CLOSED
+        self.wake(self.reader)
+        await self.task
+
+    def fail_connection(self, code: int = CloseCode.ABNORMAL_CLOSURE, reason: str = ""):
+        # The server drops the client, unread frames are lost
+        self.state = State.CLOSING
+        self.inbound.clear()
+        self.wake(self.reader)
+
+
+def connect():
+    # A client served by handle_connection in this process, without a socket
+    connection = LoopbackConnection()
+    connection.task = asyncio.create_task(handle_connection(connection))
+    return connection
@@ -0,0 +1,63 @@
+import pytest
+
+from packages.api.cluster import BUCKET_STRUCT, Dispatcher, WorkerHandle, request_bucket
+
+
+@pytest.mark.parametrize("head, bucket", [
+    (b"GET / HTTP/1.1\r\nHost: pong\r\n", 0),
+    (b"GET /?bucket=3 HTTP/1.1\r\n", 3),
+    (b"GET /play?mode=ranked&bucket=255 HTTP/1.1\r\n", 255),
+    (b"GET /?bucket=256 HTTP/1.1\r\n", 0),
+    (b"GET /?bucket=-1 HTTP/1.1\r\n", 0),
+    (b"GET /?bucket=x HTTP/1.1\r\n", 0),
+    (b"GET /?bucket=3", 0),
+    (b"", 0),
+])
+def test_request_bucket(head, bucket):
+    assert request_bucket(head) == bucket
+
+
+def dispatcher(*waiting):
+    # Workers with the given waiting players per bucket, nothing in flight
+    dispatcher = Dispatcher("127.0.0.1", 0, len(waiting))
+    for index, buckets in enumerate(waiting):
+        worker = WorkerHandle(index, None, None, None)
+        worker.waiting = dict(buckets)
+        worker.connections = sum(buckets.values())
+        dispatcher.workers.append(worker)
+    return dispatcher
+
+
+def test_routes_to_the_waiting_player_of_the_bucket():
+    workers = dispatcher({1: 1}, {2: 1}, {})
+    assert workers.choose_worker(2).index == 1
+    assert workers.choose_worker(1).index == 0
+
+    # No player waits in the bucket, the least loaded worker gets the client
+    assert workers.choose_worker(3).index == 2
+
+
+def test_counts_players_in_flight_per_bucket():
+    workers = dispatcher({}, {})
+    workers.workers[1].connections = 1
+
+    # A player of bucket 1 handed over but not joined yet is waiting
+    workers.workers[0].sent[1] = 1
+    workers.workers[0].in_flight = 1
+    assert workers.choose_worker(1).index == 0
+
+    # Not for another bucket, the least loaded worker gets that client
+    workers.workers[0].connections = 1
+    workers.workers[1].connections = 0
+    assert workers.choose_worker(2).index == 1
+
+    # With a player waiting and two in flight, the second one will wait
+    worker = workers.workers[0]
+    worker.waiting = {1: 1}
+    worker.sent[1] = 2
+    assert worker.expected_waiting(1) == 1
+
+    # Both joined, the first was paired and the second waits
+    worker.update(3, BUCKET_STRUCT.pack(1, 2, 1))
+    assert worker.expected_waiting(1) == 1
+    assert worker.in_flight == 0
@@ -0,0 +1,305 @@
+import asyncio
+from struct import Struct
+
+import pytest
+
+from packages.event_handlers import handlers, start_round, end_round
+from packages.event_handlers.pong import pong
+from packages.managers import room_manager
+from packages.managers.clock_sync import clock_sync
+from packages.managers.event_gate import event_gate
+from packages.managers.sessions import sessions
+from packages.managers.spectator_stream import spectator_stream
+from packages.objects.room import Room
+from packages.objects.server_clock import server_clock
+from packages.types import codec
+
+
+COLLISION_STRUCT = Struct("<B8hB")
+
+MOTION_FRAME = bytes((codec.MOTION,)) + codec.MOTION_STRUCT.pack(75, 360)[1:]
+OP_MOTION_FRAME = codec.encode_op_motion(75, 360)
+
+# A ball moving into player 1's paddle, and into the wall behind it
+PADDLE_REPORT = COLLISION_STRUCT.pack(codec.COLLISION, 100, 360, -375, 200, 75, 360, 25, 150, 0)[:-1]
+GOAL_REPORTS = (
+    COLLISION_STRUCT.pack(codec.COLLISION, 25, 360, -375, 200, 0, 360, 10, 720, 0),
+    COLLISION_STRUCT.pack(codec.COLLISION, 25, 360, -375, 200, 0, 360, 10, 720, 1),
+)
+
+
+def test_connect(run, clients):
+    async def main():
+        a = await clients.join()
+        assert a.drain() == [codec.CONNECTED_P1_FRAME]
+
+        # The second player fills the room, both count down
+        b = await clients.join()
+        assert b.drain() == [codec.CONNECTED_P2_FRAME, codec.COUNTDOWN_START_FRAME]
+        assert a.drain() == [codec.COUNTDOWN_START_FRAME]
+
+    run(main())
+
+
+def test_connect_v2(run, clients):
+    async def main():
+        a = await clients.join(version=2)
+        frames = a.drain()
+        assert frames[0][:3] == codec.encode_connected(True, 2)
+        assert len(frames[0]) == 3 + codec.STAMP_STRUCT.size
+
+    run(main())
+
+
+def test_motion_v1(run, clients):
+    async def main():
+        a, b = await clients.pair()
+        a.push(MOTION_FRAME)
+        await a.settle()
+
+        assert b.drain() == [OP_MOTION_FRAME]
+        assert a.drain() == []
+
+    run(main())
+
+
+def test_motion_v2(run, clients):
+    async def main():
+        a, b = await clients.pair(version=2)
+        a.push(bytes((codec.MOTION,)) + codec.MOTION_V2_STRUCT.pack(75, 360, 7)[1:])
+        await a.settle()
+
+        # The version 1 layout, stamped with the receiver's latest seq
+        frame, = b.drain()
+        assert frame[:codec.MOTION_SIZE] == OP_MOTION_FRAME
+        tick, seq = codec.STAMP_STRUCT.unpack_from(frame, codec.MOTION_SIZE)
+        assert tick == server_clock.tick()
+        assert seq == 0
+
+        # The sender's seq comes back in its own stamps
+        assert room_manager.client_room_map[a.id].p1.input_seq == 7
+
+    run(main())
+
+
+def test_collision(run, clients):
+    async def main():
+        a, b = await clients.pair()
+
+        # The first report waits for the other player's
+        a.push(PADDLE_REPORT)
+        await a.settle()
+        assert a.drain() == b.drain() == []
+
+        b.push(PADDLE_REPORT)
+        await b.settle()
+        frames = a.drain()
+        assert b.drain() == frames
+        assert len(frames) == 1 and frames[0][0] == codec.COLLISION_MOTION
+
+    run(main())
+
+
+def test_truncated_collision(run, clients):
+    async def main():
+        a, b = await clients.pair()
+        rejected = event_gate.rejected_size[codec.COLLISION]
+        a.push(PADDLE_REPORT[:-1])
+        await a.settle()
+
+        # Dropped by the gate, the reader goes on
+        assert event_gate.rejected_size[codec.COLLISION] == rejected + 1
+        assert room_manager.client_room_map[a.id].collision_payloads == [None, None]
+        assert not a.task.done()
+
+    run(main())
+
+
+def test_goal(run, clients):
+    async def main():
+        a, b = await clients.pair()
+        a.push(GOAL_REPORTS[0])
+        b.push(GOAL_REPORTS[1])
+        await a.settle()
+        await b.settle()
+
+        # The wall behind player 1: a point for player 2
+        assert a.drain() == b.drain() == [codec.encode_round_end(0, 1)]
+
+    run(main())
+
+
+def test_pong(run, clients):
+    async def main():
+        a, b = await clients.pair(version=2)
+        sent = (server_clock.ms() - 40) & 0xFFFFFFFF
+        a.push(bytes((codec.PONG,)) + codec.PONG_STRUCT.pack(sent, sent)[1:])
+        await a.settle()
+
+        # Nothing is answered, the round trip is measured
+        assert a.drain() == b.drain() == []
+        player = room_manager.client_room_map[a.id].p1
+        assert player.rtt == pytest.approx(0.04, abs=0.01)
+
+    clock_sync.configure(0, False)
+    try:
+        run(main())
+    finally:
+        clock_sync.configure(2, False)
+
+
+def test_short_pong(run, clients):
+    async def main():
+        a, b = await clients.pair(version=2)
+        rejected = event_gate.rejected_size[codec.PONG]
+        a.push(bytes((codec.PONG, 0, 0)))
+        await a.settle()
+        assert event_gate.rejected_size[codec.PONG] == rejected + 1
+        assert not a.task.done()
+
+        # The handler drops one that gets past the gate as well
+        player = room_manager.client_room_map[a.id].p1
+        await pong(a, bytes((codec.PONG, 0, 0)))
+        assert player.rtt == 0
+
+    run(main())
+
+
+def test_bundle(run, clients):
+    async def main():
+        a, b = await clients.pair(flags=codec.BUNDLE_FLAG)
+        a.push(bytes((codec.BUNDLE,)) + (bytes((len(MOTION_FRAME),)) + MOTION_FRAME) * 4)
+        await a.settle()
+
+        # The four relays of the pass go out in one BUNDLE
+        frame, = b.drain()
+        assert frame[0] == codec.SERVER_BUNDLE
+        assert [bytes(event) for event in codec.split_bundle(frame)] == [OP_MOTION_FRAME] * 4
+
+    run(main())
+
+
+def test_bundle_not_negotiated(run, clients):
+    async def main():
+        a, b = await clients.pair()
+        a.push(bytes((codec.BUNDLE, len(MOTION_FRAME))) + MOTION_FRAME)
+        await a.settle()
+
+        # Dropped, the client stays connected
+        assert b.drain() == []
+        assert not a.task.done()
+
+    run(main())
+
+
+def test_bundle_malformed(run, clients):
+    async def main():
+        a, b = await clients.pair(flags=codec.BUNDLE_FLAG)
+
+        # A valid event, then a size past the end of the message
+        a.push(bytes((codec.BUNDLE, len(MOTION_FRAME))) + MOTION_FRAME + bytes((len(MOTION_FRAME),)) + MOTION_FRAME[:-1])
+        await a.task
+        await b.settle()
+
+        # None of its events were handled, the client is gone from its room
+        assert b.drain() == [codec.OP_DISCONNECT_FRAME]
+        assert a.id not in room_manager.client_room_map
+
+    run(main())
+
+
+def test_spectate(run, clients):
+    async def main():
+        a, b = await clients.pair()
+        room = room_manager.client_room_map[a.id]
+
+        spectator = clients.connect()
+        spectator.push(codec.ROOM_ID_STRUCT.pack(codec.SPECTATE, int(room.room_id)))
+        await spectator.settle()
+        assert spectator.drain()[0] == codec.encode_spectating(int(room.room_id))
+
+        # The spectator gets what the room sends to its players
+        await room.broadcast(codec.encode_round_end(1, 0))
+        await spectator.settle()
+        assert codec.encode_round_end(1, 0) in spectator.drain()
+
+    spectator_stream.configure(30)
+    try:
+        run(main())
+    finally:
+        spectator_stream.configure(0)
+
+
+def test_handler_error(run, clients, monkeypatch):
+    async def fail(ws, message):
+        raise RuntimeError("handler failed")
+
+    async def main():
+        a, b = await clients.pair()
+        monkeypatch.setitem(handlers, codec.MOTION, fail)
+        a.push(MOTION_FRAME)
+        await a.task
+
+        # Cleaned up like a closed connection, the opponent is told
+        assert b.drain() == [codec.OP_DISCONNECT_FRAME]
+        assert a.id not in room_manager.client_room_map
+
+    run(main())
+
+
+def test_match_lifecycle(run, clients, monkeypatch):
+    # CONNECT to RESULT, with the countdown and round end waits cut to a timer tick
+    monkeypatch.setattr(start_round, "COUNTDOWN_TIME", 0)
+    monkeypatch.setattr(end_round, "ROUND_END_TIME", 0)
+
+    async def until(connection, opcode):
+        while (frame := await connection.receive())[0] != opcode:
+            pass
+        return frame
+
+    async def main():
+        a, b = clients.connect(), clients.connect()
+        a.push(bytes((codec.CONNECT,)))
+        b.push(bytes((codec.CONNECT,)))
+
+        # Every goal is scored by player 2, after a few hits
+        for score in range(1, Room.win_threshold + 1):
+            await until(a, codec.ROUND_START)
+            for _ in range(3):
+                a.push(PADDLE_REPORT)
+                b.push(PADDLE_REPORT)
+                await until(a, codec.COLLISION_MOTION)
+
+            a.push(GOAL_REPORTS[0])
+            b.push(GOAL_REPORTS[1])
+            assert await until(a, codec.ROUND_END) == codec.encode_round_end(0, score)
+
+        result = codec.encode_result(0, Room.win_threshold)
+        assert await until(a, codec.RESULT) == result
+        assert await until(b, codec.RESULT) == result
+
+    run(main())
+
+
+@pytest.mark.parametrize("version", (1, 2))
+def test_away(run, clients, version):
+    async def main():
+        a, b = await clients.pair(version, codec.RESUME_FLAG)
+        await a.close()
+        await b.settle()
+        assert len(sessions.detached) == 1
+
+        # Only a version 2 opponent is told, its seat is given up after the grace
+        frames = b.drain()
+        if version == 1:
+            assert frames == []
+        else:
+            assert len(frames) == 1 and frames[0][0] == codec.OP_AWAY
+        await b.close()
+        await asyncio.sleep(0.1)
+
+    sessions.configure(0.01, 0.01)
+    try:
+        run(main())
+    finally:
+        sessions.configure(0)
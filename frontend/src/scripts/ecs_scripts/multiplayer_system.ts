@@ -18,7 +18,8 @@ class MultiplayerSystem {
         this.url = url
         this.isInitialized = false
         this.closeHandlers = []
-        this.eventHandlerMap = Array(SERVER_EVENT.SERVER_EVENT_COUNT)
+        // Events without a handler are ignored
+        this.eventHandlerMap = Array(SERVER_EVENT.SERVER_EVENT_COUNT).fill((message: Uint8Array) => {})
     }
 
     public setHandler(serverEvent: SERVER_EVENT, handlerCallback: HandlerCallback) {
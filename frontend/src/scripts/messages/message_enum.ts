@@ -6,8 +6,11 @@ enum CLIENT_EVENT {
     COLLISION = MOTION + 1,
 
     PLAY_AGAIN = COLLISION + 1,
+    SPECTATE = PLAY_AGAIN + 1,
+    PONG = SPECTATE + 1,
+    BUNDLE = PONG + 1,
 
-    CLIENT_EVENT_COUNT = PLAY_AGAIN + 1,
+    CLIENT_EVENT_COUNT = BUNDLE + 1,
 }
 
 
@@ -23,7 +26,15 @@ enum SERVER_EVENT {
 
     RESULT = ROUND_END + 1,
     PLAY_AGAIN = RESULT + 1,
-    SERVER_EVENT_COUNT = PLAY_AGAIN + 1,
+
+    SPECTATING = PLAY_AGAIN + 1,
+    SPECTATE_KEYFRAME = SPECTATING + 1,
+    SPECTATE_DELTA = SPECTATE_KEYFRAME + 1,
+
+    PING = SPECTATE_DELTA + 1,
+    BUNDLE = PING + 1,
+    OP_AWAY = BUNDLE + 1,
+    SERVER_EVENT_COUNT = OP_AWAY + 1,
 }
 
 export { CLIENT_EVENT, SERVER_EVENT }
\ No newline at end of file